@@ -0,0 +1,444 @@
+"""Asyncio players: many players in one process sharing their connections.
+
+GamePlayer gives every player two Redis connections and a thread blocked in
+pubsub.listen(). Here all the players in a process share one PlayerHub:
+
+- one pool of at most PLAYER_HUB_CONNECTIONS connections for commands; what
+  the players send in one event loop turn goes out in one pipeline
+- one pub/sub connection subscribed to every player's own channel and every
+  room any of them is in; a room channel is subscribed once however many
+  local players are in the room, and channel changes made in the same loop
+  turn go out as one SUBSCRIBE / UNSUBSCRIBE
+- one presence heartbeat reporting every player in a single batch
+
+Each AsyncGamePlayer keeps its own copy of its room's state and hands every
+frame it receives to its callbacks and to its updates() iterator:
+
+    hub = PlayerHub()
+    await hub.start()
+    player = AsyncGamePlayer(hub, 'alice')
+    await player.connect()
+    await player.create_game('trivia')
+    await player.set_ready()
+    async for frame in player.updates():
+        print(frame['type'], player.room_state and player.room_state['state'])
+"""
+import asyncio
+import uuid
+
+import redis
+import redis.asyncio as aioredis
+
+from codec import get_codec
+from config import (
+    REDIS_HOST, REDIS_PORT, ROOM_RESYNC_CHANNEL, GAME_ACTION_CHANNEL,
+    room_state_channel, player_channel
+)
+from game_config import (
+    MATCHMAKING_CHANNEL, PLAYER_STATE_CHANNEL, PRESENCE_INTERVAL,
+    PLAYER_HUB_CONNECTIONS, PLAYER_UPDATE_QUEUE, PlayerState
+)
+from presence import Presence
+from sharding import ShardRouter, live_shards
+from state_delta import apply_patch
+from transport import get_transport
+
+RECONNECT_MIN_DELAY = 0.5
+RECONNECT_MAX_DELAY = 10.0
+
+
+class PlayerHub:
+    """The Redis connections, subscription and heartbeat shared by players.
+
+    Subscribers are anything with an on_frame(frame) method; each gets its
+    own decoded copy of a frame, since they patch their own room state.
+    """
+
+    def __init__(self, redis_client=None, raw_redis=None, max_connections=PLAYER_HUB_CONNECTIONS):
+        # clients can be passed in, e.g. in-process fakes for benchmarks
+        self.redis = redis_client or aioredis.Redis(connection_pool=aioredis.BlockingConnectionPool(
+            host=REDIS_HOST, port=REDIS_PORT, decode_responses=True, max_connections=max_connections))
+        # frames may be binary, so the subscription reads raw bytes
+        self.raw_redis = raw_redis or aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT)
+        self.codec = get_codec()
+        self.transport = get_transport()
+        self.router = ShardRouter()
+        self.presence = Presence(self.redis)
+        self.players = {}  # player_id: AsyncGamePlayer, for heartbeats
+        self.handlers = {}  # channel: set of subscribers
+        self.subscribed = set()  # channels the pubsub is subscribed to
+        self.changed = set()  # channels to (un)subscribe on the next flush
+        self.flushed = None  # future set by the next flush
+        self.outbox = []  # (channel, message) to send
+        self.wakeup = asyncio.Event()
+        self.listening = asyncio.Event()
+        self.pubsub = None
+        self.tasks = []
+
+    async def start(self):
+        self.pubsub = self.raw_redis.pubsub()
+        self.tasks = [asyncio.create_task(self._read()),
+                      asyncio.create_task(self._write()),
+                      asyncio.create_task(self._heartbeat())]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.outbox:
+            await self._send_batch()
+        if self.pubsub is not None:
+            await self.pubsub.reset()
+
+    # subscriptions
+
+    async def subscribe(self, channel, subscriber):
+        """Deliver channel's frames to subscriber; returns once Redis has the
+        subscription, so nothing published to it afterwards is missed."""
+        subscribers = self.handlers.setdefault(channel, set())
+        subscribers.add(subscriber)
+        if channel not in self.subscribed:
+            await self._change(channel)
+
+    async def unsubscribe(self, channel, subscriber):
+        subscribers = self.handlers.get(channel)
+        if not subscribers:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self.handlers[channel]
+            await self._change(channel)
+
+    def _change(self, *channels):
+        self.changed.update(channels)
+        if self.flushed is None:
+            self.flushed = asyncio.get_running_loop().create_future()
+            asyncio.create_task(self._flush())
+        return asyncio.shield(self.flushed)
+
+    async def _flush(self):
+        changed, self.changed = self.changed, set()
+        flushed, self.flushed = self.flushed, None
+        wanted = {channel for channel in changed if channel in self.handlers} - self.subscribed
+        unwanted = {channel for channel in changed if channel not in self.handlers} & self.subscribed
+        try:
+            if wanted:
+                await self.pubsub.subscribe(*wanted)
+                self.subscribed |= wanted
+                self.listening.set()
+            if unwanted:
+                await self.pubsub.unsubscribe(*unwanted)
+                self.subscribed -= unwanted
+        except (redis.ConnectionError, redis.TimeoutError, OSError) as e:
+            # the reader resubscribes everything once it reconnects
+            print(f"Subscription change failed: {e}")
+        flushed.set_result(None)
+
+    async def _read(self):
+        delay = RECONNECT_MIN_DELAY
+        while True:
+            # listen() returns as soon as nothing is subscribed
+            await self.listening.wait()
+            try:
+                async for message in self.pubsub.listen():
+                    delay = RECONNECT_MIN_DELAY
+                    if message['type'] != 'message':
+                        continue
+                    subscribers = self.handlers.get(message['channel'].decode())
+                    for subscriber in list(subscribers or ()):
+                        try:
+                            subscriber.on_frame(self.codec.decode(message['data']))
+                        except Exception as e:
+                            print(f"Error handling frame: {e}")
+                if not self.subscribed:
+                    self.listening.clear()
+            except (redis.ConnectionError, redis.TimeoutError, OSError) as e:
+                print(f"Player hub disconnected ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                await self._resubscribe()
+
+    async def _resubscribe(self):
+        try:
+            await self.pubsub.reset()
+        except Exception:
+            pass
+        self.pubsub = self.raw_redis.pubsub()
+        self.subscribed = set()
+        await self._change(*self.handlers)
+        # updates may have been missed while disconnected
+        for player in self.players.values():
+            if player.current_room:
+                player.request_resync()
+
+    # sending
+
+    def send(self, channel, message):
+        """Queue a message to the room managers; everything queued in one
+        loop turn goes out in one pipeline."""
+        self.outbox.append((channel, message))
+        self.wakeup.set()
+
+    async def _write(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            await self._send_batch()
+
+    async def _send_batch(self):
+        batch, self.outbox = self.outbox, []
+        if not batch:
+            return
+        try:
+            # straight to the owning manager shard when managers are sharded
+            if self.router.refresh_due():
+                self.router.update(await live_shards(self.redis))
+            pipe = self.redis.pipeline(transaction=False)
+            for channel, message in batch:
+                channel = self.router.channel_for(channel, message.get('room_id'))
+                self.transport.send(pipe, channel, self.codec.encode(message))
+            await pipe.execute(raise_on_error=False)
+        except (redis.ConnectionError, redis.TimeoutError, OSError) as e:
+            print(f"Dropped {len(batch)} messages: {e}")
+
+    async def _heartbeat(self):
+        while True:
+            try:
+                await self.presence.beat(list(self.players))
+            except (redis.ConnectionError, redis.TimeoutError, OSError) as e:
+                print(f"Presence heartbeat failed: {e}")
+            await asyncio.sleep(PRESENCE_INTERVAL)
+
+
+class AsyncGamePlayer:
+    """A player driven from asyncio; the counterpart of game_player.GamePlayer.
+
+    Frames are passed, after the player's room state has been updated from
+    them, to every callback added with on_update() (plain functions or
+    coroutine functions, called with (player, frame)) and to updates().
+    """
+
+    def __init__(self, hub, name, player_id=None):
+        self.hub = hub
+        self.player_id = player_id or str(uuid.uuid4())
+        self.name = name
+        self.current_room = None
+        self.room_state = None
+        self.room_version = 0
+        self.resync_pending = False
+        self.private_state = {}
+        self.callbacks = []
+        self.queue = None
+        self.dropped = 0
+        self.gaps = 0  # updates missed while following the room
+        self.waiters = []  # (predicate, future)
+
+    async def connect(self):
+        self.hub.players[self.player_id] = self
+        await self.hub.subscribe(player_channel(self.player_id), self)
+
+    async def close(self):
+        """Stop listening; the player stays in their room until they leave
+        or, once heartbeats stop, are reaped."""
+        await self._enter_room(None)
+        self.hub.players.pop(self.player_id, None)
+        await self.hub.unsubscribe(player_channel(self.player_id), self)
+
+    # requests
+
+    async def create_game(self, game_type, options=None):
+        room_id = str(uuid.uuid4())
+        # listen before the room exists so its first snapshot isn't missed
+        await self._enter_room(room_id)
+        message = {
+            'action': 'create',
+            'player_id': self.player_id,
+            'player_name': self.name,
+            'game_type': game_type,
+            'room_id': room_id
+        }
+        if options:
+            message['options'] = options
+        self._send(MATCHMAKING_CHANNEL, message)
+        return room_id
+
+    async def join_game(self, room_id):
+        await self._enter_room(room_id)
+        self._send(MATCHMAKING_CHANNEL, {
+            'action': 'join',
+            'player_id': self.player_id,
+            'player_name': self.name,
+            'room_id': room_id
+        })
+
+    async def quick_match(self, game_type):
+        """Queue for a game; the player follows the manager's 'matched' reply
+        into its room."""
+        self._send(MATCHMAKING_CHANNEL, {
+            'action': 'quick_match',
+            'player_id': self.player_id,
+            'player_name': self.name,
+            'game_type': game_type
+        })
+
+    async def cancel_match(self):
+        self._send(MATCHMAKING_CHANNEL, {'action': 'cancel_match', 'player_id': self.player_id})
+
+    async def leave_game(self):
+        if not self.current_room:
+            return
+        self._send(MATCHMAKING_CHANNEL, {
+            'action': 'leave',
+            'player_id': self.player_id,
+            'room_id': self.current_room
+        })
+        await self._enter_room(None)
+
+    async def set_ready(self, is_ready=True):
+        if not self.current_room:
+            return
+        new_state = PlayerState.READY if is_ready else PlayerState.NOT_READY
+        self._send(PLAYER_STATE_CHANNEL, {
+            'player_id': self.player_id,
+            'room_id': self.current_room,
+            'state': new_state.value
+        })
+
+    async def submit_score(self, score):
+        if not self.current_room:
+            return
+        self._send(PLAYER_STATE_CHANNEL, {
+            'player_id': self.player_id,
+            'room_id': self.current_room,
+            'score': score
+        })
+
+    async def play(self, action, data):
+        """Send a game action, e.g. await play('answer', {'answer': 'Paris'})."""
+        if not self.current_room:
+            return
+        self._send(GAME_ACTION_CHANNEL, {
+            'player_id': self.player_id,
+            'room_id': self.current_room,
+            'action': action,
+            'data': data
+        })
+
+    def request_resync(self):
+        if self.current_room:
+            self._send(ROOM_RESYNC_CHANNEL, {
+                'room_id': self.current_room,
+                'player_id': self.player_id
+            })
+
+    def _send(self, channel, message):
+        self.hub.send(channel, message)
+
+    async def _enter_room(self, room_id):
+        old_room = self.current_room
+        self._reset_room(room_id)
+        if old_room == room_id:
+            return
+        if old_room:
+            await self.hub.unsubscribe(room_state_channel(old_room), self)
+        if room_id:
+            await self.hub.subscribe(room_state_channel(room_id), self)
+
+    def _reset_room(self, room_id):
+        self.current_room = room_id
+        self.room_state = None
+        self.room_version = 0
+        self.resync_pending = False
+        self.private_state = {}
+
+    # updates
+
+    def on_update(self, callback):
+        """Call callback(player, frame) for every frame; usable as a decorator."""
+        self.callbacks.append(callback)
+        return callback
+
+    def updates(self):
+        """An async iterator over the frames received from now on. Only the
+        newest PLAYER_UPDATE_QUEUE are kept for a slow reader (see dropped)."""
+        if self.queue is None:
+            self.queue = asyncio.Queue(PLAYER_UPDATE_QUEUE)
+        return self._drain(self.queue)
+
+    async def _drain(self, queue):
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            if self.queue is queue:
+                self.queue = None
+
+    async def wait_for(self, predicate, timeout=None):
+        """Wait until predicate(player) is true, checked after every frame."""
+        if predicate(self):
+            return
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append((predicate, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        finally:
+            self.waiters = [w for w in self.waiters if w[1] is not future]
+
+    def on_frame(self, frame):
+        """Called by the hub with each frame for this player or their room."""
+        typ = frame.get('type')
+        if typ == 'private':
+            self.private_state = frame['state']
+        elif typ == 'matched':
+            # follow the match into its room, then fetch the room's state
+            asyncio.ensure_future(self._follow_match(frame['room_id']))
+        elif typ in ('snapshot', 'patch'):
+            if frame.get('room_id') != self.current_room or not self._apply(frame):
+                return
+        self._notify(frame)
+
+    async def _follow_match(self, room_id):
+        await self._enter_room(room_id)
+        self.resync_pending = True
+        self.request_resync()
+
+    def _apply(self, frame):
+        """Update the room state from a snapshot or patch; False if the
+        frame couldn't be applied."""
+        if frame['type'] == 'snapshot':
+            self.room_state = frame['state']
+            self.resync_pending = False
+        elif self.room_state is None or frame['version'] != self.room_version + 1:
+            # missed an update (or subscribed mid-stream); ask for a snapshot
+            if self.room_state is not None:
+                self.gaps += 1
+            if not self.resync_pending:
+                self.resync_pending = True
+                self.request_resync()
+            self.room_state = None
+            return False
+        else:
+            self.room_state = apply_patch(self.room_state, frame['ops'])
+        self.room_version = frame['version']
+        return True
+
+    def _notify(self, frame):
+        for callback in self.callbacks:
+            result = callback(self, frame)
+            if asyncio.iscoroutine(result):
+                asyncio.ensure_future(result)
+        if self.queue is not None:
+            if self.queue.full():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait(frame)
+        for predicate, future in self.waiters:
+            if not future.done() and predicate(self):
+                future.set_result(None)
+
+    @property
+    def game_state(self):
+        """The room's game state merged with this player's private view."""
+        if self.room_state is None:
+            return None
+        return dict(self.room_state.get('game') or {}, **self.private_state)
@@ -0,0 +1 @@
+"""Benchmarks and load generation; see bench/load.py."""
@@ -0,0 +1,266 @@
+"""Headless players for the load generator.
+
+A bot drives an async_game_player.AsyncGamePlayer: it creates or joins a
+room, readies up and plays whatever game the room runs until it finishes,
+timing each request it sends against the frame that shows it took effect:
+
+    create, join  until the room state lists the bot
+    ready         until the room state shows the bot ready
+    action        until the action_result reply
+    room_update   from the manager publishing a frame to the bot receiving it
+
+Bots talk to the room managers directly through a shared PlayerHub, or go
+through web/server.py with a WsPlayer. Either way the room state is kept by
+AsyncGamePlayer, so the load test exercises the client library itself.
+"""
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict
+
+from async_game_player import AsyncGamePlayer
+from config import GAME_ACTION_CHANNEL, ROOM_RESYNC_CHANNEL
+from game_config import MATCHMAKING_CHANNEL, PLAYER_STATE_CHANNEL
+from metrics import LatencyRecorder
+
+RPS_MOVES = ('rock', 'paper', 'scissors')
+
+
+class Stats:
+    """Counters and latency samples shared by every bot in a run."""
+
+    def __init__(self):
+        # unbounded, so the tail percentiles cover the whole run
+        self.latency = defaultdict(lambda: LatencyRecorder(window=None))
+        self.sent = Counter()
+        self.received = Counter()
+        self.errors = Counter()
+        self.games = Counter()
+
+    def report(self, elapsed):
+        kinds = sorted(set(self.latency) | set(self.sent))
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'messages': {
+                kind: dict(self.latency[kind].summary(),
+                           sent=self.sent[kind],
+                           per_sec=round(self.sent[kind] / elapsed, 1) if elapsed else 0.0)
+                for kind in kinds
+            },
+            'frames_received': sum(self.received.values()),
+            'frames_per_sec': round(sum(self.received.values()) / elapsed, 1) if elapsed else 0.0,
+            'frames': dict(self.received),
+            'errors': dict(self.errors),
+            'games': dict(self.games)
+        }
+
+
+def words_starting(dictionary, letter):
+    if hasattr(dictionary, 'iter_prefix'):
+        return dictionary.iter_prefix(letter)
+    return dictionary.by_first.get(letter, ())
+
+
+class Bot:
+    """Plays through player (an AsyncGamePlayer) and records its timings."""
+
+    def __init__(self, player, stats, rng, dictionary=None, think=0.0):
+        self.player = player
+        self.stats = stats
+        self.rng = rng
+        self.dictionary = dictionary
+        self.think = think
+        self.action_sent = None
+        self.last_move = None
+        self.actions = 0
+        player.on_update(self._on_update)
+
+    @property
+    def room_id(self):
+        return self.player.current_room
+
+    @property
+    def finished(self):
+        state = self.player.room_state
+        return state is not None and state['state'] == 'finished'
+
+    async def connect(self):
+        await self.player.connect()
+
+    async def close(self):
+        await self.player.close()
+
+    # requests
+
+    async def create(self, game_type):
+        self._reset()
+        await self._timed('create', self.player.create_game(game_type), self._seated)
+
+    async def join(self, room_id):
+        self._reset()
+        await self._timed('join', self.player.join_game(room_id), self._seated)
+
+    async def set_ready(self):
+        await self._timed('ready', self.player.set_ready(), self._ready)
+
+    async def leave(self):
+        if self.room_id:
+            self.stats.sent['leave'] += 1
+            await self.player.leave_game()
+        self._reset()
+
+    async def wait_finished(self, timeout):
+        await self.player.wait_for(lambda player: self.finished, timeout)
+
+    async def _timed(self, kind, request, predicate):
+        started = time.perf_counter()
+        self.stats.sent[kind] += 1
+        await request
+        await self.player.wait_for(predicate)
+        self.stats.latency[kind].record(time.perf_counter() - started)
+
+    def _reset(self):
+        self.action_sent = None
+        self.last_move = None
+        self.actions = 0
+
+    @staticmethod
+    def _seated(player):
+        return player.room_state is not None and player.player_id in player.room_state['players']
+
+    @classmethod
+    def _ready(cls, player):
+        return cls._seated(player) and player.room_state['players'][player.player_id]['state'] == 'ready'
+
+    # frames
+
+    def _on_update(self, player, frame):
+        typ = frame.get('type')
+        self.stats.received[typ] += 1
+        if typ in ('snapshot', 'patch'):
+            if frame.get('published_at'):
+                self.stats.latency['room_update'].record_since(frame['published_at'])
+        elif typ == 'action_result':
+            if self.action_sent is not None:
+                self.stats.latency['action'].record(time.perf_counter() - self.action_sent)
+                self.action_sent = None
+            if 'error' in frame['result']:
+                self.stats.errors['action'] += 1
+        elif typ == 'error':
+            self.stats.errors[frame.get('message', 'error')] += 1
+        self._play()
+
+    def _play(self):
+        state = self.player.room_state
+        if state is None or state['state'] != 'in_progress':
+            return
+        game = self.player.game_state
+        move = None
+        if 'question' in game:
+            key = ('question', game['current_question'])
+            if not game.get('answered'):
+                move = ('answer', {'answer': self.rng.choice(game['question']['options'])})
+        elif 'current_letter' in game:
+            key = ('word', len(game['words_used']))
+            if game.get('current_turn') == self.player.player_id:
+                move = ('move', {'word': self._pick_word(game)})
+        elif 'waiting_for' in game:
+            key = ('round', game['current_round'])
+            if self.player.player_id in game['waiting_for']:
+                move = ('choose', {'move': self.rng.choice(RPS_MOVES)})
+        else:
+            return
+        if move is None or key == self.last_move:
+            return
+        self.last_move = key
+        asyncio.ensure_future(self._act(*move))
+
+    def _pick_word(self, game):
+        letter = game['current_letter']
+        used = set(game['words_used'])
+        if self.dictionary is not None:
+            for word in words_starting(self.dictionary, letter):
+                if word not in used:
+                    return word
+        return letter * 3
+
+    async def _act(self, action, data):
+        if self.think:
+            await asyncio.sleep(self.rng.uniform(0, self.think))
+        self.actions += 1
+        self.action_sent = time.perf_counter()
+        self.stats.sent['action'] += 1
+        await self.player.play(action, data)
+
+
+class WsPlayer(AsyncGamePlayer):
+    """An AsyncGamePlayer that goes through the web server's websocket
+    endpoint instead of a PlayerHub (needs the websockets package). The
+    server subscribes the socket to its room, and picks the id of a room
+    created here."""
+
+    def __init__(self, url, name):
+        super().__init__(None, name)
+        self.url = url
+        self.ws = None
+        self.outbox = asyncio.Queue()
+        self.tasks = []
+        self.creating = False
+        self.left_room = None
+
+    async def connect(self):
+        import websockets
+        self.ws = await websockets.connect(f'{self.url}?name={self.name}', max_size=None)
+        welcome = json.loads(await self.ws.recv())
+        self.player_id = welcome['player_id']
+        self.tasks = [asyncio.create_task(self._read()), asyncio.create_task(self._write())]
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        if self.ws is not None:
+            await self.ws.close()
+
+    async def create_game(self, game_type, options=None):
+        await self._enter_room(None)
+        self.creating = True
+        message = {'type': 'create', 'game_type': game_type}
+        if options:
+            message['options'] = options
+        self.outbox.put_nowait(message)
+
+    async def _enter_room(self, room_id):
+        if self.current_room:
+            self.left_room = self.current_room
+        self.creating = False
+        self._reset_room(room_id)
+
+    def _send(self, channel, message):
+        # the websocket protocol's version of what a hub would publish
+        if channel == MATCHMAKING_CHANNEL:
+            message = {'type': message['action'], 'room_id': message.get('room_id'),
+                       'game_type': message.get('game_type')}
+        elif channel == PLAYER_STATE_CHANNEL:
+            if 'state' not in message:
+                return
+            message = {'type': 'ready', 'ready': message['state'] == 'ready'}
+        elif channel == GAME_ACTION_CHANNEL:
+            message = {'type': 'action', 'action': message['action'], 'data': message['data']}
+        elif channel == ROOM_RESYNC_CHANNEL:
+            message = {'type': 'resync'}
+        self.outbox.put_nowait(message)
+
+    def on_frame(self, frame):
+        if (self.creating and frame.get('type') in ('snapshot', 'patch')
+                and frame['room_id'] != self.left_room):
+            self.creating = False
+            self.current_room = frame['room_id']
+        super().on_frame(frame)
+
+    async def _read(self):
+        async for message in self.ws:
+            self.on_frame(json.loads(message))
+
+    async def _write(self):
+        while True:
+            await self.ws.send(json.dumps(await self.outbox.get()))
@@ -0,0 +1,186 @@
+"""Load generator: many bots playing full games against the room managers.
+
+Bots are split into groups, one room each. In every group one bot creates
+a room, the others join, everyone readies up and they play until the game
+ends (or --max-actions is reached, when they leave). Then they start over
+until --duration runs out. Game types are handed out round robin.
+
+    # against a running Redis, room manager(s) and web server
+    python -m bench.load --players 1000 --clients redis --duration 60
+
+    # everything in this process, on an in-memory fake Redis (needs fakeredis;
+    # websocket clients also need the websockets package)
+    python -m bench.load --fake --players 200 --clients both --output results.json
+
+Results (throughput and p50/p99/p999 latency per message type) are printed
+as JSON, and written to --output. --max-p99-ms makes the run exit non-zero
+if any message type is slower than that at p99, for use as a CI gate.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from async_game_player import AsyncGamePlayer, PlayerHub
+from bench.bots import Bot, Stats, WsPlayer
+
+GROUP_SIZES = {'trivia': 4, 'word_chain': 2, 'rock_paper_scissors': 2}
+
+
+async def play_group(bots, game_type, stats, deadline, max_actions, game_timeout):
+    leader, others = bots[0], bots[1:]
+    while time.time() < deadline:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(leader.create(game_type), game_timeout)
+            await asyncio.wait_for(
+                asyncio.gather(*(bot.join(leader.room_id) for bot in others)), game_timeout)
+            await asyncio.wait_for(
+                asyncio.gather(*(bot.set_ready() for bot in bots)), game_timeout)
+            end = time.time() + game_timeout
+            while not leader.finished and leader.actions < max_actions and time.time() < end:
+                try:
+                    await leader.wait_finished(0.5)
+                except asyncio.TimeoutError:
+                    pass
+            if leader.finished:
+                stats.games[game_type] += 1
+                stats.latency[f'game:{game_type}'].record(time.perf_counter() - started)
+            else:
+                stats.games[f'{game_type}:abandoned'] += 1
+        except asyncio.TimeoutError:
+            stats.errors['group_timeout'] += 1
+        for bot in bots:
+            await bot.leave()
+
+
+async def start_in_process(clients, port):
+    """Run a room manager (and the web server) here, on a fake Redis."""
+    import fakeredis
+    from game_room_manager import GameRoomManager
+
+    server = fakeredis.FakeServer()
+
+    def fake(decode):
+        return fakeredis.FakeAsyncRedis(server=server, decode_responses=decode)
+
+    manager = GameRoomManager(redis_client=fake(True), raw_redis=fake(False))
+    tasks = [asyncio.create_task(manager.serve())]
+    web = None
+    if clients != 'redis':
+        import uvicorn
+        from web import server as web_server
+        web_server.use_redis(fake(True), fake(False))
+        web = uvicorn.Server(uvicorn.Config(web_server.app, host='127.0.0.1', port=port,
+                                            log_level='warning'))
+        web.task = asyncio.create_task(web.serve())
+        while not web.started:
+            await asyncio.sleep(0.05)
+    await asyncio.sleep(0.2)
+    return fake, tasks, web
+
+
+async def run(args):
+    from games.dictionary import get_dictionary
+
+    tasks, web = [], None
+    if args.fake:
+        fake, tasks, web = await start_in_process(args.clients, args.port)
+        redis_client, raw_redis = fake(True), fake(False)
+        ws_url = f'ws://127.0.0.1:{args.port}/ws'
+    else:
+        # the hub opens its own pooled connections
+        redis_client = raw_redis = None
+        ws_url = args.url
+
+    stats = Stats()
+    rng = random.Random(args.seed)
+    dictionary = get_dictionary()
+    hub = PlayerHub(redis_client, raw_redis)
+    await hub.start()
+
+    games = args.games.split(',')
+    bots, groups = [], []
+    i = 0
+    while len(bots) < args.players:
+        game_type = games[len(groups) % len(games)]
+        group = []
+        for _ in range(GROUP_SIZES.get(game_type, 2)):
+            use_ws = args.clients == 'ws' or (args.clients == 'both' and len(groups) % 2)
+            name = f'bot{i}'
+            i += 1
+            player = WsPlayer(ws_url, name) if use_ws else AsyncGamePlayer(hub, name)
+            group.append(Bot(player, stats, random.Random(rng.random()), dictionary, args.think))
+        bots += group
+        groups.append((game_type, group))
+
+    # connect in batches so the server isn't hit by every handshake at once
+    for start in range(0, len(bots), 200):
+        await asyncio.gather(*(bot.connect() for bot in bots[start:start + 200]))
+
+    started = time.perf_counter()
+    deadline = time.time() + args.duration
+    await asyncio.gather(*(
+        play_group(group, game_type, stats, deadline, args.max_actions, args.game_timeout)
+        for game_type, group in groups
+    ))
+    elapsed = time.perf_counter() - started
+
+    for bot in bots:
+        await bot.close()
+    await hub.stop()
+    if web is not None:
+        web.should_exit = True
+        await web.task
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    gaps = sum(bot.player.gaps for bot in bots)
+    if gaps:
+        stats.errors['version_gap'] += gaps
+    report = stats.report(elapsed)
+    report['config'] = {
+        'players': len(bots), 'rooms': len(groups), 'games': games, 'clients': args.clients,
+        'fake': args.fake, 'duration': args.duration, 'think': args.think
+    }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bench.load', description=__doc__.split('\n')[0])
+    parser.add_argument('--players', type=int, default=100)
+    parser.add_argument('--games', default='trivia,word_chain,rock_paper_scissors',
+                        help='comma-separated game types, dealt round robin to rooms')
+    parser.add_argument('--clients', choices=('redis', 'ws', 'both'), default='redis',
+                        help='bots talk to the managers over Redis, through the web server, or half and half')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to keep starting games')
+    parser.add_argument('--think', type=float, default=0.0, help='max random delay before each move, seconds')
+    parser.add_argument('--max-actions', type=int, default=40, help='a room leaves its game after this many moves')
+    parser.add_argument('--game-timeout', type=float, default=120.0)
+    parser.add_argument('--fake', action='store_true', help='run a manager and web server in-process on fakeredis')
+    parser.add_argument('--url', default='ws://localhost:8000/ws', help='web server websocket endpoint')
+    parser.add_argument('--port', type=int, default=8765, help='web server port with --fake')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    parser.add_argument('--max-p99-ms', type=float, help='fail if any message type has a slower p99')
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.max_p99_ms is not None:
+        slow = {kind: m['p99_ms'] for kind, m in report['messages'].items()
+                if not kind.startswith('game:') and m.get('p99_ms', 0) > args.max_p99_ms}
+        if slow:
+            print(f'p99 over {args.max_p99_ms}ms: {slow}', file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
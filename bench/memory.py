@@ -0,0 +1,102 @@
+"""Memory per live room.
+
+Builds --rooms rooms of each game type the way a room manager holds them: a
+GameRoom and its game, with --players players joined and ready, the game
+started and a few moves played, plus the last published state the manager
+keeps for diffing. Reports the bytes each takes (measured with tracemalloc)
+and the size of its encoded snapshot.
+
+    python -m bench.memory --rooms 10000 --players 4
+    python -m bench.memory --games word_chain --words words.txt --output memory.json
+"""
+import argparse
+import gc
+import json
+import random
+import tracemalloc
+import uuid
+
+from codec import get_codec
+from game_room_manager import GameRoom
+from game_config import PlayerState
+from games import GameType
+from games.dictionary import get_dictionary, load_dictionary, set_dictionary
+from games.question_bank import get_question_bank
+from games.simulation import make_strategy
+
+
+def build_rooms(game_type, count, players, moves, rng):
+    rooms = []
+    strategy = make_strategy(GameType(game_type), 'random')
+    for _ in range(count):
+        room = GameRoom(str(uuid.uuid4()), game_type)
+        seats = [str(uuid.uuid4()) for _ in range(min(players, room.max_players))]
+        for i, player_id in enumerate(seats):
+            room.add_player(player_id, f'player{rng.randrange(100000)}')
+            room.set_player_state(player_id, PlayerState.READY)
+        room.start(0.0, rng.getrandbits(64))
+        for _ in range(moves):
+            for player_id in seats:
+                move = strategy.choose(room.game, player_id, rng)
+                if move is not None and room.state.value == 'in_progress':
+                    room.apply_action(player_id, move[0].value, move[1])
+        rooms.append(room)
+    return rooms
+
+
+def measure(game_type, count, players, moves, seed):
+    rng = random.Random(seed)
+    gc.collect()
+    before = tracemalloc.take_snapshot()
+    rooms = build_rooms(game_type, count, players, moves, rng)
+    gc.collect()
+    built = tracemalloc.take_snapshot()
+    published = [room.to_json() for room in rooms]
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+
+    def grown(old, new):
+        return sum(stat.size_diff for stat in new.compare_to(old, 'filename'))
+
+    codec = get_codec()
+    snapshot_bytes = sum(len(codec.encode(room.dump())) for room in rooms)
+    result = {
+        'rooms': count,
+        'room_bytes': round(grown(before, built) / count),
+        'published_bytes': round(grown(built, after) / count),
+        'snapshot_bytes': round(snapshot_bytes / count)
+    }
+    result['total_bytes'] = result['room_bytes'] + result['published_bytes']
+    del rooms, published
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bench.memory', description=__doc__.split('\n')[0])
+    parser.add_argument('--rooms', type=int, default=2000, help='rooms per game type')
+    parser.add_argument('--players', type=int, default=4, help='players per room (fewer if the game allows fewer)')
+    parser.add_argument('--moves', type=int, default=2, help='rounds of moves played in each room')
+    parser.add_argument('--games', default='trivia,word_chain,rock_paper_scissors')
+    parser.add_argument('--words', help='word list for word chain rooms')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    # shared by every room, so loaded before measuring
+    if args.words:
+        set_dictionary(load_dictionary(args.words))
+    get_dictionary()
+    get_question_bank()
+
+    tracemalloc.start()
+    report = {game_type: measure(game_type, args.rooms, args.players, args.moves, args.seed)
+              for game_type in args.games.split(',')}
+    tracemalloc.stop()
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
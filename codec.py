@@ -0,0 +1,88 @@
+"""Wire codecs for everything published over Redis and sent to websockets.
+
+The stdlib JSON codec is always available; orjson and msgpack are used only
+if they are installed. Codecs that produce JSON share a format, so a frame
+encoded with one can be forwarded untouched to a client that asked for the
+other.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from config import WIRE_CODEC
+
+
+class JsonCodec:
+    name = 'json'
+    format = 'json'
+    binary = False
+
+    def encode(self, obj):
+        return json.dumps(obj, separators=(',', ':'))
+
+    def decode(self, data):
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    name = 'orjson'
+    format = 'json'
+    binary = False
+
+    def encode(self, obj):
+        return orjson.dumps(obj)
+
+    def decode(self, data):
+        return orjson.loads(data)
+
+
+class MsgpackCodec:
+    name = 'msgpack'
+    format = 'msgpack'
+    binary = True
+
+    def encode(self, obj):
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def decode(self, data):
+        return msgpack.unpackb(data, raw=False)
+
+
+CODECS = {
+    'json': JsonCodec,
+    'orjson': OrjsonCodec,
+    'msgpack': MsgpackCodec
+}
+
+_AVAILABLE = {
+    'json': True,
+    'orjson': orjson is not None,
+    'msgpack': msgpack is not None
+}
+
+
+def available_codecs():
+    return [name for name, ok in _AVAILABLE.items() if ok]
+
+
+def get_codec(name=None):
+    """Return a codec by name, falling back to stdlib JSON if it can't be used."""
+    name = name or WIRE_CODEC
+    if not _AVAILABLE.get(name):
+        if name != 'json':
+            print(f"Codec '{name}' is not available, using json")
+        name = 'json'
+    return CODECS[name]()
+
+
+def as_text(data):
+    """Websocket text frames need str; JSON codecs may hand us UTF-8 bytes."""
+    return data.decode() if isinstance(data, bytes) else data
@@ -1,3 +1,4 @@
+import os
 
 REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
@@ -8,4 +9,55 @@ GAME_ACTION_CHANNEL = 'game_actions'
 GAME_JOIN_CHANNEL = 'game_joins'
 GAME_LEAVE_CHANNEL = 'game_leaves'
 GAME_READY_CHANNEL = 'game_ready'
-GAME_LIST_CHANNEL = 'game_list'
\ No newline at end of file
+GAME_LIST_CHANNEL = 'game_list'  # lobby: room list changes only
+ROOM_RESYNC_CHANNEL = 'room_resync'  # ask the manager for a fresh room snapshot
+
+def room_state_channel(room_id):
+    return f'{GAME_STATE_CHANNEL}:{room_id}'
+
+# the last ROOM_UPDATE_BUFFER frames published on a room's channel, so a
+# client that reconnects can catch up without a full snapshot
+ROOM_UPDATE_BUFFER = 64
+
+def room_updates_key(room_id):
+    return f'room_updates:{room_id}'
+
+# per-player replies: action results, errors and private game views
+def player_channel(player_id):
+    return f'players:{player_id}'
+
+# Encoding for frames on Redis and websockets: 'json', 'orjson' or 'msgpack'.
+# Falls back to json when the library is not installed.
+WIRE_CODEC = 'json'
+
+# How messages reach the room managers: 'pubsub' (fire-and-forget) or
+# 'streams' (Redis Streams with consumer groups, see transport.py)
+TRANSPORT = 'pubsub'
+STREAM_MAXLEN = 100000  # approximate cap per stream
+STREAM_GROUP = 'room_managers'
+STREAM_BATCH = 200  # entries per XREADGROUP
+STREAM_BLOCK_MS = 1000
+STREAM_MAX_INFLIGHT = 5000  # stop reading while this many entries are unhandled
+STREAM_CLAIM_IDLE_MS = 30000  # take over entries a dead consumer left pending
+STREAM_CLAIM_INTERVAL = 10.0  # seconds between checks for such entries
+
+# Web server outbound queues
+SEND_QUEUE_SIZE = 256
+# what to do when a client's queue is full: 'drop_oldest', 'latest' or 'disconnect'.
+# Dropped room patches show up as a version gap and the client asks to resync.
+SEND_QUEUE_POLICY = 'drop_oldest'
+
+# GET /rooms: open rooms per game type, served from a short-lived cache
+LOBBY_PAGE_SIZE = 20
+LOBBY_MAX_PAGE_SIZE = 100
+LOBBY_CACHE_TTL = 1.0  # seconds
+
+# GET /leaderboard: top players and ranks, served from a short-lived cache
+LEADERBOARD_PAGE_SIZE = 10
+LEADERBOARD_MAX_PAGE_SIZE = 100
+LEADERBOARD_CACHE_TTL = 2.0  # seconds
+
+# Resumable websocket sessions. Every web server must share the secret; if
+# it isn't set, each process makes up its own (see sessions.py).
+SESSION_SECRET = os.environ.get('SESSION_SECRET')
+SESSION_TTL = 24 * 3600  # seconds a session token stays valid
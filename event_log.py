@@ -0,0 +1,178 @@
+"""Per-room event logs, for recovering rooms and replaying games.
+
+Every change the manager applies to a room is appended to that room's Redis
+stream as one small entry, [version, kind, *args]:
+
+    join    player_id, player_name
+    leave   player_id
+    state   player_id, player state
+    score   player_id, points
+    start   time, seed (the game's random numbers come from this seed)
+    action  player_id, action, data
+    timeout
+
+version is the room version when the change was applied; the change shows
+up in the next version published. Entry ids are the room's event sequence
+numbers, so "5-0" is the room's fifth event.
+
+Every EVENT_CHECKPOINT_INTERVAL events the room is snapshotted (see
+persistence.py) into a checkpoint hash of seq -> GameRoom.dump(). Only the
+newest EVENT_LOG_CHECKPOINTS are kept, and the log is trimmed to the events
+after the oldest of them. A room can be rebuilt at any point back to that
+checkpoint: load the checkpoint, then apply the events after it.
+
+Inspect a room's history with:
+
+    python event_log.py <room_id> [--seq N | --version V] [--events]
+"""
+import argparse
+import json
+import sys
+
+from game_config import PlayerState
+
+LOG_PREFIX = 'room_events:'
+CHECKPOINT_PREFIX = 'room_checkpoints:'
+
+# KEYS: checkpoint hash, event log. ARGV: checkpoints to keep.
+# Drops older checkpoints and the events up to the oldest one kept.
+COMPACT_SCRIPT = """
+local seqs = redis.call('hkeys', KEYS[1])
+if #seqs == 0 then
+    return 0
+end
+for i, seq in ipairs(seqs) do
+    seqs[i] = tonumber(seq)
+end
+table.sort(seqs)
+local keep = tonumber(ARGV[1])
+for i = 1, #seqs - keep do
+    redis.call('hdel', KEYS[1], seqs[i])
+end
+local oldest = seqs[math.max(#seqs - keep + 1, 1)]
+return redis.call('xtrim', KEYS[2], 'MINID', (oldest + 1) .. '-0')
+"""
+
+
+def log_key(room_id):
+    return LOG_PREFIX + room_id
+
+
+def checkpoint_key(room_id):
+    return CHECKPOINT_PREFIX + room_id
+
+
+class EventLog:
+    """Appends room events through command(name, *args, **kwargs), e.g. the
+    manager's Publisher, so they go out in order with the room's publishes."""
+
+    def __init__(self, codec, command):
+        self.codec = codec
+        self.command = command
+
+    def append(self, room, kind, *args):
+        room.seq += 1
+        self.command('xadd', log_key(room.room_id),
+                     {'e': self.codec.encode([room.version, kind, *args])},
+                     id=f'{room.seq}-0')
+        return room.seq
+
+
+def decode_entries(codec, entries):
+    """XRANGE results as [(seq, event)]."""
+    events = []
+    for entry_id, fields in entries:
+        if isinstance(entry_id, bytes):
+            entry_id = entry_id.decode()
+        raw = fields.get(b'e', fields.get('e'))
+        events.append((int(entry_id.split('-')[0]), codec.decode(raw)))
+    return events
+
+
+def events_after(seq):
+    """The XRANGE min for the events following seq."""
+    return f'{seq + 1}-0'
+
+
+def apply_event(room, event):
+    """Re-apply one logged change to a GameRoom, as the manager applied it."""
+    version, kind, args = event[0], event[1], event[2:]
+    if kind == 'join':
+        room.add_player(*args)
+    elif kind == 'leave':
+        room.remove_player(*args)
+    elif kind == 'state':
+        room.set_player_state(args[0], PlayerState(args[1]))
+    elif kind == 'score':
+        room.add_score(*args)
+    elif kind == 'start':
+        room.start(*args)
+    elif kind == 'action':
+        room.apply_action(*args)
+    elif kind == 'timeout':
+        room.apply_timeout()
+    else:
+        raise ValueError(f"Unknown event kind: {kind}")
+    room.version = max(room.version, version)
+
+
+def replay(room, events, until_seq=None, until_version=None):
+    """Apply the events after room.seq, stopping after event until_seq or
+    before the first one not yet published at until_version."""
+    for seq, event in events:
+        if seq <= room.seq:
+            continue
+        if until_seq is not None and seq > until_seq:
+            break
+        if until_version is not None and event[0] >= until_version:
+            break
+        apply_event(room, event)
+        room.seq = seq
+    return room
+
+
+def pick_checkpoint(checkpoints, seq=None, version=None):
+    """The newest checkpoint at or before seq/version, or None."""
+    best = None
+    for data in checkpoints:
+        if seq is not None and data['seq'] > seq:
+            continue
+        if version is not None and data['version'] > version:
+            continue
+        if best is None or data['seq'] > best['seq']:
+            best = data
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild a room from its event log")
+    parser.add_argument('room_id')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--seq', type=int, help='state after this event')
+    target.add_argument('--version', type=int, help='state as published at this version')
+    parser.add_argument('--events', action='store_true', help='list the events instead')
+    args = parser.parse_args(argv)
+
+    import redis
+    from codec import get_codec
+    from config import REDIS_HOST, REDIS_PORT
+    from game_room_manager import GameRoom
+
+    codec = get_codec()
+    r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT)
+    checkpoints = [codec.decode(raw) for raw in r.hvals(checkpoint_key(args.room_id))]
+    events = decode_entries(codec, r.xrange(log_key(args.room_id)))
+    if args.events:
+        for seq, event in events:
+            print(seq, json.dumps(event))
+        return
+
+    checkpoint = pick_checkpoint(checkpoints, args.seq, args.version)
+    if checkpoint is None:
+        sys.exit(f"No checkpoint of room {args.room_id} that early")
+    room = replay(GameRoom.load(checkpoint), events, args.seq, args.version)
+    print(json.dumps(room.dump(), indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main()
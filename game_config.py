@@ -13,6 +13,55 @@ MIN_PLAYERS_TO_START = 2
 MATCHMAKING_TIMEOUT = 30  # seconds
 GAME_ROUND_TIME = 60  # seconds
 
+# Quick match (see matchmaking.py)
+MATCHMAKING_INTERVAL = 0.5  # seconds between queue pulls on each manager
+DEFAULT_RATING = 1000
+MATCH_RATING_BAND = 100  # initial +/- rating range of a match
+MATCH_BAND_WIDEN_PER_SEC = 25  # range growth per second waited
+MATCH_MAX_BAND = 1000
+MATCH_FILL_AFTER = 5  # seconds; after this a room may start below its max size
+
+# Room state broadcasts are patches against the previous version, with a
+# full snapshot every this many versions
+STATE_SNAPSHOT_INTERVAL = 50
+
+# 0 publishes a room update for every change. Otherwise a room's changes are
+# merged and published at most this many times a second (e.g. 20-60), every
+# changed room in one pipeline.
+ROOM_TICK_RATE = 0
+
+# The room manager's timer wheel (see scheduler.py) advances in steps of this
+SCHEDULER_TICK = 0.1  # seconds
+
+# Room snapshots and standby managers (see persistence.py)
+PERSIST_INTERVAL = 0.5  # seconds between snapshot writes
+LEADER_LEASE_TTL = 5.0  # seconds a standby waits after the active manager dies
+
+# Room event logs (see event_log.py)
+EVENT_CHECKPOINT_INTERVAL = 50  # events between room snapshots
+EVENT_LOG_CHECKPOINTS = 4  # snapshots kept per room; older events are trimmed
+EVENT_LOG_TTL = 86400  # seconds a closed room's log is kept for replays
+
+# Presence (see presence.py)
+PRESENCE_INTERVAL = 5.0  # seconds between heartbeats
+PRESENCE_TIMEOUT = 20.0  # players silent this long are taken out of their rooms
+PRESENCE_FORGET = 300.0  # and dropped from presence tracking after this long
+REAP_INTERVAL = 5.0  # seconds between checks for silent players
+
+# Leaderboards (see leaderboard.py)
+LEADERBOARD_FLUSH_INTERVAL = 1.0  # seconds between batched score writes
+LEADERBOARD_DAY_TTL = 8 * 86400  # seconds a daily board is kept after its last write
+LEADERBOARD_WEEK_TTL = 5 * 7 * 86400  # and a weekly one
+
+# Asyncio players (see async_game_player.py)
+PLAYER_HUB_CONNECTIONS = 8  # command connections shared by all players in a process
+PLAYER_UPDATE_QUEUE = 256  # frames held per player for updates(); the oldest are dropped
+
+# Sharded room managers (see sharding.py)
+SHARD_HEARTBEAT_INTERVAL = 1.0  # seconds
+SHARD_TTL = 5.0  # a shard silent for this long is considered dead
+ROOM_LEASE_TTL = 10.0  # seconds; renewed on every heartbeat
+
 # Game states
 class GameState(Enum):
     WAITING = "waiting"
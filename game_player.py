@@ -1,10 +1,18 @@
 import redis
-import json
+import threading
 import uuid
 import time
 import sys
 from game_config import *
-from config import REDIS_HOST, REDIS_PORT
+from config import (
+    REDIS_HOST, REDIS_PORT, ROOM_RESYNC_CHANNEL, GAME_ACTION_CHANNEL,
+    room_state_channel, player_channel
+)
+from state_delta import apply_patch
+from codec import get_codec
+from sharding import ShardRouter, live_shards
+from transport import get_transport
+from presence import PRESENCE_KEY
 
 class GamePlayer:
     def __init__(self, name):
@@ -15,17 +23,48 @@ class GamePlayer:
             port=REDIS_PORT,
             decode_responses=True
         )
+        # frames may be binary, so subscriptions read raw bytes
+        self.raw_redis = redis.Redis(host=REDIS_HOST, port=REDIS_PORT)
+        self.codec = get_codec()
+        self.router = ShardRouter()
+        self.transport = get_transport()
         self.current_room = None
         self.state = PlayerState.IDLE
+        self.room_state = None
+        self.room_version = 0
+        self.resync_pending = False
+        self.private_state = {}
+        self.heartbeat_stop = threading.Event()
+
+    def start_heartbeat(self):
+        """Report this player as connected until stop_heartbeat(); a player
+        who goes quiet is taken out of their room by the manager."""
+        def beat():
+            while not self.heartbeat_stop.is_set():
+                try:
+                    self.redis.zadd(PRESENCE_KEY, {self.player_id: time.time()})
+                except redis.RedisError as e:
+                    print(f"Heartbeat failed: {e}")
+                self.heartbeat_stop.wait(PRESENCE_INTERVAL)
+        self.heartbeat_stop.clear()
+        threading.Thread(target=beat, daemon=True).start()
+
+    def stop_heartbeat(self):
+        self.heartbeat_stop.set()
         
-    def create_game(self, game_type):
+    def create_game(self, game_type, options=None):
+        room_id = str(uuid.uuid4())
         message = {
             'action': 'create',
             'player_id': self.player_id,
             'player_name': self.name,
-            'game_type': game_type
+            'game_type': game_type,
+            'room_id': room_id
         }
-        self.redis.publish(MATCHMAKING_CHANNEL, json.dumps(message))
+        if options:
+            message['options'] = options
+        self._send(MATCHMAKING_CHANNEL, message)
+        self._enter_room(room_id)
         
     def join_game(self, room_id):
         message = {
@@ -34,19 +73,60 @@ class GamePlayer:
             'player_name': self.name,
             'room_id': room_id
         }
-        self.redis.publish(MATCHMAKING_CHANNEL, json.dumps(message))
-        self.current_room = room_id
+        self._send(MATCHMAKING_CHANNEL, message)
+        self._enter_room(room_id)
         
+    def quick_match(self, game_type):
+        """Queue for a game; the manager replies 'matched' with a room."""
+        self._send(MATCHMAKING_CHANNEL, {
+            'action': 'quick_match',
+            'player_id': self.player_id,
+            'player_name': self.name,
+            'game_type': game_type
+        })
+
+    def cancel_match(self):
+        self._send(MATCHMAKING_CHANNEL, {'action': 'cancel_match', 'player_id': self.player_id})
+
     def leave_game(self):
         if not self.current_room:
             return
             
         message = {
             'action': 'leave',
-            'player_id': self.player_id
+            'player_id': self.player_id,
+            'room_id': self.current_room
         }
-        self.redis.publish(MATCHMAKING_CHANNEL, json.dumps(message))
-        self.current_room = None
+        self._send(MATCHMAKING_CHANNEL, message)
+        self._enter_room(None)
+
+    def _send(self, channel, message):
+        # straight to the owning manager shard when managers are sharded
+        if self.router.refresh_due():
+            self.router.update(live_shards(self.redis))
+        channel = self.router.channel_for(channel, message.get('room_id'))
+        self.transport.send(self.redis, channel, self.codec.encode(message))
+
+    def _enter_room(self, room_id):
+        self.current_room = room_id
+        self.room_state = None
+        self.room_version = 0
+        self.resync_pending = False
+        self.private_state = {}
+
+    def channels(self):
+        """Channels to listen on: the current room and our own replies."""
+        channels = [player_channel(self.player_id)]
+        if self.current_room:
+            channels.append(room_state_channel(self.current_room))
+        return channels
+
+    def request_resync(self):
+        if self.current_room:
+            self._send(ROOM_RESYNC_CHANNEL, {
+                'room_id': self.current_room,
+                'player_id': self.player_id
+            })
         
     def set_ready(self, is_ready=True):
         if not self.current_room:
@@ -55,9 +135,10 @@ class GamePlayer:
         new_state = PlayerState.READY if is_ready else PlayerState.NOT_READY
         message = {
             'player_id': self.player_id,
+            'room_id': self.current_room,
             'state': new_state.value
         }
-        self.redis.publish(PLAYER_STATE_CHANNEL, json.dumps(message))
+        self._send(PLAYER_STATE_CHANNEL, message)
         
     def submit_score(self, score):
         if not self.current_room:
@@ -65,13 +146,30 @@ class GamePlayer:
             
         message = {
             'player_id': self.player_id,
+            'room_id': self.current_room,
             'score': score
         }
-        self.redis.publish(PLAYER_STATE_CHANNEL, json.dumps(message))
+        self._send(PLAYER_STATE_CHANNEL, message)
+
+    def play(self, action, data):
+        """Send a game action, e.g. play('answer', {'answer': 'Paris'})."""
+        if not self.current_room:
+            return
+
+        message = {
+            'player_id': self.player_id,
+            'room_id': self.current_room,
+            'action': action,
+            'data': data
+        }
+        self._send(GAME_ACTION_CHANNEL, message)
         
     def monitor_game_state(self):
-        pubsub = self.redis.pubsub()
-        pubsub.subscribe(GAME_STATE_CHANNEL)
+        if not self.current_room:
+            return
+
+        pubsub = self.raw_redis.pubsub()
+        pubsub.subscribe(*self.channels())
         
         print(f"🎮 Player {self.name} ({self.player_id}) is active...")
         
@@ -79,9 +177,49 @@ class GamePlayer:
             if message['type'] != 'message':
                 continue
                 
-            game_state = json.loads(message['data'])
-            if self.current_room and game_state['room_id'] == self.current_room:
-                self._handle_game_update(game_state)
+            self._handle_frame(self.codec.decode(message['data']))
+
+    def _handle_frame(self, frame):
+        """Apply a snapshot or patch to the local room state."""
+        if frame.get('type') == 'private':
+            self.private_state = frame['state']
+            if self.room_state is not None:
+                self._handle_game_update(self.room_state)
+            return
+        if frame.get('type') == 'action_result':
+            print(f"🎯 {frame['action']}: {frame['result']}")
+            return
+        if frame.get('type') == 'error':
+            print(f"⚠️  {frame['message']}")
+            return
+        if frame.get('type') == 'queued':
+            print(f"⏳ Waiting for a {frame['game_type']} match (rating {frame['rating']:.0f})")
+            return
+        if frame.get('type') == 'match_timeout':
+            print("⌛ No match found, try again")
+            return
+        if frame.get('type') == 'matched':
+            print(f"🤝 Matched into room {frame['room_id']}")
+            self._enter_room(frame['room_id'])
+            # the room's state is fetched once we listen on its channel
+            self.resync_pending = True
+            return
+        if frame.get('type') == 'snapshot':
+            self.room_state = frame['state']
+            self.resync_pending = False
+        elif frame.get('type') == 'patch':
+            if self.room_state is None or frame['version'] != self.room_version + 1:
+                # missed an update (or subscribed mid-stream); ask for a snapshot
+                if not self.resync_pending:
+                    self.resync_pending = True
+                    self.request_resync()
+                self.room_state = None
+                return
+            self.room_state = apply_patch(self.room_state, frame['ops'])
+        else:
+            return
+        self.room_version = frame['version']
+        self._handle_game_update(self.room_state)
                 
     def _handle_game_update(self, game_state):
         state = GameState(game_state['state'])
@@ -95,8 +233,18 @@ class GamePlayer:
             status = "👑 " if pid == self.player_id else "👤 "
             print(f"{status}{pdata['name']} - Status: {pdata['state']} - Score: {pdata['score']}")
             
+        game = dict(game_state.get('game') or {}, **self.private_state)
         if state == GameState.IN_PROGRESS:
             print("🎮 Game is in progress!")
+            if 'question' in game:
+                print(f"❓ {game['question']['text']} {game['question']['options']}")
+            if game.get('current_letter'):
+                print(f"🔤 Next word starts with '{game['current_letter']}'"
+                      + (" - your turn!" if game.get('is_my_turn') else ""))
+            if 'waiting_for' in game:
+                print(f"✊ Round {game['current_round']} of {game['max_rounds']}")
+        elif state == GameState.FINISHED and game.get('winner_name'):
+            print(f"🏆 Winner: {game['winner_name']}")
             
 def main():
     if len(sys.argv) < 2:
@@ -105,6 +253,7 @@ def main():
         
     player_name = sys.argv[1]
     player = GamePlayer(player_name)
+    player.start_heartbeat()
     
     # Simple command menu
     print("\nCommands:")
@@ -113,6 +262,8 @@ def main():
     print("3. Toggle ready status")
     print("4. Leave room")
     print("5. Submit score (test)")
+    print("6. Game action (answer/move/choose)")
+    print("7. Quick match")
     print("q. Quit")
     
     try:
@@ -121,7 +272,12 @@ def main():
             
             if cmd == '1':
                 game_type = input("Enter game type: ")
-                player.create_game(game_type)
+                options = {}
+                if game_type.strip().lower() == 'trivia':
+                    category = input("Category (blank for any): ").strip()
+                    if category:
+                        options['category'] = category
+                player.create_game(game_type, options)
             elif cmd == '2':
                 room_id = input("Enter room ID: ")
                 player.join_game(room_id)
@@ -132,20 +288,41 @@ def main():
             elif cmd == '5':
                 score = int(input("Enter score: "))
                 player.submit_score(score)
+            elif cmd == '6':
+                action = input("Enter action: ").strip()
+                key = {'answer': 'answer', 'move': 'word', 'choose': 'move'}.get(action, action)
+                player.play(action, {key: input(f"Enter {key}: ").strip()})
+            elif cmd == '7':
+                player.quick_match(input("Enter game type: "))
             elif cmd.lower() == 'q':
                 break
             
-            # Monitor game state for a short while after each command
-            pubsub = player.redis.pubsub()
-            pubsub.subscribe(GAME_STATE_CHANNEL)
-            timeout = time.time() + 2  # Monitor for 2 seconds
+            queued = cmd == '7' and not player.current_room
+            if not player.current_room and not queued:
+                continue
+
+            # Monitor game state for a short while after each command;
+            # after queueing, until matched (or the queue times out)
+            pubsub = player.raw_redis.pubsub()
+            subscribed = set(player.channels())
+            pubsub.subscribe(*subscribed)
+            timeout = time.time() + (MATCHMAKING_TIMEOUT + 2 if queued else 2)
             
             while time.time() < timeout:
                 message = pubsub.get_message()
                 if message and message['type'] == 'message':
-                    game_state = json.loads(message['data'])
-                    if player.current_room and game_state['room_id'] == player.current_room:
-                        player._handle_game_update(game_state)
+                    frame = player.codec.decode(message['data'])
+                    player._handle_frame(frame)
+                    if frame.get('type') == 'matched':
+                        timeout = time.time() + 2
+                    elif frame.get('type') == 'match_timeout':
+                        break
+                # follow the player into a matched room
+                missing = set(player.channels()) - subscribed
+                if missing:
+                    pubsub.subscribe(*missing)
+                    subscribed |= missing
+                    player.request_resync()
                 time.sleep(0.1)
             
             pubsub.unsubscribe()
@@ -154,6 +331,7 @@ def main():
         print("\nExiting...")
     finally:
         player.leave_game()
+        player.stop_heartbeat()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -1,45 +1,318 @@
+import argparse
+import asyncio
+import copy
+import random
 import redis
-import json
+import sys
+import redis.asyncio as aioredis
 import time
 import uuid
 from game_config import *
-from config import REDIS_HOST, REDIS_PORT
+from config import (
+    REDIS_HOST, REDIS_PORT, GAME_LIST_CHANNEL, ROOM_RESYNC_CHANNEL,
+    GAME_JOIN_CHANNEL, GAME_LEAVE_CHANNEL, GAME_READY_CHANNEL, GAME_ACTION_CHANNEL,
+    ROOM_UPDATE_BUFFER, room_state_channel, room_updates_key, player_channel
+)
+from games import GameFactory, GameStatus, GameType, PlayerAction
+from games.dictionary import get_dictionary
+from games.question_bank import get_question_bank
+from state_delta import diff
+from codec import get_codec
+from scheduler import TimerWheel
+from matchmaking import Matchmaker
+from presence import Presence
+from lobby import index_commands, remove_commands
+from transport import get_transport, MANAGER_CHANNELS
+from sharding import (
+    HashRing, SHARDS_KEY, RENEW_LEASE_SCRIPT, RELEASE_LEASE_SCRIPT,
+    inbox_channel, lease_key
+)
+from persistence import SnapshotWriter, load_snapshot, leader_key, leader_token
+from event_log import EventLog, decode_entries, events_after, log_key, replay
+from leaderboard import LeaderboardWriter
+
+# mailbox channel for the manager's own timeouts; never subscribed to
+TIMER_CHANNEL = 'timer'
 
 class GameRoom:
-    def __init__(self, room_id, game_type, max_players=MAX_PLAYERS_PER_ROOM):
+    # a manager holds many rooms; slots keep each one small
+    __slots__ = ('game', 'room_id', 'game_type', 'options', 'max_players', 'state', 'start_time',
+                 'version', 'seq', 'checkpoint_seq', 'ranked', 'deadline')
+
+    def __init__(self, room_id, game_type, max_players=MAX_PLAYERS_PER_ROOM, options=None):
+        self.game = GameFactory.create_game(game_type or '', room_id, options)
+        if self.game is None:
+            raise ValueError(f"Unknown game type: {game_type}")
         self.room_id = room_id
-        self.game_type = game_type
-        self.max_players = max_players
-        self.players = {}  # player_id: {name, state, score}
+        self.game_type = game_type.lower()
+        self.options = options or {}
+        self.max_players = min(max_players, self.game.max_players)
+        self.game.round_time = GAME_ROUND_TIME
         self.state = GameState.WAITING
-        self.scores = {}
         self.start_time = None
+        self.version = 0  # bumped on every published change
+        self.seq = 0  # events logged (see event_log.py)
+        self.checkpoint_seq = 0  # seq of the last saved snapshot
+        self.ranked = {}  # player_id: score already on the leaderboards
+        self.deadline = None  # when the current turn, round or wait times out
+
+    @property
+    def players(self):
+        """player_id: PlayerRecord (name, score, ready, state), shared with the game."""
+        return self.game.players
+
+    def add_player(self, player_id, player_name):
+        self.game.add_player(player_id, player_name)
+
+    def remove_player(self, player_id):
+        self.ranked.pop(player_id, None)
+        self.game.remove_player(player_id)
+        if self.state == GameState.IN_PROGRESS and len(self.players) < MIN_PLAYERS_TO_START:
+            self.game.finish()
+            self.state = GameState.FINISHED
+
+    def set_player_state(self, player_id, new_state):
+        self.players[player_id].state = new_state.value
+        self.game.set_player_ready(player_id, new_state == PlayerState.READY)
+
+    def add_score(self, player_id, points):
+        """Points sent by a client rather than awarded by the game: shown in
+        the room, but counted as already ranked so they never reach the
+        leaderboards."""
+        self.game.update_score(player_id, points)
+        self.ranked[player_id] = self.ranked.get(player_id, 0) + points
+
+    def unranked_points(self):
+        """Points scored since the last call, as player_id: (name, points)."""
+        points = {}
+        for player_id, player in self.players.items():
+            added = player.score - self.ranked.get(player_id, 0)
+            if added:
+                points[player_id] = (player.name, added)
+                self.ranked[player_id] = player.score
+        return points
+
+    def can_start(self):
+        return (
+            self.state == GameState.WAITING
+            and len(self.players) >= MIN_PLAYERS_TO_START
+            and self.game.can_start()
+        )
+
+    def start(self, now, seed=None):
+        """Start the game with its random numbers drawn from seed; returns
+        the seed so the start can be logged and replayed exactly."""
+        seed = random.getrandbits(64) if seed is None else seed
+        self.state = GameState.IN_PROGRESS
+        self.start_time = now
+        self.game.seed(seed)
+        self.game.start_game()
+        return seed
+
+    def apply_action(self, player_id, action, data):
+        """Validate and apply a game action; returns handle_action's result."""
+        try:
+            action = PlayerAction(action)
+        except ValueError:
+            return {"error": "Invalid action"}
+        if not isinstance(data, dict):
+            return {"error": "Invalid action data"}
+        result = self.game.handle_action(player_id, action, data)
+        self._sync_game()
+        return result
+
+    def apply_timeout(self):
+        """The current turn or round ran out of time."""
+        result = self.game.handle_timeout()
+        self._sync_game()
+        return result
+
+    def _sync_game(self):
+        if self.game.status == GameStatus.FINISHED:
+            self.state = GameState.FINISHED
 
     def to_json(self):
+        # fresh containers, so a published state never aliases live room data
+        return {
+            'room_id': self.room_id,
+            'game_type': self.game_type,
+            'players': {pid: {'name': p.name, 'state': p.state, 'score': p.score}
+                        for pid, p in self.players.items()},
+            'state': self.state.value,
+            'start_time': self.start_time,
+            'deadline': self.deadline,
+            'game': copy.deepcopy(self.game.get_state())
+        }
+
+    def dump(self):
+        """Everything needed to rebuild the room, including the game's own
+        state (which holds the players)."""
         return {
             'room_id': self.room_id,
             'game_type': self.game_type,
-            'players': self.players,
+            'max_players': self.max_players,
+            'options': self.options,
             'state': self.state.value,
-            'scores': self.scores,
-            'start_time': self.start_time
+            'start_time': self.start_time,
+            'version': self.version,
+            'seq': self.seq,
+            'ranked': self.ranked,
+            'game': self.game.snapshot()
         }
 
+    @classmethod
+    def load(cls, data):
+        room = cls(data['room_id'], data['game_type'], data['max_players'], data.get('options'))
+        room.state = GameState(data['state'])
+        room.start_time = data['start_time']
+        room.version = data['version']
+        room.seq = room.checkpoint_seq = data.get('seq', 0)
+        room.ranked = data.get('ranked', {})
+        room.game.restore(data['game'])
+        # older snapshots kept the room's player states apart from the game's
+        for player_id, player in data.get('players', {}).items():
+            if player_id in room.players:
+                room.players[player_id].state = sys.intern(player['state'])
+        return room
+
+class Publisher:
+    """Buffers publishes (and index updates) and sends them in pipelined batches.
+
+    publish() never waits on Redis. While one batch is in flight, everything
+    published by any room piles up and goes out in the next pipeline.
+
+    If Redis can't be reached, the fan-out frames in the batch are dropped
+    (clients resync from the next one), and every other command (event log
+    appends, snapshots, indexes, leaderboards) is retried ahead of newer ones.
+    """
+
+    # room frames and the resume buffer behind them; safe to lose
+    DROPPABLE = frozenset(('publish', 'rpush', 'ltrim'))
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self.pending = []
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    def publish(self, channel, payload):
+        self.command('publish', channel, payload)
+
+    def command(self, name, *args, **kwargs):
+        """Queue any Redis command to go out, in order, with the publishes."""
+        self.pending.append((name, args, kwargs))
+        self.wakeup.set()
+
+    async def _run(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            batch, self.pending = self.pending, []
+            if not batch:
+                continue
+            pipe = self.redis.pipeline(transaction=False)
+            for name, args, kwargs in batch:
+                getattr(pipe, name)(*args, **kwargs)
+            try:
+                await pipe.execute(raise_on_error=False)
+            except (redis.ConnectionError, redis.TimeoutError, OSError) as e:
+                kept = [c for c in batch if c[0] not in self.DROPPABLE]
+                print(f"Dropped {len(batch) - len(kept)} publishes, retrying {len(kept)} commands: {e}")
+                if kept:
+                    # an event appended twice is refused by its explicit id
+                    self.pending = kept + self.pending
+                    await asyncio.sleep(0.5)
+                    self.wakeup.set()
+
+def well_formed(data):
+    """Whether a decoded manager message can be routed: a dict whose room and
+    player ids, if given, are strings."""
+    return (isinstance(data, dict)
+            and isinstance(data.get('room_id') or '', str)
+            and isinstance(data.get('player_id') or '', str))
+
+class RoomActor:
+    """Owns one room and handles its messages in order on its own task,
+    so a busy room never holds up the others."""
+
+    def __init__(self, manager, room_id):
+        self.manager = manager
+        self.room_id = room_id
+        self.mailbox = asyncio.Queue()
+        self.task = asyncio.create_task(self._run())
+
+    def post(self, channel, data, token=None):
+        self.mailbox.put_nowait((channel, data, token))
+
+    async def _run(self):
+        transport = self.manager.transport
+        while self.room_id in self.manager.rooms:
+            channel, data, token = await self.mailbox.get()
+            try:
+                self.manager._dispatch(channel, data)
+            except Exception as e:
+                print(f"Room {self.room_id}: error handling {channel} message: {e}")
+            transport.done(token)
+        self.manager.actors.pop(self.room_id, None)
+        # the room closed; nothing left to apply these to
+        while not self.mailbox.empty():
+            transport.done(self.mailbox.get_nowait()[2])
+
 class GameRoomManager:
-    def __init__(self):
-        self.redis = redis.Redis(
+    def __init__(self, shard_id=None, tick_rate=ROOM_TICK_RATE, redis_client=None, raw_redis=None):
+        # clients can be passed in, e.g. in-process fakes for benchmarks
+        self.redis = redis_client or aioredis.Redis(
             host=REDIS_HOST, 
             port=REDIS_PORT, 
             decode_responses=True
         )
+        # frames may be binary, so subscriptions read raw bytes
+        self.raw_redis = raw_redis or aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT)
+        self.codec = get_codec()
+        self.transport = get_transport()
+        self.publisher = Publisher(self.redis)
         self.rooms = {}  # room_id: GameRoom
+        self.actors = {}  # room_id: RoomActor
         self.player_room_map = {}  # player_id: room_id
+        self.published = {}  # room_id: last broadcast state, the base for patches
+        self.private_views = {}  # room_id: {player_id: last private game view sent}
+        self.timers = TimerWheel(SCHEDULER_TICK)
+        self.matchmaker = Matchmaker(self.redis)
+        self.presence = Presence(self.redis)
+        self.match_sizes = None  # game_type: (min players, max players)
+        self.snapshots = SnapshotWriter(self.codec)
+        self.events = EventLog(self.codec, self.publisher.command)
+        self.leaderboards = LeaderboardWriter()
+        self.leader_token = leader_token()
+        self.room_timers = {}  # room_id: (timer key, Timer)
+        # 0 publishes every change at once; otherwise at most tick_rate updates per room per second
+        self.tick_rate = tick_rate
+        self.dirty_rooms = {}  # room_id: whether a snapshot was asked for
 
-    def create_room(self, game_type):
-        room_id = str(uuid.uuid4())
-        room = GameRoom(room_id, game_type)
-        self.rooms[room_id] = room
+        # None runs a single unsharded manager on the shared channels
+        self.shard_id = shard_id
+        self.ring = HashRing()
+        self.renew_lease = self.redis.register_script(RENEW_LEASE_SCRIPT)
+        self.release_lease = self.redis.register_script(RELEASE_LEASE_SCRIPT)
+
+    def create_room(self, game_type, room_id=None, options=None):
+        # clients may pick the room id so they can subscribe before it exists
+        room_id = room_id or str(uuid.uuid4())
+        if room_id in self.rooms:
+            return None
+        try:
+            room = GameRoom(room_id, game_type, options=options)
+        except (ValueError, TypeError, AttributeError):
+            # an unknown game type or options it can't use
+            return None
+        self._add_room(room)
+        # the first checkpoint, which holds what the game drew when created
+        self.snapshots.mark(room_id)
         self._broadcast_room_update(room)
+        self._broadcast_lobby_update(room, 'room_created')
         return room_id
 
     def join_room(self, room_id, player_id, player_name):
@@ -47,16 +320,22 @@ class GameRoomManager:
             return False, "Room not found"
         
         room = self.rooms[room_id]
+        if player_id in room.players:
+            return False, "Already in room"
+
+        # a game counts its players; nobody joins once it has started
+        if room.state != GameState.WAITING:
+            return False, "Game already started"
+
         if len(room.players) >= room.max_players:
             return False, "Room is full"
-        
-        room.players[player_id] = {
-            'name': player_name,
-            'state': PlayerState.NOT_READY.value,
-            'score': 0
-        }
+
+        room.add_player(player_id, player_name)
+        self._log(room, 'join', player_id, player_name)
         self.player_room_map[player_id] = room_id
-        self._broadcast_room_update(room)
+        # the new player has no base to apply a patch to
+        self._broadcast_room_update(room, snapshot=True)
+        self._broadcast_lobby_update(room, 'room_updated')
         return True, "Joined successfully"
 
     def leave_room(self, player_id):
@@ -65,13 +344,19 @@ class GameRoomManager:
         
         room_id = self.player_room_map[player_id]
         room = self.rooms[room_id]
-        del room.players[player_id]
+        room.remove_player(player_id)
+        self._log(room, 'leave', player_id)
         del self.player_room_map[player_id]
+        self.private_views.get(room_id, {}).pop(player_id, None)
         
         if len(room.players) == 0:
-            del self.rooms[room_id]
+            self._close_room(room)
         else:
+            # everyone left may be ready now that a straggler has gone
+            if room.can_start():
+                self._start_game(room)
             self._broadcast_room_update(room)
+            self._broadcast_lobby_update(room, 'room_updated')
         return True, "Left successfully"
 
     def update_player_state(self, player_id, new_state):
@@ -80,12 +365,12 @@ class GameRoomManager:
         
         room_id = self.player_room_map[player_id]
         room = self.rooms[room_id]
-        room.players[player_id]['state'] = new_state.value
+        room.set_player_state(player_id, new_state)
+        self._log(room, 'state', player_id, new_state.value)
         
-        # Check if all players are ready
-        if all(p['state'] == PlayerState.READY.value for p in room.players.values()):
-            if len(room.players) >= MIN_PLAYERS_TO_START:
-                self._start_game(room)
+        # Start once every player is ready and the game has enough of them
+        if room.can_start():
+            self._start_game(room)
         
         self._broadcast_room_update(room)
         return True, "State updated"
@@ -96,53 +381,707 @@ class GameRoomManager:
         
         room_id = self.player_room_map[player_id]
         room = self.rooms[room_id]
-        room.players[player_id]['score'] += score_delta
+        room.add_score(player_id, score_delta)
+        self._log(room, 'score', player_id, score_delta)
         self._broadcast_room_update(room)
         return True, "Score updated"
 
+    def handle_action(self, player_id, action, data):
+        # the player gets an action_result whatever happens, failures included
+        if player_id not in self.player_room_map:
+            result = {'success': False, 'error': "Player not in any room"}
+            self._action_result(player_id, None, action, result)
+            return False, result['error']
+
+        room = self.rooms[self.player_room_map[player_id]]
+        try:
+            result = room.apply_action(player_id, action, data)
+        except Exception as e:
+            print(f"Room {room.room_id}: error applying {action!r} for {player_id}: {e}")
+            result = {'error': "Action failed"}
+        if 'error' in result:
+            result['success'] = False
+        self._action_result(player_id, room.room_id, action, result)
+        if 'error' in result:
+            return False, result['error']
+
+        self._log(room, 'action', player_id, action, data)
+        self._broadcast_room_update(room)
+        if room.state == GameState.FINISHED:
+            self._broadcast_lobby_update(room, 'room_updated')
+        return True, "Action applied"
+
     def _start_game(self, room):
-        room.state = GameState.IN_PROGRESS
-        room.start_time = time.time()
+        # the caller broadcasts the room once for the ready and the start
+        now = time.time()
+        self._log(room, 'start', now, room.start(now))
+        self._broadcast_lobby_update(room, 'room_updated')
+
+    def _log(self, room, kind, *args):
+        self.events.append(room, kind, *args)
+        # snapshot now and then, so recovery never replays a long log
+        if room.seq - room.checkpoint_seq >= EVENT_CHECKPOINT_INTERVAL:
+            self.snapshots.mark(room.room_id)
+
+    def _arm_timer(self, room):
+        """Keep one timer per room for whatever it is waiting on: enough
+        players to join, or the current turn/question/round."""
+        key = delay = None
+        if room.state == GameState.WAITING and len(room.players) < MIN_PLAYERS_TO_START:
+            key, delay = ('matchmaking', len(room.players)), MATCHMAKING_TIMEOUT
+        elif room.state == GameState.IN_PROGRESS:
+            timed = room.game.timer()
+            if timed is not None:
+                key, delay = ('game', timed[0]), timed[1]
+
+        armed = self.room_timers.get(room.room_id)
+        if armed is not None:
+            if armed[0] == key:
+                return
+            self.timers.cancel(armed[1])
+            del self.room_timers[room.room_id]
+        room.deadline = None
+        if key is not None:
+            timer = self.timers.schedule(delay, self._timer_fired, room.room_id, key)
+            self.room_timers[room.room_id] = (key, timer)
+            room.deadline = time.time() + delay
+
+    def _timer_fired(self, room_id, key):
+        # handled on the room's actor like any other message
+        actor = self.actors.get(room_id)
+        if actor is not None:
+            actor.post(TIMER_CHANNEL, {'room_id': room_id, 'key': key})
+
+    def _handle_timeout(self, data):
+        room_id = data['room_id']
+        room = self.rooms.get(room_id)
+        armed = self.room_timers.get(room_id)
+        if room is None or armed is None or armed[0] != data['key']:
+            return
+        del self.room_timers[room_id]
+        if data['key'][0] == 'matchmaking':
+            self._expire_room(room)
+            return
+        room.apply_timeout()
+        self._log(room, 'timeout')
         self._broadcast_room_update(room)
+        if room.state == GameState.FINISHED:
+            self._broadcast_lobby_update(room, 'room_updated')
+
+    def _expire_room(self, room):
+        for player_id in room.players:
+            self._notify(player_id, {
+                'type': 'error',
+                'room_id': room.room_id,
+                'message': 'Room closed: not enough players joined in time'
+            })
+        self._close_room(room)
+
+    def _close_room(self, room):
+        self._drop_room(room.room_id)
+        self.snapshots.close(room.room_id)
+        self.publisher.command('delete', room_updates_key(room.room_id))
+        self._broadcast_lobby_update(room, 'room_closed')
+
+    async def _tick_timers(self):
+        while True:
+            await asyncio.sleep(SCHEDULER_TICK)
+            self.timers.advance()
 
-    def _broadcast_room_update(self, room):
-        self.redis.publish(GAME_STATE_CHANNEL, json.dumps(room.to_json()))
+    def _broadcast_room_update(self, room, snapshot=False):
+        self._arm_timer(room)
+        self.leaderboards.record(room)
+        if self.tick_rate:
+            # merged with the room's other changes and published on the next tick
+            self.dirty_rooms[room.room_id] = snapshot or self.dirty_rooms.get(room.room_id, False)
+            return
+        self._publish_room_update(room, snapshot)
+
+    async def _tick_rooms(self):
+        """Publish every room changed since the last tick. They all go out
+        in the publisher's next pipeline."""
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / self.tick_rate
+        next_tick = loop.time()
+        while True:
+            next_tick += interval
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            dirty, self.dirty_rooms = self.dirty_rooms, {}
+            for room_id, snapshot in dirty.items():
+                room = self.rooms.get(room_id)
+                if room is not None:
+                    self._publish_room_update(room, snapshot)
+
+    def _publish_room_update(self, room, snapshot=False):
+        state = room.to_json()
+        previous = self.published.get(room.room_id)
+        if previous is None:
+            snapshot = True
+        else:
+            ops = diff(previous, state)
+            if not ops and not snapshot:
+                return
+        room.version += 1
+        self.published[room.room_id] = state
+        if snapshot or room.version % STATE_SNAPSHOT_INTERVAL == 0:
+            self._publish_snapshot(room)
+        else:
+            self._publish_room_frame(room, self.codec.encode({
+                'type': 'patch',
+                'room_id': room.room_id,
+                'version': room.version,
+                'ops': ops,
+                'published_at': time.time()
+            }))
+        self._publish_private_views(room, state['game'])
+
+    def _publish_private_views(self, room, public_game, only=None):
+        """Send each player the parts of their get_state view that differ from
+        the public one (their turn, their move), when those change."""
+        sent = self.private_views.setdefault(room.room_id, {})
+        for player_id in ([only] if only else list(room.players)):
+            view = room.game.get_state(player_id)
+            private = {k: v for k, v in view.items() if public_game.get(k) != v}
+            if only is None and sent.get(player_id) == private:
+                continue
+            sent[player_id] = copy.deepcopy(private)
+            self._notify(player_id, {
+                'type': 'private',
+                'room_id': room.room_id,
+                'version': room.version,
+                'state': private
+            })
+
+    def _notify(self, player_id, frame):
+        self.publisher.publish(player_channel(player_id), self.codec.encode(frame))
+
+    def _action_result(self, player_id, room_id, action, result):
+        if player_id:
+            self._notify(player_id, {
+                'type': 'action_result',
+                'room_id': room_id,
+                'action': action,
+                'result': result
+            })
+
+    def _publish_snapshot(self, room):
+        self._publish_room_frame(room, self.codec.encode({
+            'type': 'snapshot',
+            'room_id': room.room_id,
+            'version': room.version,
+            'state': self.published[room.room_id],
+            'published_at': time.time()
+        }))
+
+    def _publish_room_frame(self, room, payload):
+        self.publisher.publish(room_state_channel(room.room_id), payload)
+        # the last few frames, for clients resuming after a dropped connection
+        key = room_updates_key(room.room_id)
+        self.publisher.command('rpush', key, payload)
+        self.publisher.command('ltrim', key, -ROOM_UPDATE_BUFFER, -1)
+
+    def _broadcast_lobby_update(self, room, event):
+        # only what a room list needs; full state stays on the room channel
+        summary = {
+            'room_id': room.room_id,
+            'game_type': room.game_type,
+            'state': room.state.value,
+            'players': len(room.players),
+            'max_players': room.max_players
+        }
+        if event == 'room_closed':
+            commands = remove_commands(room.room_id, room.game_type)
+        else:
+            commands = index_commands(summary)
+        # the index update goes out in the same pipeline as the event
+        for name, args in commands:
+            self.publisher.command(name, *args)
+        self.publisher.publish(GAME_LIST_CHANNEL, self.codec.encode(
+            dict(summary, type='lobby', event=event)
+        ))
 
     def run(self):
-        pubsub = self.redis.pubsub()
-        pubsub.subscribe([MATCHMAKING_CHANNEL, PLAYER_STATE_CHANNEL])
-        
-        print("🎮 Game Room Manager is running...")
-        
-        for message in pubsub.listen():
-            if message['type'] != 'message':
+        # load the word list and question index up front rather than inside the first room
+        get_dictionary()
+        get_question_bank()
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        await self._acquire_leadership()
+        self.publisher.start()
+        background = [
+            self.publisher.task,
+            asyncio.create_task(self._tick_timers()),
+            asyncio.create_task(self._matchmaking_loop()),
+            asyncio.create_task(self._persist_loop()),
+            asyncio.create_task(self._leaderboard_loop()),
+            asyncio.create_task(self._reap_loop())
+        ]
+        if self.tick_rate:
+            background.append(asyncio.create_task(self._tick_rooms()))
+        channels = list(MANAGER_CHANNELS)
+        if self.shard_id:
+            await self._heartbeat()
+            background.append(asyncio.create_task(self._shard_loop()))
+            channels += [inbox_channel(c, self.shard_id) for c in MANAGER_CHANNELS]
+            print(f"🎮 Game Room Manager shard {self.shard_id} is running...")
+        else:
+            print("🎮 Game Room Manager is running...")
+
+        listener = asyncio.create_task(self._listen(channels))
+        leader = asyncio.create_task(self._hold_leadership())
+        background += [listener, leader]
+        leading = True
+        try:
+            done, _ = await asyncio.wait([listener, leader], return_when=asyncio.FIRST_COMPLETED)
+            leading = leader not in done
+            for task in done:
+                task.result()
+        finally:
+            for task in background:
+                task.cancel()
+            if leading:
+                await self._step_down()
+
+    async def _acquire_leadership(self):
+        """Wait until no other manager runs this shard (standby mode)."""
+        ttl_ms = int(LEADER_LEASE_TTL * 1000)
+        waiting = False
+        while not await self.redis.set(leader_key(self.shard_id), self.leader_token,
+                                       nx=True, px=ttl_ms):
+            if not waiting:
+                print("Another manager is running these rooms; standing by")
+                waiting = True
+            await asyncio.sleep(LEADER_LEASE_TTL / 3)
+        if waiting:
+            print("Took over as the active manager")
+
+    async def _hold_leadership(self):
+        """Renew the leader lease; returns if another manager has taken it."""
+        ttl_ms = int(LEADER_LEASE_TTL * 1000)
+        while True:
+            await asyncio.sleep(LEADER_LEASE_TTL / 3)
+            try:
+                held = await self.renew_lease(keys=[leader_key(self.shard_id)],
+                                              args=[self.leader_token, ttl_ms])
+            except (redis.ConnectionError, redis.TimeoutError, OSError) as e:
+                print(f"Leader lease renewal failed: {e}")
                 continue
-                
-            data = json.loads(message['data'])
-            channel = message['channel']
-            
-            if channel == MATCHMAKING_CHANNEL:
-                self._handle_matchmaking(data)
-            elif channel == PLAYER_STATE_CHANNEL:
-                self._handle_player_state(data)
+            if not held:
+                print("Lost the leader lease to another manager, stopping")
+                return
+
+    async def _step_down(self):
+        # log the events still queued, save due snapshots and scores and let a standby take over now
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            command = lambda name, *args, **kwargs: getattr(pipe, name)(*args, **kwargs)
+            batch, self.publisher.pending = self.publisher.pending, []
+            for name, args, kwargs in batch:
+                command(name, *args, **kwargs)
+            self.snapshots.flush(self.rooms, command)
+            self.leaderboards.flush(command)
+            await self.release_lease(keys=[leader_key(self.shard_id)], args=[self.leader_token], client=pipe)
+            if self.shard_id is not None:
+                # other shards can adopt our rooms straight away
+                for room_id in self.rooms:
+                    await self.release_lease(keys=[lease_key(room_id)], args=[self.shard_id], client=pipe)
+            await pipe.execute()
+        except (redis.ConnectionError, redis.TimeoutError, OSError) as e:
+            print(f"Could not save rooms on shutdown: {e}")
+
+    async def _persist_loop(self):
+        while True:
+            await asyncio.sleep(PERSIST_INTERVAL)
+            self.snapshots.flush(self.rooms, self.publisher.command)
+
+    async def _leaderboard_loop(self):
+        while True:
+            await asyncio.sleep(LEADERBOARD_FLUSH_INTERVAL)
+            self.leaderboards.flush(self.publisher.command)
+
+    async def _reap_loop(self):
+        """Take players whose client stopped sending heartbeats out of
+        this manager's rooms, through each room's mailbox."""
+        while True:
+            await asyncio.sleep(REAP_INTERVAL)
+            try:
+                stale = await self.presence.stale()
+                evicted = []
+                for player_id in stale:
+                    room_id = self.player_room_map.get(player_id)
+                    actor = self.actors.get(room_id)
+                    if actor is not None:
+                        actor.post(GAME_LEAVE_CHANNEL, {'room_id': room_id, 'player_id': player_id})
+                        evicted.append(player_id)
+                await self.presence.forget(evicted)
+                if evicted:
+                    print(f"Removed {len(evicted)} players who stopped responding")
+            except (redis.ConnectionError, redis.TimeoutError, OSError) as e:
+                print(f"Presence check failed: {e}")
+
+    async def _listen(self, channels):
+        inbox_suffix = f':{self.shard_id}'
+        # stable across restarts and shared with standbys, so whoever runs the
+        # shard next gets the entries delivered to it but never handled
+        consumer = self.shard_id or 'manager'
+        delay = 0.5
+        while True:
+            try:
+                async for channel, payload, token in self.transport.listen(self.raw_redis, channels, consumer):
+                    delay = 0.5
+                    try:
+                        data = self.codec.decode(payload)
+                    except Exception:
+                        self.transport.done(token)
+                        continue
+                    if not well_formed(data):
+                        print(f"Ignored malformed message on {channel}: {data!r}")
+                        self.transport.done(token)
+                        continue
+                    inbox = self.shard_id is not None and channel.endswith(inbox_suffix)
+                    if inbox:
+                        channel = channel[:-len(inbox_suffix)]
+                    # with an exclusive transport no other shard sees the message either
+                    direct = inbox or self.transport.exclusive
+                    try:
+                        taken = await self._route(channel, data, direct, token)
+                    except (redis.ConnectionError, redis.TimeoutError, OSError):
+                        raise
+                    except Exception as e:
+                        # one bad message mustn't stop the listener
+                        print(f"Error routing {channel} message {data!r}: {e}")
+                        taken = False
+                    if not taken:
+                        self.transport.done(token)
+            except (redis.ConnectionError, redis.TimeoutError, OSError) as e:
+                print(f"Lost Redis {self.transport.name} connection ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 10.0)
+
+    async def _route(self, channel, data, direct=False, token=None):
+        """Hand a message to the actor of the room it concerns. Returns True
+        if an actor took it (and will report it done to the transport).
+
+        direct is True for messages only this shard received.
+        """
+        if channel == MATCHMAKING_CHANNEL and data.get('action') in ('quick_match', 'cancel_match'):
+            # queued players have no room yet; one shard per player handles these
+            player_id = data.get('player_id')
+            if player_id and (self.shard_id is None or direct
+                              or self.ring.node_for(player_id) == self.shard_id):
+                await self._handle_queue(data)
+            return False
+
+        # clients send the room id when they know it, so a ready that follows a
+        # join still queued in the room's mailbox is routed correctly
+        room_id = data.get('room_id') or self.player_room_map.get(data.get('player_id'))
+        creating = (
+            (channel == MATCHMAKING_CHANNEL and data.get('action') == 'create')
+            or (channel == GAME_JOIN_CHANNEL and bool(data.get('game_type')))
+        )
+
+        if self.shard_id is not None and room_id not in self.rooms:
+            if not room_id:
+                # every shard sees these on shared channels; only one answers
+                if direct:
+                    self._room_not_found(channel, data)
+                return False
+            owner = self.ring.node_for(room_id)
+            if owner != self.shard_id:
+                # a sender with a stale ring picked us; pass it on once.
+                # On shared pub/sub channels the owner already has its own copy.
+                if direct and not data.get('forwarded'):
+                    await self.transport.send(self.redis, inbox_channel(channel, owner),
+                                              self.codec.encode(dict(data, forwarded=True)))
+                return False
+            if creating:
+                if not await self.redis.set(lease_key(room_id), self.shard_id,
+                                            nx=True, px=int(ROOM_LEASE_TTL * 1000)):
+                    return False
+            elif not await self._adopt_room(room_id):
+                # a lease means another shard has it for now; none, that it's gone
+                if not await self.redis.exists(lease_key(room_id)):
+                    self._room_not_found(channel, data)
+                return False
+        elif room_id and room_id not in self.rooms and not creating:
+            # restarted or took over from another manager: rebuild on first use
+            if not await self._restore_room(room_id):
+                self._room_not_found(channel, data)
+                return False
+
+        if creating:
+            options = data.get('options')
+            room_id = self.create_room(data.get('game_type'), data.get('room_id'),
+                                       options if isinstance(options, dict) else None)
+            if room_id is None:
+                if data.get('player_id'):
+                    self._notify(data['player_id'], {
+                        'type': 'error',
+                        'room_id': data.get('room_id'),
+                        'message': f"Could not create a {data.get('game_type')} room"
+                    })
+                return False
+            # the creator joins through the room's own mailbox
+            data = {k: v for k, v in data.items() if k not in ('game_type', 'options')}
+            data.update(action='join', room_id=room_id)
+
+        actor = self.actors.get(room_id)
+        if actor is None:
+            self._room_not_found(channel, data)
+            return False
+        actor.post(channel, data, token)
+        return True
+
+    def _room_not_found(self, channel, data):
+        # so a client that got the room id wrong isn't left waiting
+        player_id = data.get('player_id')
+        if channel == GAME_ACTION_CHANNEL:
+            self._action_result(player_id, data.get('room_id'), data.get('action'),
+                                {'success': False, 'error': "Room not found"})
+        elif player_id and channel != GAME_LEAVE_CHANNEL and data.get('action') != 'leave':
+            self._notify(player_id, {'type': 'error', 'room_id': data.get('room_id'),
+                                     'message': "Room not found"})
+
+    def _sizes(self):
+        if self.match_sizes is None:
+            self.match_sizes = {}
+            for game_type in GameType:
+                game = GameFactory.create_game(game_type.value, 'size-probe')
+                if game is not None:
+                    self.match_sizes[game_type.value] = (
+                        MIN_PLAYERS_TO_START, min(MAX_PLAYERS_PER_ROOM, game.max_players)
+                    )
+        return self.match_sizes
+
+    async def _handle_queue(self, data):
+        player_id = data['player_id']
+        if data['action'] == 'cancel_match':
+            if await self.matchmaker.cancel(player_id):
+                self._notify(player_id, {'type': 'match_cancelled'})
+            return
+        game_type = (data.get('game_type') or '').lower()
+        if game_type not in self._sizes():
+            message = f"Unknown game type: {data.get('game_type')}"
+        elif player_id in self.player_room_map:
+            message = "Already in a room"
+        else:
+            rating = await self.matchmaker.enqueue(game_type, player_id, data.get('player_name'))
+            self._notify(player_id, {'type': 'queued', 'game_type': game_type, 'rating': rating})
+            return
+        self._notify(player_id, {'type': 'error', 'message': message})
+
+    async def _matchmaking_loop(self):
+        while True:
+            await asyncio.sleep(MATCHMAKING_INTERVAL)
+            try:
+                for game_type, (min_players, max_players) in self._sizes().items():
+                    expired, matches = await self.matchmaker.pull(game_type, min_players, max_players)
+                    for player_id in expired:
+                        self._notify(player_id, {'type': 'match_timeout', 'game_type': game_type})
+                    for players in matches:
+                        await self._start_match(game_type, players)
+            except (redis.ConnectionError, redis.TimeoutError, OSError) as e:
+                print(f"Matchmaking pull failed: {e}")
+
+    def _local_room_id(self):
+        """A new room id that hashes to this shard."""
+        room_id = str(uuid.uuid4())
+        if self.shard_id is not None and self.shard_id in self.ring.nodes:
+            while self.ring.node_for(room_id) != self.shard_id:
+                room_id = str(uuid.uuid4())
+        return room_id
+
+    async def _start_match(self, game_type, players):
+        room_id = self._local_room_id()
+        if self.shard_id is not None:
+            await self.redis.set(lease_key(room_id), self.shard_id, px=int(ROOM_LEASE_TTL * 1000))
+        if self.create_room(game_type, room_id) is None:
+            return
+        actor = self.actors[room_id]
+        for player_id, player_name in players:
+            self._notify(player_id, {'type': 'matched', 'room_id': room_id, 'game_type': game_type})
+            # matched players are ready to go; the game starts once all have joined
+            actor.post(GAME_JOIN_CHANNEL, {'room_id': room_id, 'player_id': player_id,
+                                           'player_name': player_name})
+            actor.post(GAME_READY_CHANNEL, {'room_id': room_id, 'player_id': player_id})
+
+    def _add_room(self, room):
+        self.rooms[room.room_id] = room
+        self.actors[room.room_id] = RoomActor(self, room.room_id)
+        self._arm_timer(room)
+        for player_id in room.players:
+            self.player_room_map[player_id] = room.room_id
+
+    def _drop_room(self, room_id):
+        room = self.rooms.pop(room_id, None)
+        actor = self.actors.pop(room_id, None)
+        self.published.pop(room_id, None)
+        self.private_views.pop(room_id, None)
+        self.dirty_rooms.pop(room_id, None)
+        armed = self.room_timers.pop(room_id, None)
+        if armed is not None:
+            self.timers.cancel(armed[1])
+        if room is not None:
+            for player_id in room.players:
+                if self.player_room_map.get(player_id) == room_id:
+                    del self.player_room_map[player_id]
+        return room, actor
+
+    async def _adopt_room(self, room_id):
+        """Take over a room handed off by another shard, or left by one that
+        died, once its lease is free."""
+        if not await self.redis.set(lease_key(room_id), self.shard_id,
+                                    nx=True, px=int(ROOM_LEASE_TTL * 1000)):
+            return False
+        if not await self._restore_room(room_id):
+            await self.release_lease(keys=[lease_key(room_id)], args=[self.shard_id])
+            return False
+        return True
+
+    async def _restore_room(self, room_id):
+        data = await load_snapshot(self.raw_redis, self.codec, room_id)
+        if room_id in self.rooms:
+            return True
+        if data is None:
+            return False
+        room = GameRoom.load(data)
+        entries = await self.raw_redis.xrange(log_key(room_id), min=events_after(room.seq))
+        if room_id in self.rooms:
+            return True
+        replay(room, decode_entries(self.codec, entries))
+        self._add_room(room)
+        if entries:
+            self.snapshots.mark(room_id)
+        # clients may be ahead of the saved version; give them a fresh base
+        self._broadcast_room_update(room, snapshot=True)
+        print(f"Restored room {room_id} at version {room.version} ({len(entries)} events replayed)")
+        return True
+
+    async def _shard_loop(self):
+        while True:
+            await asyncio.sleep(SHARD_HEARTBEAT_INTERVAL)
+            try:
+                await self._heartbeat()
+            except (redis.ConnectionError, redis.TimeoutError, OSError) as e:
+                print(f"Shard heartbeat failed: {e}")
+
+    async def _heartbeat(self):
+        """Announce this shard, renew every room lease in one pipeline and
+        rebalance if membership changed."""
+        now = time.time()
+        lease_ms = int(ROOM_LEASE_TTL * 1000)
+        room_ids = list(self.rooms)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zadd(SHARDS_KEY, {self.shard_id: now})
+        pipe.zremrangebyscore(SHARDS_KEY, 0, now - SHARD_TTL)
+        pipe.zrange(SHARDS_KEY, 0, -1)
+        for room_id in room_ids:
+            await self.renew_lease(keys=[lease_key(room_id)], args=[self.shard_id, lease_ms], client=pipe)
+        results = await pipe.execute()
+
+        for room_id, renewed in zip(room_ids, results[3:]):
+            if not renewed and room_id in self.rooms:
+                # another shard holds it now; it is theirs
+                print(f"Lost lease on room {room_id}")
+                room, actor = self._drop_room(room_id)
+                self.snapshots.forget(room_id)
+                if actor is not None:
+                    actor.task.cancel()
+                    while not actor.mailbox.empty():
+                        self.transport.done(actor.mailbox.get_nowait()[2])
+
+        if self.ring.update(results[2]):
+            print(f"Shard ring changed: {sorted(self.ring.nodes)}")
+            await self._rebalance()
+
+    async def _rebalance(self):
+        moving = [rid for rid in self.rooms if self.ring.node_for(rid) != self.shard_id]
+        if not moving:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        command = lambda name, *args, **kwargs: getattr(pipe, name)(*args, **kwargs)
+        for room_id in moving:
+            room, actor = self._drop_room(room_id)
+            # the new owner restores the room from its snapshot
+            self.snapshots.forget(room_id)
+            self.snapshots.save(room, command)
+            await self.release_lease(keys=[lease_key(room_id)], args=[self.shard_id], client=pipe)
+            if actor is not None:
+                actor.task.cancel()
+                # anything still queued goes to the new owner
+                owner = self.ring.node_for(room_id)
+                while not actor.mailbox.empty():
+                    channel, data, token = actor.mailbox.get_nowait()
+                    self.transport.send(pipe, inbox_channel(channel, owner), self.codec.encode(data))
+                    self.transport.done(token)
+        await pipe.execute()
+        print(f"Handed off {len(moving)} rooms")
+
+    def _dispatch(self, channel, data):
+        player_id = data.get('player_id')
+        success, msg = True, None
+        if channel == MATCHMAKING_CHANNEL:
+            success, msg = self._handle_matchmaking(data)
+        elif channel == PLAYER_STATE_CHANNEL:
+            success, msg = self._handle_player_state(data)
+        elif channel == ROOM_RESYNC_CHANNEL:
+            self._handle_resync(data)
+        elif channel == GAME_JOIN_CHANNEL:
+            success, msg = self.join_room(data.get('room_id'), player_id, data.get('player_name'))
+        elif channel == GAME_LEAVE_CHANNEL:
+            success, msg = self.leave_room(player_id)
+        elif channel == GAME_READY_CHANNEL:
+            new_state = PlayerState.READY if data.get('ready', True) else PlayerState.NOT_READY
+            success, msg = self.update_player_state(player_id, new_state)
+        elif channel == GAME_ACTION_CHANNEL:
+            # handle_action reports its own result to the player
+            self.handle_action(player_id, data.get('action'), data.get('data') or {})
+        elif channel == TIMER_CHANNEL:
+            self._handle_timeout(data)
+
+        if not success and player_id:
+            self._notify(player_id, {'type': 'error', 'room_id': data.get('room_id'), 'message': msg})
 
     def _handle_matchmaking(self, data):
         action = data.get('action')
         player_id = data.get('player_id')
         
-        if action == 'create':
-            room_id = self.create_room(data.get('game_type'))
-            success, msg = self.join_room(room_id, player_id, data.get('player_name'))
-        elif action == 'join':
-            success, msg = self.join_room(data.get('room_id'), player_id, data.get('player_name'))
+        if action == 'join':
+            return self.join_room(data.get('room_id'), player_id, data.get('player_name'))
         elif action == 'leave':
-            success, msg = self.leave_room(player_id)
+            return self.leave_room(player_id)
+        return False, "Unknown matchmaking action"
+
+    def _handle_resync(self, data):
+        room = self.rooms.get(data.get('room_id'))
+        if room is not None and room.room_id in self.published:
+            # a resumed client that caught up from the update buffer only
+            # needs its private view
+            if not data.get('private_only'):
+                self._publish_snapshot(room)
+            if data.get('player_id') in room.players:
+                self._publish_private_views(room, self.published[room.room_id]['game'],
+                                            only=data['player_id'])
 
     def _handle_player_state(self, data):
         player_id = data.get('player_id')
-        new_state = PlayerState(data.get('state'))
-        self.update_player_state(player_id, new_state)
+        if 'score' in data:
+            score = data['score']
+            if isinstance(score, bool) or not isinstance(score, int):
+                return False, "Score must be a whole number"
+            return self.update_score(player_id, score)
+        try:
+            new_state = PlayerState(data.get('state'))
+        except ValueError:
+            return False, "Invalid player state"
+        return self.update_player_state(player_id, new_state)
 
 if __name__ == '__main__':
-    manager = GameRoomManager()
+    parser = argparse.ArgumentParser(description='GameHub room manager')
+    parser.add_argument('--shard-id', help='run as one shard of several managers')
+    parser.add_argument('--tick-rate', type=float, default=ROOM_TICK_RATE,
+                        help='publish merged room updates this many times a second (0: on every change)')
+    args = parser.parse_args()
+    manager = GameRoomManager(shard_id=args.shard_id, tick_rate=args.tick_rate)
     manager.run()
\ No newline at end of file
@@ -1,6 +1,7 @@
 from .constants import GameType, GameStatus, PlayerAction
 from .base_game import BaseGame
 from .game_factory import GameFactory
+from .dictionary import Dictionary
 from .trivia_game import TriviaGame
 from .word_chain_game import WordChainGame
 from .rps_game import RockPaperScissorsGame
@@ -11,6 +12,7 @@ __all__ = [
     'PlayerAction',
     'BaseGame',
     'GameFactory',
+    'Dictionary',
     'TriviaGame',
     'WordChainGame',
     'RockPaperScissorsGame'
@@ -1,16 +1,62 @@
+import random
+import sys
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
+from typing import Dict, Any, Hashable, List, Optional, Tuple
 from .constants import GameStatus, PlayerAction
 
+class PlayerRecord:
+    """One player in a game. The room manager shares the same record and
+    keeps the player's room state (ready, not ready...) in it too, so each
+    player is stored once per room."""
+
+    __slots__ = ("name", "score", "ready", "state")
+
+    def __init__(self, name: str, score: int = 0, ready: bool = False, state: str = "not_ready"):
+        # the same few names and states turn up in many rooms
+        self.name = sys.intern(name or "")
+        self.score = score
+        self.ready = ready
+        self.state = sys.intern(state)
+
+    def dump(self) -> List[Any]:
+        return [self.name, self.score, self.ready, self.state]
+
+    @classmethod
+    def load(cls, data) -> "PlayerRecord":
+        """From dump(), or the dict an older snapshot stored."""
+        if isinstance(data, dict):
+            return cls(data["name"], data["score"], data["ready"])
+        return cls(*data)
+
 class BaseGame(ABC):
+    __slots__ = ("room_id", "max_players", "players", "status", "current_turn", "winner",
+                 "game_data", "round_time", "_seed", "_rng", "_views")
+
     def __init__(self, room_id: str, max_players: int = 4):
         self.room_id = room_id
         self.max_players = max_players
-        self.players: Dict[str, Dict[str, Any]] = {}
+        self.players: Dict[str, PlayerRecord] = {}
         self.status = GameStatus.WAITING
         self.current_turn: str = None
         self.winner: str = None
         self.game_data: Dict[str, Any] = {}
+        self.round_time: float = 60  # seconds; the room manager sets GAME_ROUND_TIME
+        self._seed = None
+        self._rng: Optional[random.Random] = None
+        self._views: Optional[Dict[str, Dict[str, Any]]] = None
+
+    @property
+    def rng(self) -> random.Random:
+        """All of a game's randomness comes from here. The room manager seeds
+        it when the game starts, so a replayed game plays out the same; it is
+        only built for games that use it."""
+        if self._rng is None:
+            self._rng = random.Random(self._seed)
+        return self._rng
+
+    def seed(self, seed: Any) -> None:
+        self._seed = seed
+        self._rng = None
 
     @abstractmethod
     def can_start(self) -> bool:
@@ -27,38 +73,100 @@ class BaseGame(ABC):
         """Get the current game state, optionally filtered for specific player."""
         pass
 
+    def timer(self) -> Optional[Tuple[Hashable, float]]:
+        """The deadline for the current phase (turn, question, round) as
+        (phase key, seconds), or None if nothing is timed. The room manager
+        restarts the clock whenever the key changes."""
+        return None
+
+    def handle_timeout(self) -> Dict[str, Any]:
+        """Called when the current phase's time runs out."""
+        return {}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Everything needed to rebuild this game with restore(), as plain
+        JSON-compatible data. Subclasses add their own fields."""
+        return {
+            "players": {pid: player.dump() for pid, player in self.players.items()},
+            "status": self.status.value,
+            "current_turn": self.current_turn,
+            "winner": self.winner,
+            "game_data": self.game_data,
+            "round_time": self.round_time
+        }
+
+    def restore(self, data: Dict[str, Any]) -> None:
+        """Load a snapshot() into this game, in place of a fresh one."""
+        self.players = {pid: PlayerRecord.load(player) for pid, player in data["players"].items()}
+        self._views = None
+        self.status = GameStatus(data["status"])
+        self.current_turn = data["current_turn"]
+        self.winner = data["winner"]
+        self.game_data = data["game_data"]
+        self.round_time = data["round_time"]
+
     def add_player(self, player_id: str, player_name: str) -> bool:
         """Add a player to the game."""
         if len(self.players) >= self.max_players:
             return False
-        self.players[player_id] = {
-            "name": player_name,
-            "score": 0,
-            "ready": False
-        }
+        self.players[player_id] = PlayerRecord(player_name)
+        self._views = None
         return True
 
+    def start_game(self) -> None:
+        """Start the game. Override to set up turns or rounds."""
+        if self.can_start():
+            self.status = GameStatus.IN_PROGRESS
+
+    def finish(self) -> None:
+        """End the game; the highest score wins."""
+        self.status = GameStatus.FINISHED
+        scores = self.get_scores()
+        self.winner = max(scores.items(), key=lambda x: x[1])[0] if scores else None
+
     def remove_player(self, player_id: str) -> bool:
-        """Remove a player from the game."""
-        if player_id in self.players:
-            del self.players[player_id]
-            return True
-        return False
+        """Remove a player from the game, passing their turn on."""
+        if player_id not in self.players:
+            return False
+        if self.current_turn == player_id:
+            player_ids = list(self.players.keys())
+            idx = player_ids.index(player_id)
+            others = player_ids[idx + 1:] + player_ids[:idx]
+            self.current_turn = others[0] if others else None
+        del self.players[player_id]
+        self._views = None
+        return True
 
     def set_player_ready(self, player_id: str, ready: bool = True) -> None:
         """Set player's ready status."""
         if player_id in self.players:
-            self.players[player_id]["ready"] = ready
+            self.players[player_id].ready = ready
+            self._views = None
 
     def are_all_players_ready(self) -> bool:
         """Check if all players are ready."""
-        return all(player["ready"] for player in self.players.values())
+        return all(player.ready for player in self.players.values())
 
     def update_score(self, player_id: str, points: int) -> None:
         """Update a player's score."""
         if player_id in self.players:
-            self.players[player_id]["score"] += points
+            self.players[player_id].score += points
+            self._views = None
 
     def get_scores(self) -> Dict[str, int]:
         """Get all players' scores."""
-        return {pid: data["score"] for pid, data in self.players.items()}
\ No newline at end of file
+        return {pid: player.score for pid, player in self.players.items()}
+
+    def player_views(self) -> Dict[str, Dict[str, Any]]:
+        """Players as get_state() shows them. Built once per change and
+        shared by every get_state() call until then, so treat it as read-only."""
+        if self._views is None:
+            self._views = {
+                pid: {"name": player.name, "score": player.score, "ready": player.ready}
+                for pid, player in self.players.items()
+            }
+        return self._views
+
+    def player_name(self, player_id: str) -> Optional[str]:
+        player = self.players.get(player_id)
+        return player.name if player else None
\ No newline at end of file
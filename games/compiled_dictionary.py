@@ -0,0 +1,197 @@
+"""Compiled, memory-mapped word lists.
+
+A plain-text word list is compiled once into a read-only file that every
+process maps with mmap, so all rooms in all manager processes share one
+page-cache copy and nothing is parsed at startup. Lookups binary-search the
+mapped buffer directly.
+
+File layout (native byte order, recorded in the header):
+
+    header        magic, byte order, word count, min length, blob size
+    pair counts   26 x 26 uint32, words per (first, last) letter
+    letter index  27 uint32, index of the first word for each letter
+    offsets       word count + 1 uint32, start of each word in the blob
+    blob          the sorted words, ASCII, back to back
+
+Build one with:
+
+    python -m games.compiled_dictionary build words.txt games/data/words.dict
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+from array import array
+from collections import Counter
+from typing import Iterator, Optional, Tuple
+
+from .dictionary import Dictionary, WordTracker, MIN_WORD_LENGTH
+
+MAGIC = b"GHDICT1\0"
+HEADER = struct.Struct("<8s1sIII")
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+_BYTE_ORDER = b"L" if sys.byteorder == "little" else b"B"
+
+
+def is_compiled(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def compile_words(dictionary: Dictionary, path: str) -> None:
+    """Write dictionary to path in the compiled format. The file is replaced
+    atomically, so processes that mapped the old one keep working."""
+    words = [w.encode("ascii") for w in dictionary.word_list]
+    pairs = array("I", [0] * (26 * 26))
+    letter_index = array("I", [0] * 27)
+    offsets = array("I", [0])
+    for word in words:
+        first, last = word[0] - 97, word[-1] - 97
+        pairs[first * 26 + last] += 1
+        letter_index[first + 1] += 1
+        offsets.append(offsets[-1] + len(word))
+    for i in range(1, 27):
+        letter_index[i] += letter_index[i - 1]
+    blob = b"".join(words)
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, _BYTE_ORDER, len(words), dictionary.min_length, len(blob)))
+        f.write(pairs.tobytes())
+        f.write(letter_index.tobytes())
+        f.write(offsets.tobytes())
+        f.write(blob)
+    os.replace(tmp, path)
+
+
+class CompiledDictionary:
+    """A read-only Dictionary backed by a mapped compiled file.
+
+    Offers the same interface WordChainGame and WordTracker use, plus
+    prefix queries, without holding the words as Python objects.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, order, count, min_length, blob_size = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compiled dictionary")
+        if order != _BYTE_ORDER:
+            raise ValueError(f"{path} was built on a machine with a different byte order; rebuild it")
+        self.count = count
+        self.min_length = min_length
+
+        view = memoryview(self._mm)
+        pos = HEADER.size
+        pairs = view[pos:pos + 26 * 26 * 4].cast("I")
+        pos += 26 * 26 * 4
+        self._letter_index = view[pos:pos + 27 * 4].cast("I")
+        pos += 27 * 4
+        self._offsets = view[pos:pos + (count + 1) * 4].cast("I")
+        pos += (count + 1) * 4
+        self._blob = pos
+
+        # small summary tables, shared by every game; a WordTracker only
+        # counts the words its game has used and subtracts them from these
+        self.first_counts = Counter({
+            LETTERS[i]: self._letter_index[i + 1] - self._letter_index[i]
+            for i in range(26) if self._letter_index[i + 1] > self._letter_index[i]
+        })
+        self.ends_counts = Counter({
+            (LETTERS[i // 26], LETTERS[i % 26]): n
+            for i, n in enumerate(pairs) if n
+        })
+
+    def _word(self, i: int) -> bytes:
+        return self._mm[self._blob + self._offsets[i]:self._blob + self._offsets[i + 1]]
+
+    def _bisect(self, key: bytes, lo: int, hi: int) -> int:
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._word(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _letter_range(self, letter: str) -> Tuple[int, int]:
+        i = ord(letter) - 97
+        if not 0 <= i < 26:
+            return 0, 0
+        return self._letter_index[i], self._letter_index[i + 1]
+
+    def __contains__(self, word: str) -> bool:
+        if len(word) < self.min_length or not word.isascii():
+            return False
+        key = word.encode("ascii")
+        lo, hi = self._letter_range(word[0])
+        i = self._bisect(key, lo, hi)
+        return i < hi and self._word(i) == key
+
+    def __len__(self) -> int:
+        return self.count
+
+    def random_word(self, rng: Optional[random.Random] = None) -> str:
+        return self._word((rng or random).randrange(self.count)).decode("ascii")
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """Index range of the words starting with prefix."""
+        if not prefix:
+            return 0, self.count
+        if not prefix.isascii():
+            return 0, 0
+        lo, hi = self._letter_range(prefix[0])
+        key = prefix.encode("ascii")
+        start = self._bisect(key, lo, hi)
+        # every word with the prefix sorts before prefix + a byte above 'z'
+        end = self._bisect(key + b"\x7f", start, hi)
+        return start, end
+
+    def count_prefix(self, prefix: str) -> int:
+        start, end = self.prefix_range(prefix)
+        return end - start
+
+    def iter_prefix(self, prefix: str) -> Iterator[str]:
+        start, end = self.prefix_range(prefix)
+        for i in range(start, end):
+            yield self._word(i).decode("ascii")
+
+    def words_between(self, first: str, last: str) -> Tuple[str, ...]:
+        """All words starting with first and ending with last."""
+        if not self.ends_counts.get((first, last)):
+            return ()
+        return tuple(w for w in self.iter_prefix(first) if w[-1] == last)
+
+    def tracker(self) -> WordTracker:
+        return WordTracker(self)
+
+    def close(self) -> None:
+        self._letter_index.release()
+        self._offsets.release()
+        self._mm.close()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m games.compiled_dictionary")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="compile a plain-text word list")
+    build.add_argument("source", help="word list, one word per line")
+    build.add_argument("output", help="compiled file to write")
+    build.add_argument("--min-length", type=int, default=MIN_WORD_LENGTH)
+    args = parser.parse_args(argv)
+
+    dictionary = Dictionary.from_file(args.source, args.min_length)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    compile_words(dictionary, args.output)
+    print(f"Wrote {len(dictionary)} words to {args.output} ({os.path.getsize(args.output)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import os
+import random
+from collections import Counter
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+# Used when no word list file is available
+BUILTIN_WORDS = (
+    "apple", "banana", "cat", "dog", "elephant", "fish", "giraffe",
+    "house", "ice", "jacket", "king", "lion", "monkey", "nest",
+    "orange", "penguin", "queen", "rabbit", "snake", "tiger",
+    "umbrella", "violet", "whale", "xylophone", "yellow", "zebra"
+)
+
+# Searched in order when no path is given; WORD_LIST_PATH overrides them.
+# Compiled files (see compiled_dictionary.py) are mapped instead of loaded.
+WORD_LIST_PATHS = (
+    os.path.join(os.path.dirname(__file__), "data", "words.dict"),
+    os.path.join(os.path.dirname(__file__), "data", "words.txt"),
+    "/usr/share/dict/words",
+)
+
+MIN_WORD_LENGTH = 3
+
+
+class Dictionary:
+    """An immutable, indexed word list shared by every Word Chain game.
+
+    Words are indexed by first letter and by (first, last) letter pair so a
+    game can validate a move and tell whether any move is left in O(1).
+    """
+
+    def __init__(self, words: Iterable[str], min_length: int = MIN_WORD_LENGTH):
+        self.min_length = min_length
+        self.words: Set[str] = set()
+        for word in words:
+            word = word.strip().lower()
+            if len(word) >= min_length and word.isascii() and word.isalpha():
+                self.words.add(word)
+        self.words = frozenset(self.words)
+        self.word_list: Tuple[str, ...] = tuple(sorted(self.words))
+        first: Dict[str, list] = {}
+        ends: Dict[Tuple[str, str], list] = {}
+        for word in self.word_list:
+            first.setdefault(word[0], []).append(word)
+            ends.setdefault((word[0], word[-1]), []).append(word)
+        self.by_first: Dict[str, Tuple[str, ...]] = {k: tuple(v) for k, v in first.items()}
+        self.by_ends: Dict[Tuple[str, str], Tuple[str, ...]] = {k: tuple(v) for k, v in ends.items()}
+        self.first_counts = Counter({k: len(v) for k, v in self.by_first.items()})
+        self.ends_counts = Counter({k: len(v) for k, v in self.by_ends.items()})
+
+    @classmethod
+    def from_file(cls, path: str, min_length: int = MIN_WORD_LENGTH) -> "Dictionary":
+        """Load one word per line; anything that isn't a plain word is skipped."""
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            return cls(f, min_length)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.words
+
+    def __len__(self) -> int:
+        return len(self.word_list)
+
+    def random_word(self, rng: Optional[random.Random] = None) -> str:
+        return (rng or random).choice(self.word_list)
+
+    def words_between(self, first: str, last: str) -> Tuple[str, ...]:
+        """All words starting with first and ending with last."""
+        return self.by_ends.get((first, last), ())
+
+    def tracker(self) -> "WordTracker":
+        return WordTracker(self)
+
+
+class WordTracker:
+    """Per-game view of a Dictionary: which words are used and how many
+    playable words remain for each starting letter, kept up to date as
+    words are played rather than recounted. Only the words played are
+    counted, against the dictionary's shared totals, so a game costs memory
+    in proportion to its length rather than to the dictionary's letter pairs."""
+
+    __slots__ = ("dictionary", "used", "used_first", "used_ends")
+
+    def __init__(self, dictionary: Dictionary):
+        self.dictionary = dictionary
+        self.used: Set[str] = set()
+        self.used_first: Counter = Counter()
+        self.used_ends: Counter = Counter()
+
+    def is_used(self, word: str) -> bool:
+        return word in self.used
+
+    def use(self, word: str) -> None:
+        if word in self.used:
+            return
+        self.used.add(word)
+        if word in self.dictionary:
+            self.used_first[word[0]] += 1
+            self.used_ends[(word[0], word[-1])] += 1
+
+    def remaining(self, first: str, last: Optional[str] = None) -> int:
+        """Unused words starting with first (and ending with last, if given)."""
+        if last is None:
+            return self.dictionary.first_counts[first] - self.used_first[first]
+        return self.dictionary.ends_counts[(first, last)] - self.used_ends[(first, last)]
+
+    def has_moves(self, letter: str) -> bool:
+        return self.remaining(letter) > 0
+
+
+_default: Optional[Dictionary] = None
+
+
+def get_dictionary() -> Dictionary:
+    """The shared dictionary, loaded once per process from WORD_LIST_PATH,
+    the first existing file in WORD_LIST_PATHS, or the builtin words."""
+    global _default
+    if _default is None:
+        _default = load_dictionary()
+    return _default
+
+
+def load_dictionary(path: Optional[str] = None) -> Dictionary:
+    from .compiled_dictionary import CompiledDictionary, is_compiled
+
+    candidates = [path or os.environ.get("WORD_LIST_PATH")] + list(WORD_LIST_PATHS)
+    for candidate in candidates:
+        if candidate and os.path.isfile(candidate):
+            if is_compiled(candidate):
+                return CompiledDictionary(candidate)
+            dictionary = Dictionary.from_file(candidate)
+            if len(dictionary):
+                return dictionary
+    return Dictionary(BUILTIN_WORDS)
+
+
+def set_dictionary(dictionary: Dictionary) -> None:
+    """Replace the shared dictionary, e.g. with a smaller one for a test setup."""
+    global _default
+    _default = dictionary
@@ -1,4 +1,5 @@
-from typing import Optional
+import random
+from typing import Any, Dict, Optional
 from .constants import GameType
 from .base_game import BaseGame
 from .trivia_game import TriviaGame
@@ -7,14 +8,30 @@ from .rps_game import RockPaperScissorsGame
 
 class GameFactory:
     @staticmethod
-    def create_game(game_type: str, room_id: str) -> Optional[BaseGame]:
+    def create_game(game_type: str, room_id: str, options: Dict[str, Any] = None,
+                    rng: Optional[random.Random] = None) -> Optional[BaseGame]:
+        """Create a game; options are per-game settings chosen by the room's creator.
+        rng, if given, makes whatever the game draws when created (the trivia
+        questions) repeatable."""
+        options = options or {}
         try:
             game_type = GameType(game_type.lower())
         except ValueError:
             return None
 
         if game_type == GameType.TRIVIA:
-            return TriviaGame(room_id)
+            category, difficulty = options.get("category"), options.get("difficulty")
+            # straight from the client; the question bank filters on them as text
+            if not all(value is None or isinstance(value, str) for value in (category, difficulty)):
+                return None
+            game = TriviaGame(
+                room_id,
+                category=category,
+                difficulty=difficulty,
+                rng=rng
+            )
+            # no questions match the requested category/difficulty
+            return game if game.questions else None
         elif game_type == GameType.WORD_CHAIN:
             return WordChainGame(room_id)
         elif game_type == GameType.ROCK_PAPER_SCISSORS:
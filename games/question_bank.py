@@ -0,0 +1,284 @@
+"""Question banks for TriviaGame.
+
+A bank hands each room a random sample of questions, optionally limited to a
+category and/or difficulty, without loading every question into memory:
+
+- MemoryQuestionBank: a list, for the builtin questions and tests.
+- FileQuestionBank: a JSONL or CSV file, mapped with mmap. One pass builds
+  an index of line offsets (and of line numbers per category and
+  difficulty); questions are parsed only when drawn.
+- SqliteQuestionBank: a SQLite database with a ``questions`` table.
+
+Questions are dicts with "question", "options", "correct" and optional
+"category" and "difficulty". CSV files start with a header row naming those
+columns, and separate options with "|".
+Recently drawn questions are kept parsed in an LRU cache.
+"""
+import csv
+import json
+import mmap
+import os
+import random
+import sqlite3
+from array import array
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+Question = Dict[str, Any]
+
+BUILTIN_QUESTIONS = (
+    {
+        "question": "What is the capital of France?",
+        "options": ["London", "Berlin", "Paris", "Madrid"],
+        "correct": "Paris",
+        "category": "geography",
+        "difficulty": "easy"
+    },
+    {
+        "question": "Which planet is known as the Red Planet?",
+        "options": ["Venus", "Mars", "Jupiter", "Saturn"],
+        "correct": "Mars",
+        "category": "science",
+        "difficulty": "easy"
+    },
+    {
+        "question": "What is the largest mammal in the world?",
+        "options": ["African Elephant", "Blue Whale", "Giraffe", "Polar Bear"],
+        "correct": "Blue Whale",
+        "category": "science",
+        "difficulty": "easy"
+    },
+    {
+        "question": "Who painted the Mona Lisa?",
+        "options": ["Van Gogh", "Da Vinci", "Picasso", "Rembrandt"],
+        "correct": "Da Vinci",
+        "category": "art",
+        "difficulty": "easy"
+    }
+)
+
+# Searched in order when no path is given; QUESTION_BANK_PATH overrides them
+QUESTION_BANK_PATHS = (
+    os.path.join(os.path.dirname(__file__), "data", "questions.db"),
+    os.path.join(os.path.dirname(__file__), "data", "questions.jsonl"),
+    os.path.join(os.path.dirname(__file__), "data", "questions.csv"),
+)
+
+QUESTIONS_PER_GAME = 10
+CACHE_SIZE = 4096
+
+CSV_FIELDS = ("question", "options", "correct", "category", "difficulty")
+
+
+def _filter_key(category: Optional[str], difficulty: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    return (category.lower() if category else None, difficulty.lower() if difficulty else None)
+
+
+class MemoryQuestionBank:
+    def __init__(self, questions):
+        self.questions = list(questions)
+        self.index: Dict[Tuple[Optional[str], Optional[str]], List[int]] = {}
+        for i, q in enumerate(self.questions):
+            category, difficulty = _filter_key(q.get("category"), q.get("difficulty"))
+            for key in ((category, None), (None, difficulty), (category, difficulty)):
+                self.index.setdefault(key, []).append(i)
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def count(self, category: str = None, difficulty: str = None) -> int:
+        key = _filter_key(category, difficulty)
+        return len(self.questions) if key == (None, None) else len(self.index.get(key, ()))
+
+    def sample(self, n: int, category: str = None, difficulty: str = None,
+               rng: Optional[random.Random] = None) -> List[Question]:
+        key = _filter_key(category, difficulty)
+        rows = range(len(self.questions)) if key == (None, None) else self.index.get(key, [])
+        picked = (rng or random).sample(rows, min(n, len(rows)))
+        return [dict(self.questions[i]) for i in picked]
+
+
+class FileQuestionBank:
+    """Questions from a JSONL or CSV file (one question per line), read
+    through an offset index so only sampled questions are ever parsed."""
+
+    def __init__(self, path: str, cache_size: int = CACHE_SIZE):
+        self.path = path
+        self.csv = path.lower().endswith(".csv")
+        self.fields = CSV_FIELDS
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        self.offsets = array("Q")  # start of each question's line
+        self.ends = array("Q")
+        self.index: Dict[Tuple[Optional[str], Optional[str]], array] = {}
+        self._build_index()
+        self.get = lru_cache(maxsize=cache_size)(self._read)
+
+    def _build_index(self) -> None:
+        pos = 0
+        size = len(self._mm)
+        header = self.csv
+        while pos < size:
+            end = self._mm.find(b"\n", pos)
+            if end < 0:
+                end = size
+            line = self._mm[pos:end]
+            if header:
+                header = False
+                self.fields = tuple(f.strip().lower() for f in next(csv.reader([line.decode("utf-8-sig")])))
+            elif line.strip():
+                q = self._parse(line)
+                if q is not None:
+                    i = len(self.offsets)
+                    self.offsets.append(pos)
+                    self.ends.append(end)
+                    category, difficulty = _filter_key(q.get("category"), q.get("difficulty"))
+                    for key in ((category, None), (None, difficulty), (category, difficulty)):
+                        if key not in self.index:
+                            self.index[key] = array("I")
+                        self.index[key].append(i)
+            pos = end + 1
+
+    def _parse(self, line: bytes) -> Optional[Question]:
+        try:
+            if not self.csv:
+                q = json.loads(line)
+            else:
+                row = next(csv.reader([line.decode("utf-8")]))
+                q = dict(zip(self.fields, row))
+                q["options"] = [o.strip() for o in q.get("options", "").split("|") if o.strip()]
+        except (ValueError, StopIteration):
+            return None
+        if not isinstance(q, dict) or not q.get("question") or not q.get("options") or "correct" not in q:
+            return None
+        return q
+
+    def _read(self, i: int) -> Question:
+        return self._parse(self._mm[self.offsets[i]:self.ends[i]])
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def count(self, category: str = None, difficulty: str = None) -> int:
+        key = _filter_key(category, difficulty)
+        return len(self.offsets) if key == (None, None) else len(self.index.get(key, ()))
+
+    def sample(self, n: int, category: str = None, difficulty: str = None,
+               rng: Optional[random.Random] = None) -> List[Question]:
+        key = _filter_key(category, difficulty)
+        rows = range(len(self.offsets)) if key == (None, None) else self.index.get(key, ())
+        picked = (rng or random).sample(range(len(rows)), min(n, len(rows)))
+        # copies, so a room can't change the cached question
+        return [dict(self.get(rows[k])) for k in picked]
+
+
+class SqliteQuestionBank:
+    """Questions from a SQLite table:
+
+        questions(id INTEGER PRIMARY KEY, question TEXT, options TEXT,
+                  correct TEXT, category TEXT, difficulty TEXT)
+
+    with options stored as a JSON list. Sampling picks random ids and takes
+    the next matching row, so it is close to uniform when ids are dense.
+    """
+
+    def __init__(self, path: str, cache_size: int = CACHE_SIZE):
+        self.path = path
+        self.db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._counts: Dict[Tuple[Optional[str], Optional[str]], Tuple[int, int, int]] = {}
+        self.get = lru_cache(maxsize=cache_size)(self._read)
+
+    @staticmethod
+    def _where(key) -> Tuple[str, list]:
+        clauses, args = [], []
+        if key[0]:
+            clauses.append("lower(category) = ?")
+            args.append(key[0])
+        if key[1]:
+            clauses.append("lower(difficulty) = ?")
+            args.append(key[1])
+        return (" AND ".join(clauses) or "1"), args
+
+    def _stats(self, key) -> Tuple[int, int, int]:
+        if key not in self._counts:
+            where, args = self._where(key)
+            self._counts[key] = self.db.execute(
+                f"SELECT count(*), min(id), max(id) FROM questions WHERE {where}", args
+            ).fetchone()
+        return self._counts[key]
+
+    def _read(self, question_id: int) -> Optional[Question]:
+        row = self.db.execute(
+            "SELECT question, options, correct, category, difficulty FROM questions WHERE id = ?",
+            (question_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        q = dict(zip(CSV_FIELDS, row))
+        q["options"] = json.loads(q["options"])
+        return q
+
+    def __len__(self) -> int:
+        return self._stats((None, None))[0]
+
+    def count(self, category: str = None, difficulty: str = None) -> int:
+        return self._stats(_filter_key(category, difficulty))[0]
+
+    def sample(self, n: int, category: str = None, difficulty: str = None,
+               rng: Optional[random.Random] = None) -> List[Question]:
+        rng = rng or random
+        key = _filter_key(category, difficulty)
+        total, lo, hi = self._stats(key)
+        n = min(n, total)
+        where, args = self._where(key)
+        ids = set()
+        attempts = 0
+        while len(ids) < n and attempts < n * 4:
+            attempts += 1
+            row = self.db.execute(
+                f"SELECT id FROM questions WHERE {where} AND id >= ? ORDER BY id LIMIT 1",
+                args + [rng.randint(lo, hi)]
+            ).fetchone()
+            if row:
+                ids.add(row[0])
+        if len(ids) < n:
+            # a small or very sparse bank; fill up in id order
+            for (question_id,) in self.db.execute(f"SELECT id FROM questions WHERE {where}", args):
+                if len(ids) >= n:
+                    break
+                ids.add(question_id)
+        picked = list(ids)
+        rng.shuffle(picked)
+        return [dict(self.get(i)) for i in picked]
+
+
+_default = None
+
+
+def get_question_bank():
+    """The shared question bank, opened once per process from
+    QUESTION_BANK_PATH, the first existing file in QUESTION_BANK_PATHS, or
+    the builtin questions."""
+    global _default
+    if _default is None:
+        _default = load_question_bank()
+    return _default
+
+
+def load_question_bank(path: Optional[str] = None):
+    candidates = [path or os.environ.get("QUESTION_BANK_PATH")] + list(QUESTION_BANK_PATHS)
+    for candidate in candidates:
+        if candidate and os.path.isfile(candidate):
+            if candidate.lower().endswith((".db", ".sqlite", ".sqlite3")):
+                bank = SqliteQuestionBank(candidate)
+            else:
+                bank = FileQuestionBank(candidate)
+            if len(bank):
+                return bank
+    return MemoryQuestionBank(BUILTIN_QUESTIONS)
+
+
+def set_question_bank(bank) -> None:
+    """Replace the shared bank, e.g. with a MemoryQuestionBank for a test setup."""
+    global _default
+    _default = bank
@@ -3,6 +3,8 @@ from .base_game import BaseGame
 from .constants import GameStatus, PlayerAction
 
 class RockPaperScissorsGame(BaseGame):
+    __slots__ = ("moves", "rounds", "max_rounds")
+
     def __init__(self, room_id: str):
         super().__init__(room_id, max_players=2)  # RPS is 2 player only
         self.moves: Dict[str, str] = {}
@@ -14,7 +16,10 @@ class RockPaperScissorsGame(BaseGame):
 
     def handle_action(self, player_id: str, action: PlayerAction, data: Dict[str, Any]) -> Dict[str, Any]:
         if action == PlayerAction.CHOOSE:
-            return self._handle_move(player_id, data.get("move", "").lower())
+            move = data.get("move")
+            if not isinstance(move, str):
+                return {"error": "Move must be a string"}
+            return self._handle_move(player_id, move.lower())
         return {"error": "Invalid action"}
 
     def _handle_move(self, player_id: str, move: str) -> Dict[str, Any]:
@@ -34,12 +39,43 @@ class RockPaperScissorsGame(BaseGame):
 
         return {"success": True, "waiting": True}
 
+    def snapshot(self) -> Dict[str, Any]:
+        data = super().snapshot()
+        data.update(moves=self.moves, rounds=self.rounds, max_rounds=self.max_rounds)
+        return data
+
+    def restore(self, data: Dict[str, Any]) -> None:
+        super().restore(data)
+        self.moves = data["moves"]
+        self.rounds = data["rounds"]
+        self.max_rounds = data["max_rounds"]
+
+    def timer(self):
+        if self.status != GameStatus.IN_PROGRESS:
+            return None
+        return len(self.rounds), self.round_time
+
+    def handle_timeout(self) -> Dict[str, Any]:
+        """A player who didn't move in time loses the round; if neither
+        moved, the game is abandoned."""
+        if self.status != GameStatus.IN_PROGRESS:
+            return {}
+        missed = [pid for pid in self.players if pid not in self.moves]
+        if len(missed) == len(self.players):
+            self.finish()
+            return {"timed_out": missed, "game_finished": True}
+        return dict(self._resolve_round(), timed_out=missed)
+
     def _resolve_round(self) -> Dict[str, Any]:
         players = list(self.players.keys())
-        move1, move2 = self.moves[players[0]], self.moves[players[1]]
+        move1, move2 = self.moves.get(players[0]), self.moves.get(players[1])
         
         winner = None
-        if move1 != move2:
+        if move1 is None or move2 is None:
+            # one player ran out of time
+            winner = players[0] if move2 is None else players[1]
+            self.update_score(winner, 1)
+        elif move1 != move2:
             if (
                 (move1 == "rock" and move2 == "scissors") or
                 (move1 == "paper" and move2 == "rock") or
@@ -76,7 +112,7 @@ class RockPaperScissorsGame(BaseGame):
     def get_state(self, player_id: str = None) -> Dict[str, Any]:
         state = {
             "status": self.status.value,
-            "players": self.players,
+            "players": self.player_views(),
             "scores": self.get_scores(),
             "current_round": len(self.rounds) + 1,
             "max_rounds": self.max_rounds,
@@ -95,6 +131,6 @@ class RockPaperScissorsGame(BaseGame):
 
         if self.status == GameStatus.FINISHED:
             state["winner"] = self.winner
-            state["winner_name"] = self.players[self.winner]["name"]
+            state["winner_name"] = self.player_name(self.winner)
 
         return state
\ No newline at end of file
@@ -0,0 +1,620 @@
+"""Headless game simulation for rule balancing and benchmarking.
+
+Games are created through GameFactory and played to the end in memory by
+bot strategies, with no Redis and no room manager. Whenever no player has a
+move to make (a silent strategy, or every attempt rejected), the current
+phase times out as it would on the room manager's clock.
+
+Runs are split into chunks that are played on a ProcessPoolExecutor. Each
+worker folds its games into a SimulationStats of streaming reducers (running
+mean/variance, integer histograms, win tables), so memory stays flat however
+many games are played, and the parent merges the workers' stats as they
+finish. Strategies are rotated through the seats from game to game, so
+their win rates are not skewed by seat order; per-seat win rates are
+reported separately.
+
+    python -m games.simulation trivia --games 1000000 --players 4 \\
+        --strategy oracle:0.8 --strategy random --workers 8 --seed 1
+    python -m games.simulation rock_paper_scissors --strategy counter --strategy random
+    python -m games.simulation word_chain --strategy trap --strategy longest --profile
+
+Strategies are given as name[:arg,arg...]; see STRATEGIES. A run with the
+same seed, games, chunk size and strategies gives the same results.
+"""
+import argparse
+import cProfile
+import json
+import math
+import os
+import pstats
+import random
+import string
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .base_game import BaseGame
+from .constants import GameStatus, GameType, PlayerAction
+from .game_factory import GameFactory
+
+# a move is (action, data); None means the player has nothing to do right now
+Move = Optional[Tuple[PlayerAction, Dict[str, Any]]]
+
+RPS_MOVES = ("rock", "paper", "scissors")
+RPS_BEATS = {"rock": "paper", "paper": "scissors", "scissors": "rock"}  # move: what beats it
+
+DEFAULT_CHUNK_SIZE = 2000
+DEFAULT_MAX_STEPS = 500
+
+
+# strategies
+
+class Strategy(ABC):
+    """Picks a player's move. Strategies keep no state of their own (what
+    they need is in the game), so one instance can play every seat."""
+
+    game_type: Optional[GameType] = None  # None: any game
+    spec_name = ""
+
+    def __init__(self, *args: Any):
+        self.args = args
+
+    @property
+    def name(self) -> str:
+        """The spec this strategy was made from, e.g. 'oracle:0.8'."""
+        if not self.args:
+            return self.spec_name
+        return f"{self.spec_name}:{','.join(str(arg) for arg in self.args)}"
+
+    @abstractmethod
+    def choose(self, game: BaseGame, player_id: str, rng: random.Random) -> Move:
+        """The move to make now, or None to pass."""
+        pass
+
+
+class Silent(Strategy):
+    """Never moves; every phase runs out of time."""
+    spec_name = "silent"
+
+    def choose(self, game, player_id, rng):
+        return None
+
+
+class RandomAnswer(Strategy):
+    game_type = GameType.TRIVIA
+    spec_name = "random"
+
+    def choose(self, game, player_id, rng):
+        if player_id in game.answers:
+            return None
+        options = game.questions[game.current_question]["options"]
+        return PlayerAction.ANSWER, {"answer": rng.choice(options)}
+
+
+class Oracle(Strategy):
+    """Answers correctly with probability accuracy, otherwise picks a wrong option."""
+    game_type = GameType.TRIVIA
+    spec_name = "oracle"
+
+    def __init__(self, accuracy: float = 1.0):
+        super().__init__(accuracy)
+        self.accuracy = float(accuracy)
+
+    def choose(self, game, player_id, rng):
+        if player_id in game.answers:
+            return None
+        question = game.questions[game.current_question]
+        wrong = [option for option in question["options"] if option != question["correct"]]
+        if not wrong or rng.random() < self.accuracy:
+            return PlayerAction.ANSWER, {"answer": question["correct"]}
+        return PlayerAction.ANSWER, {"answer": rng.choice(wrong)}
+
+
+def _words_starting(dictionary, letter: str) -> Iterable[str]:
+    if hasattr(dictionary, "iter_prefix"):
+        return dictionary.iter_prefix(letter)
+    return dictionary.by_first.get(letter, ())
+
+
+class WordStrategy(Strategy):
+    game_type = GameType.WORD_CHAIN
+
+    def choose(self, game, player_id, rng):
+        if game.current_turn != player_id:
+            return None
+        word = self.pick(game, game.current_letter, rng)
+        if word is None:
+            return None
+        return PlayerAction.MOVE, {"word": word}
+
+    @abstractmethod
+    def pick(self, game, letter: str, rng: random.Random) -> Optional[str]:
+        """A word starting with letter, or None to pass."""
+        pass
+
+    @staticmethod
+    def endings(game, letter: str) -> List[str]:
+        """Last letters that still have unused words starting with letter."""
+        return [end for end in string.ascii_lowercase if game.tracker.remaining(letter, end) > 0]
+
+    @staticmethod
+    def unused(game, letter: str, end: str) -> List[str]:
+        return [word for word in game.dictionary.words_between(letter, end)
+                if not game.tracker.is_used(word)]
+
+
+class FirstWord(WordStrategy):
+    """The first unused word in alphabetical order."""
+    spec_name = "first"
+
+    def pick(self, game, letter, rng):
+        for word in _words_starting(game.dictionary, letter):
+            if not game.tracker.is_used(word):
+                return word
+        return None
+
+
+class LongestWord(WordStrategy):
+    """The longest unused word: the most points now."""
+    spec_name = "longest"
+
+    def pick(self, game, letter, rng):
+        best = None
+        for word in _words_starting(game.dictionary, letter):
+            if (best is None or len(word) > len(best)) and not game.tracker.is_used(word):
+                best = word
+        return best
+
+
+class RandomWord(WordStrategy):
+    spec_name = "random"
+
+    def pick(self, game, letter, rng):
+        endings = self.endings(game, letter)
+        if not endings:
+            return None
+        return rng.choice(self.unused(game, letter, rng.choice(endings)))
+
+
+class TrapWord(WordStrategy):
+    """Ends on the letter with the fewest unused words left, to run the
+    next player out of moves."""
+    spec_name = "trap"
+
+    def pick(self, game, letter, rng):
+        endings = self.endings(game, letter)
+        if not endings:
+            return None
+
+        def left_after(end):
+            # playing letter...end uses one of end's own words when end == letter
+            return game.tracker.remaining(end) - (end == letter)
+
+        end = min(endings, key=left_after)
+        return rng.choice(self.unused(game, letter, end))
+
+
+class RpsStrategy(Strategy):
+    game_type = GameType.ROCK_PAPER_SCISSORS
+
+    def choose(self, game, player_id, rng):
+        if player_id in game.moves:
+            return None
+        return PlayerAction.CHOOSE, {"move": self.pick(game, player_id, rng)}
+
+    @abstractmethod
+    def pick(self, game, player_id: str, rng: random.Random) -> str:
+        """The move to play this round."""
+        pass
+
+    @staticmethod
+    def opponent_last(game, player_id: str) -> Optional[str]:
+        if not game.rounds:
+            return None
+        moves = game.rounds[-1]["moves"]
+        return next((move for pid, move in moves.items() if pid != player_id), None)
+
+
+class RandomMove(RpsStrategy):
+    spec_name = "random"
+
+    def pick(self, game, player_id, rng):
+        return rng.choice(RPS_MOVES)
+
+
+class FixedMove(RpsStrategy):
+    spec_name = "fixed"
+
+    def __init__(self, move: str = "rock"):
+        super().__init__(move)
+        self.move = move
+
+    def pick(self, game, player_id, rng):
+        return self.move
+
+
+class BiasedMove(RpsStrategy):
+    """Rock, paper and scissors with the given weights."""
+    spec_name = "biased"
+
+    def __init__(self, rock: float = 1.0, paper: float = 1.0, scissors: float = 1.0):
+        super().__init__(rock, paper, scissors)
+        self.weights = (float(rock), float(paper), float(scissors))
+
+    def pick(self, game, player_id, rng):
+        return rng.choices(RPS_MOVES, self.weights)[0]
+
+
+class Copycat(RpsStrategy):
+    """Plays the opponent's last move."""
+    spec_name = "copycat"
+
+    def pick(self, game, player_id, rng):
+        return self.opponent_last(game, player_id) or rng.choice(RPS_MOVES)
+
+
+class CounterMove(RpsStrategy):
+    """Plays what beats the opponent's last move."""
+    spec_name = "counter"
+
+    def pick(self, game, player_id, rng):
+        last = self.opponent_last(game, player_id)
+        return RPS_BEATS[last] if last else rng.choice(RPS_MOVES)
+
+
+STRATEGIES: Dict[GameType, Dict[str, type]] = {
+    GameType.TRIVIA: {cls.spec_name: cls for cls in (RandomAnswer, Oracle, Silent)},
+    GameType.WORD_CHAIN: {cls.spec_name: cls for cls in (FirstWord, LongestWord, RandomWord, TrapWord, Silent)},
+    GameType.ROCK_PAPER_SCISSORS: {
+        cls.spec_name: cls for cls in (RandomMove, FixedMove, BiasedMove, Copycat, CounterMove, Silent)
+    },
+}
+
+
+def make_strategy(game_type: GameType, spec: str) -> Strategy:
+    """Build a strategy from 'name' or 'name:arg,arg'."""
+    name, _, args = spec.partition(":")
+    try:
+        cls = STRATEGIES[game_type][name]
+    except KeyError:
+        choices = ", ".join(sorted(STRATEGIES.get(game_type, {})))
+        raise ValueError(f"Unknown {game_type.value} strategy '{name}' (choose from {choices})")
+    return cls(*(arg for arg in args.split(",") if arg))
+
+
+# reducers
+
+class RunningStats:
+    """Count, mean, variance, min and max in constant space (Welford), and
+    mergeable across workers (Chan et al.)."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x: float) -> None:
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+
+    def merge(self, other: "RunningStats") -> None:
+        if not other.n:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def summary(self) -> Dict[str, Any]:
+        if not self.n:
+            return {"n": 0}
+        std = math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+        return {"n": self.n, "mean": round(self.mean, 4), "std": round(std, 4),
+                "min": self.min, "max": self.max}
+
+
+class Histogram:
+    """Counts of integer values; exact quantiles from the counts."""
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+
+    def add(self, x: int) -> None:
+        self.counts[x] += 1
+
+    def merge(self, other: "Histogram") -> None:
+        self.counts.update(other.counts)
+
+    def quantile(self, q: float) -> Optional[int]:
+        total = sum(self.counts.values())
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for value in sorted(self.counts):
+            seen += self.counts[value]
+            if seen > rank:
+                return value
+        return max(self.counts)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "p10": self.quantile(0.1), "p50": self.quantile(0.5), "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "counts": {str(value): self.counts[value] for value in sorted(self.counts)}
+        }
+
+
+class WinTable:
+    """Games, wins and draws per key (a strategy or a seat)."""
+
+    def __init__(self):
+        self.games: Counter = Counter()
+        self.wins: Counter = Counter()
+        self.draws: Counter = Counter()
+
+    def add(self, key: Any, won: bool, drew: bool) -> None:
+        self.games[key] += 1
+        self.wins[key] += won
+        self.draws[key] += drew
+
+    def merge(self, other: "WinTable") -> None:
+        self.games.update(other.games)
+        self.wins.update(other.wins)
+        self.draws.update(other.draws)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            str(key): {"games": games, "win_rate": round(self.wins[key] / games, 4),
+                       "draw_rate": round(self.draws[key] / games, 4)}
+            for key, games in sorted(self.games.items(), key=lambda item: str(item[0]))
+        }
+
+
+class SimulationStats:
+    """Everything a run reports, folded in one game at a time."""
+
+    def __init__(self):
+        self.games = 0
+        self.moves = 0
+        self.timeouts = 0
+        self.rejected = 0  # moves the game refused
+        self.capped = 0  # games stopped at max_steps
+        self.cpu_seconds = 0.0
+        self.length = RunningStats()  # moves + timeouts per game
+        self.length_hist = Histogram()
+        self.margin = RunningStats()  # winner's lead over the runner-up
+        self.by_strategy = WinTable()
+        self.by_seat = WinTable()
+        self.scores: Dict[str, RunningStats] = {}
+        self.score_hist: Dict[str, Histogram] = {}
+
+    def add(self, names: Sequence[str], scores: Sequence[int], moves: int, timeouts: int,
+            rejected: int, capped: bool) -> None:
+        self.games += 1
+        self.moves += moves
+        self.timeouts += timeouts
+        self.rejected += rejected
+        self.capped += capped
+        self.length.add(moves + timeouts)
+        self.length_hist.add(moves + timeouts)
+        top = max(scores)
+        leaders = scores.count(top)
+        ranked = sorted(scores, reverse=True)
+        self.margin.add(ranked[0] - ranked[1] if len(ranked) > 1 else 0)
+        for seat, (name, score) in enumerate(zip(names, scores)):
+            won = score == top and leaders == 1
+            drew = score == top and leaders > 1
+            self.by_strategy.add(name, won, drew)
+            self.by_seat.add(seat, won, drew)
+            if name not in self.scores:
+                self.scores[name] = RunningStats()
+                self.score_hist[name] = Histogram()
+            self.scores[name].add(score)
+            self.score_hist[name].add(score)
+
+    def merge(self, other: "SimulationStats") -> None:
+        self.games += other.games
+        self.moves += other.moves
+        self.timeouts += other.timeouts
+        self.rejected += other.rejected
+        self.capped += other.capped
+        self.cpu_seconds += other.cpu_seconds
+        self.length.merge(other.length)
+        self.length_hist.merge(other.length_hist)
+        self.margin.merge(other.margin)
+        self.by_strategy.merge(other.by_strategy)
+        self.by_seat.merge(other.by_seat)
+        for name, stats in other.scores.items():
+            self.scores.setdefault(name, RunningStats()).merge(stats)
+            self.score_hist.setdefault(name, Histogram()).merge(other.score_hist[name])
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "games": self.games,
+            "moves": self.moves,
+            "timeouts": self.timeouts,
+            "rejected_moves": self.rejected,
+            "capped_games": self.capped,
+            "cpu_seconds": round(self.cpu_seconds, 3),
+            "length": dict(self.length.summary(), **self.length_hist.summary()),
+            "margin": self.margin.summary(),
+            "strategies": {
+                name: dict(stats, score=self.scores[name].summary(),
+                           score_quantiles={q: v for q, v in self.score_hist[name].summary().items()
+                                            if q != "counts"})
+                for name, stats in self.by_strategy.summary().items()
+            },
+            "seats": self.by_seat.summary(),
+        }
+
+
+# playing
+
+def play_game(game: BaseGame, strategies: Sequence[Strategy], rng: random.Random,
+              max_steps: int = DEFAULT_MAX_STEPS) -> Tuple[List[int], int, int, int, bool]:
+    """Seat one player per strategy, play the game out, and return
+    (scores by seat, moves, timeouts, rejected moves, capped)."""
+    seats = [f"p{i}" for i in range(len(strategies))]
+    for player_id in seats:
+        game.add_player(player_id, player_id)
+        game.set_player_ready(player_id)
+    game.seed(rng.random())
+    game.start_game()
+
+    moves = timeouts = rejected = 0
+    capped = False
+    while game.status == GameStatus.IN_PROGRESS:
+        if moves + timeouts >= max_steps:
+            game.finish()
+            capped = True
+            break
+        acted = False
+        for player_id, strategy in zip(seats, strategies):
+            if game.status != GameStatus.IN_PROGRESS:
+                break
+            move = strategy.choose(game, player_id, rng)
+            if move is None:
+                continue
+            if "error" in game.handle_action(player_id, *move):
+                rejected += 1
+            else:
+                moves += 1
+                acted = True
+        if not acted and game.status == GameStatus.IN_PROGRESS:
+            game.handle_timeout()
+            timeouts += 1
+    scores = game.get_scores()
+    return [scores[player_id] for player_id in seats], moves, timeouts, rejected, capped
+
+
+def run_chunk(game_type: str, specs: Sequence[str], games: int, seed: str,
+              options: Optional[Dict[str, Any]] = None,
+              max_steps: int = DEFAULT_MAX_STEPS) -> SimulationStats:
+    """Play games in this process, rotating the strategies through the seats."""
+    started = time.process_time()
+    kind = GameType(game_type)
+    strategies = [make_strategy(kind, spec) for spec in specs]
+    names = [strategy.name for strategy in strategies]
+    rng = random.Random(seed)
+    stats = SimulationStats()
+    for i in range(games):
+        shift = i % len(strategies)
+        seated = strategies[shift:] + strategies[:shift]
+        game = GameFactory.create_game(game_type, f"sim-{i}", options, rng)
+        if game is None:
+            raise ValueError(f"Can't create a {game_type} game with options {options}")
+        scores, moves, timeouts, rejected, capped = play_game(game, seated, rng, max_steps)
+        stats.add(names[shift:] + names[:shift], scores, moves, timeouts, rejected, capped)
+    stats.cpu_seconds = time.process_time() - started
+    return stats
+
+
+def _init_worker(words: Optional[str], questions: Optional[str]) -> None:
+    if words:
+        from .dictionary import load_dictionary, set_dictionary
+        set_dictionary(load_dictionary(words))
+    if questions:
+        from .question_bank import load_question_bank, set_question_bank
+        set_question_bank(load_question_bank(questions))
+
+
+def simulate(game_type: str, specs: Sequence[str], games: int, workers: int = 1,
+             seed: int = 0, chunk_size: int = DEFAULT_CHUNK_SIZE,
+             options: Optional[Dict[str, Any]] = None, max_steps: int = DEFAULT_MAX_STEPS,
+             words: Optional[str] = None, questions: Optional[str] = None) -> SimulationStats:
+    """Play games games of game_type, one seat per strategy spec, on workers
+    processes (in this one when workers is 1), and merge their stats."""
+    kind = GameType(game_type)
+    for spec in specs:
+        make_strategy(kind, spec)  # fail before starting any workers
+    chunks = [(game_type, list(specs), min(chunk_size, games - start), f"{seed}:{start}", options, max_steps)
+              for start in range(0, games, chunk_size)]
+    total = SimulationStats()
+    if workers <= 1:
+        _init_worker(words, questions)
+        for chunk in chunks:
+            total.merge(run_chunk(*chunk))
+        return total
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(words, questions)) as pool:
+        for future in as_completed([pool.submit(run_chunk, *chunk) for chunk in chunks]):
+            total.merge(future.result())
+    return total
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m games.simulation",
+                                     description="Play games between bot strategies, without Redis")
+    parser.add_argument("game_type", choices=[kind.value for kind in STRATEGIES])
+    parser.add_argument("--strategy", action="append", dest="strategies", metavar="NAME[:ARGS]",
+                        help="one per seat, repeated (default: two random players)")
+    parser.add_argument("--players", type=int, help="seats; strategies are repeated to fill them")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-steps", type=int, default=DEFAULT_MAX_STEPS,
+                        help="end a game after this many moves and timeouts")
+    parser.add_argument("--category", help="trivia question category")
+    parser.add_argument("--difficulty", help="trivia question difficulty")
+    parser.add_argument("--words", help="word list for word chain (default: the shared dictionary)")
+    parser.add_argument("--questions", help="question bank for trivia (default: the shared bank)")
+    parser.add_argument("--profile", action="store_true",
+                        help="play in this process under cProfile and print the hottest functions")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    kind = GameType(args.game_type)
+    specs = args.strategies or ["random"]
+    players = 2 if kind == GameType.ROCK_PAPER_SCISSORS else (args.players or max(len(specs), 2))
+    specs = [specs[i % len(specs)] for i in range(players)]
+    options = {key: value for key, value in (("category", args.category), ("difficulty", args.difficulty))
+               if value}
+    try:
+        for spec in specs:
+            make_strategy(kind, spec)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    workers = 1 if args.profile else args.workers
+    profiler = cProfile.Profile() if args.profile else None
+    started = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    stats = simulate(args.game_type, specs, args.games, workers, args.seed, args.chunk_size,
+                     options or None, args.max_steps, args.words, args.questions)
+    if profiler:
+        profiler.disable()
+    elapsed = time.perf_counter() - started
+
+    report = stats.summary()
+    report.update(
+        game_type=args.game_type, seats=specs, workers=workers, seed=args.seed,
+        elapsed_s=round(elapsed, 3),
+        games_per_sec=round(stats.games / elapsed, 1) if elapsed else 0.0,
+        moves_per_sec=round(stats.moves / elapsed, 1) if elapsed else 0.0
+    )
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if profiler:
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(25)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,19 @@
 import random
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from .base_game import BaseGame
 from .constants import GameStatus, PlayerAction
+from .question_bank import QUESTIONS_PER_GAME, get_question_bank
 
 class TriviaGame(BaseGame):
-    def __init__(self, room_id: str, max_players: int = 4):
+    __slots__ = ("category", "difficulty", "questions", "current_question", "answers")
+
+    def __init__(self, room_id: str, max_players: int = 4, bank=None,
+                 num_questions: int = QUESTIONS_PER_GAME, category: str = None,
+                 difficulty: str = None, rng: Optional[random.Random] = None):
         super().__init__(room_id, max_players)
-        self.questions = [
-            {
-                "question": "What is the capital of France?",
-                "options": ["London", "Berlin", "Paris", "Madrid"],
-                "correct": "Paris"
-            },
-            {
-                "question": "Which planet is known as the Red Planet?",
-                "options": ["Venus", "Mars", "Jupiter", "Saturn"],
-                "correct": "Mars"
-            },
-            {
-                "question": "What is the largest mammal in the world?",
-                "options": ["African Elephant", "Blue Whale", "Giraffe", "Polar Bear"],
-                "correct": "Blue Whale"
-            },
-            {
-                "question": "Who painted the Mona Lisa?",
-                "options": ["Van Gogh", "Da Vinci", "Picasso", "Rembrandt"],
-                "correct": "Da Vinci"
-            }
-        ]
+        self.category = category
+        self.difficulty = difficulty
+        self.questions = (bank or get_question_bank()).sample(num_questions, category, difficulty, rng=rng)
         self.current_question = 0
         self.answers: Dict[str, str] = {}
 
@@ -36,7 +22,10 @@ class TriviaGame(BaseGame):
 
     def handle_action(self, player_id: str, action: PlayerAction, data: Dict[str, Any]) -> Dict[str, Any]:
         if action == PlayerAction.ANSWER:
-            return self._handle_answer(player_id, data.get("answer", ""))
+            answer = data.get("answer")
+            if not isinstance(answer, str):
+                return {"error": "Answer must be a string"}
+            return self._handle_answer(player_id, answer)
         return {"error": "Invalid action"}
 
     def _handle_answer(self, player_id: str, answer: str) -> Dict[str, Any]:
@@ -61,19 +50,49 @@ class TriviaGame(BaseGame):
             "points": 10 if answer == current_q["correct"] else 0
         }
 
+    def snapshot(self) -> Dict[str, Any]:
+        data = super().snapshot()
+        data.update(
+            questions=self.questions,
+            current_question=self.current_question,
+            answers=self.answers,
+            category=self.category,
+            difficulty=self.difficulty
+        )
+        return data
+
+    def restore(self, data: Dict[str, Any]) -> None:
+        super().restore(data)
+        self.questions = data["questions"]
+        self.current_question = data["current_question"]
+        self.answers = data["answers"]
+        self.category = data["category"]
+        self.difficulty = data["difficulty"]
+
+    def timer(self):
+        if self.status != GameStatus.IN_PROGRESS:
+            return None
+        return self.current_question, self.round_time
+
+    def handle_timeout(self) -> Dict[str, Any]:
+        """Time's up: players who haven't answered score nothing."""
+        if self.status != GameStatus.IN_PROGRESS:
+            return {}
+        missed = [pid for pid in self.players if pid not in self.answers]
+        self._advance_question()
+        return {"timed_out": missed}
+
     def _advance_question(self) -> None:
         self.answers.clear()
         self.current_question += 1
         
         if self.current_question >= len(self.questions):
-            self.status = GameStatus.FINISHED
-            scores = self.get_scores()
-            self.winner = max(scores.items(), key=lambda x: x[1])[0]
+            self.finish()
 
     def get_state(self, player_id: str = None) -> Dict[str, Any]:
         state = {
             "status": self.status.value,
-            "players": self.players,
+            "players": self.player_views(),
             "scores": self.get_scores(),
             "current_question": self.current_question,
             "total_questions": len(self.questions)
@@ -90,6 +109,6 @@ class TriviaGame(BaseGame):
 
         if self.status == GameStatus.FINISHED:
             state["winner"] = self.winner
-            state["winner_name"] = self.players[self.winner]["name"]
+            state["winner_name"] = self.player_name(self.winner)
 
         return state
\ No newline at end of file
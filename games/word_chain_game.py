@@ -1,22 +1,22 @@
-import random
 from typing import Dict, Any, List
 from .base_game import BaseGame
 from .constants import GameStatus, PlayerAction
+from .dictionary import Dictionary, get_dictionary
 
 class WordChainGame(BaseGame):
-    def __init__(self, room_id: str, max_players: int = 4):
+    __slots__ = ("words_used", "current_letter", "round", "time_limit", "missed_turns",
+                 "dictionary", "min_word_length", "tracker")
+
+    def __init__(self, room_id: str, max_players: int = 4, dictionary: Dictionary = None):
         super().__init__(room_id, max_players)
         self.words_used = []
         self.current_letter = None
         self.round = 0
         self.time_limit = 30  # seconds per turn
-        self.min_word_length = 3
-        self.dictionary = set([
-            "apple", "banana", "cat", "dog", "elephant", "fish", "giraffe",
-            "house", "ice", "jacket", "king", "lion", "monkey", "nest",
-            "orange", "penguin", "queen", "rabbit", "snake", "tiger",
-            "umbrella", "violet", "whale", "xylophone", "yellow", "zebra"
-        ])  # In a real implementation, this would be loaded from a file
+        self.missed_turns = 0  # turns timed out in a row
+        self.dictionary = dictionary or get_dictionary()
+        self.min_word_length = self.dictionary.min_length
+        self.tracker = self.dictionary.tracker()
 
     def can_start(self) -> bool:
         return len(self.players) >= 2 and self.are_all_players_ready()
@@ -27,13 +27,15 @@ class WordChainGame(BaseGame):
 
         self.status = GameStatus.IN_PROGRESS
         player_ids = list(self.players.keys())
-        self.current_turn = random.choice(player_ids)
-        starting_words = [w for w in self.dictionary if len(w) >= self.min_word_length]
-        self.current_letter = random.choice(starting_words)[0]
+        self.current_turn = self.rng.choice(player_ids)
+        self.current_letter = self.dictionary.random_word(self.rng)[0]
 
     def handle_action(self, player_id: str, action: PlayerAction, data: Dict[str, Any]) -> Dict[str, Any]:
         if action == PlayerAction.MOVE:
-            return self._handle_word(player_id, data.get("word", "").lower())
+            word = data.get("word")
+            if not isinstance(word, str):
+                return {"error": "Word must be a string"}
+            return self._handle_word(player_id, word.lower())
         return {"error": "Invalid action"}
 
     def _handle_word(self, player_id: str, word: str) -> Dict[str, Any]:
@@ -46,7 +48,7 @@ class WordChainGame(BaseGame):
         if len(word) < self.min_word_length:
             return {"error": f"Word must be at least {self.min_word_length} characters"}
 
-        if word in self.words_used:
+        if self.tracker.is_used(word):
             return {"error": "Word already used"}
 
         if not word.startswith(self.current_letter):
@@ -57,6 +59,8 @@ class WordChainGame(BaseGame):
 
         # Valid move
         self.words_used.append(word)
+        self.tracker.use(word)
+        self.missed_turns = 0
         self.current_letter = word[-1]
         self.update_score(player_id, len(word))
         self._next_turn()
@@ -67,6 +71,46 @@ class WordChainGame(BaseGame):
             "next_letter": self.current_letter
         }
 
+    def snapshot(self) -> Dict[str, Any]:
+        data = super().snapshot()
+        data.update(
+            words_used=self.words_used,
+            current_letter=self.current_letter,
+            round=self.round,
+            time_limit=self.time_limit,
+            missed_turns=self.missed_turns
+        )
+        return data
+
+    def restore(self, data: Dict[str, Any]) -> None:
+        super().restore(data)
+        self.words_used = data["words_used"]
+        self.current_letter = data["current_letter"]
+        self.round = data["round"]
+        self.time_limit = data["time_limit"]
+        self.missed_turns = data["missed_turns"]
+        self.tracker = self.dictionary.tracker()
+        for word in self.words_used:
+            self.tracker.use(word)
+
+    def timer(self):
+        if self.status != GameStatus.IN_PROGRESS:
+            return None
+        return (self.round, self.current_turn), self.time_limit
+
+    def handle_timeout(self) -> Dict[str, Any]:
+        """The player to move ran out of time; their turn passes. The game
+        ends once every player in a row has let their turn run out."""
+        if self.status != GameStatus.IN_PROGRESS:
+            return {}
+        timed_out = self.current_turn
+        self.missed_turns += 1
+        if self.missed_turns >= len(self.players):
+            self.finish()
+        else:
+            self._next_turn()
+        return {"timed_out": timed_out}
+
     def _next_turn(self) -> None:
         player_ids = list(self.players.keys())
         current_idx = player_ids.index(self.current_turn)
@@ -75,22 +119,13 @@ class WordChainGame(BaseGame):
         self.round += 1
 
         # Check if game should end
-        available_words = [
-            w for w in self.dictionary 
-            if w.startswith(self.current_letter) 
-            and w not in self.words_used
-            and len(w) >= self.min_word_length
-        ]
-
-        if not available_words:
-            self.status = GameStatus.FINISHED
-            scores = self.get_scores()
-            self.winner = max(scores.items(), key=lambda x: x[1])[0]
+        if not self.tracker.has_moves(self.current_letter):
+            self.finish()
 
     def get_state(self, player_id: str = None) -> Dict[str, Any]:
         state = {
             "status": self.status.value,
-            "players": self.players,
+            "players": self.player_views(),
             "scores": self.get_scores(),
             "round": self.round,
             "words_used": self.words_used,
@@ -99,12 +134,12 @@ class WordChainGame(BaseGame):
         }
 
         if self.status == GameStatus.IN_PROGRESS:
-            state["current_player_name"] = self.players[self.current_turn]["name"]
+            state["current_player_name"] = self.players[self.current_turn].name
             if player_id:
                 state["is_my_turn"] = player_id == self.current_turn
 
         if self.status == GameStatus.FINISHED:
             state["winner"] = self.winner
-            state["winner_name"] = self.players[self.winner]["name"]
+            state["winner_name"] = self.player_name(self.winner)
 
         return state
\ No newline at end of file
@@ -0,0 +1,130 @@
+"""Leaderboards kept in Redis sorted sets.
+
+Every point a player scores is added to a sorted set (player id -> points)
+for their game type and to a global one, each in three periods:
+
+    leaderboard:<game type or global>:all             all time
+    leaderboard:<game type or global>:day:20261018     the UTC day
+    leaderboard:<game type or global>:week:2026w42     the ISO week
+
+Day and week boards expire LEADERBOARD_DAY_TTL / LEADERBOARD_WEEK_TTL after
+they were last written, so old periods drop off on their own. Player names
+are kept in one hash for showing the boards.
+
+Room managers don't write a room's points as they are scored. Each room
+remembers how much of every player's score is already on the boards; new
+points are collected per player and game type and written every
+LEADERBOARD_FLUSH_INTERVAL as one ZINCRBY per board and player, in the same
+pipeline as everything else the manager sends. Points scored just before a
+manager crashes may be counted twice after the room is recovered.
+"""
+import datetime
+import time
+from collections import Counter
+
+from game_config import LEADERBOARD_DAY_TTL, LEADERBOARD_WEEK_TTL
+
+BOARD_PREFIX = 'leaderboard:'
+NAMES_KEY = 'leaderboard:names'  # player_id: name
+GLOBAL_BOARD = 'global'
+PERIODS = ('all', 'day', 'week')
+
+
+def period_id(period, now=None):
+    if period == 'all':
+        return 'all'
+    day = datetime.datetime.fromtimestamp(time.time() if now is None else now, datetime.timezone.utc)
+    if period == 'day':
+        return 'day:' + day.strftime('%Y%m%d')
+    if period == 'week':
+        year, week, _ = day.isocalendar()
+        return f'week:{year}w{week:02d}'
+    raise ValueError(f"Unknown leaderboard period: {period}")
+
+
+def board_key(game_type=None, period='all', now=None):
+    """The board for one game type (or all of them) in the current period."""
+    return f'{BOARD_PREFIX}{game_type or GLOBAL_BOARD}:{period_id(period, now)}'
+
+
+class LeaderboardWriter:
+    """Collects points between flushes, summed per player and game type."""
+
+    def __init__(self):
+        self.points = Counter()  # (game_type, player_id): points
+        self.names = {}
+
+    def record(self, room):
+        for player_id, (name, points) in room.unranked_points().items():
+            self.points[room.game_type, player_id] += points
+            self.names[player_id] = name
+
+    def flush(self, command, now=None):
+        """Queue the collected points through command(name, *args, **kwargs);
+        returns the number of players written."""
+        points, self.points = self.points, Counter()
+        names, self.names = self.names, {}
+        totals = Counter()
+        for (game_type, player_id), added in points.items():
+            totals[player_id] += added
+            self._add(command, game_type, player_id, added, now)
+        for player_id, added in totals.items():
+            self._add(command, None, player_id, added, now)
+        if not totals:
+            return 0
+        for game_type in {game_type for game_type, _ in points} | {None}:
+            command('expire', board_key(game_type, 'day', now), LEADERBOARD_DAY_TTL)
+            command('expire', board_key(game_type, 'week', now), LEADERBOARD_WEEK_TTL)
+        command('hset', NAMES_KEY, mapping=names)
+        return len(totals)
+
+    @staticmethod
+    def _add(command, game_type, player_id, points, now):
+        if points:
+            for period in PERIODS:
+                command('zincrby', board_key(game_type, period, now), points, player_id)
+
+
+def _score(value):
+    return int(value) if value is not None and value == int(value) else value
+
+
+async def top_players(redis_client, game_type=None, period='all', limit=10, offset=0):
+    """The best players on a board, highest score first. Takes an asyncio
+    client with decode_responses=True."""
+    key = board_key(game_type, period)
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zrevrange(key, offset, offset + limit - 1, withscores=True)
+    pipe.zcard(key)
+    entries, total = await pipe.execute()
+    names = await redis_client.hmget(NAMES_KEY, [pid for pid, _ in entries]) if entries else []
+    return {
+        'game_type': game_type,
+        'period': period,
+        'offset': offset,
+        'total': total,
+        'players': [
+            {'rank': offset + i + 1, 'player_id': pid, 'name': name, 'score': _score(score)}
+            for i, ((pid, score), name) in enumerate(zip(entries, names))
+        ]
+    }
+
+
+async def player_rank(redis_client, player_id, game_type=None, period='all'):
+    """One player's place on a board; rank is None if they have no points there."""
+    key = board_key(game_type, period)
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zrevrank(key, player_id)
+    pipe.zscore(key, player_id)
+    pipe.zcard(key)
+    pipe.hget(NAMES_KEY, player_id)
+    rank, score, total, name = await pipe.execute()
+    return {
+        'game_type': game_type,
+        'period': period,
+        'player_id': player_id,
+        'name': name,
+        'rank': None if rank is None else rank + 1,
+        'score': _score(score) or 0,
+        'total': total
+    }
@@ -0,0 +1,59 @@
+"""Room list kept in Redis for the lobby.
+
+Room managers keep, for every open room (waiting for players, with a free
+seat), an entry in a sorted set per game type scored by open seats, plus a
+JSON summary of every live room in one hash. Listing a page of open rooms is
+one ZRANGEBYSCORE with LIMIT and one HMGET: O(log n + page size).
+"""
+import json
+
+ROOMS_KEY = 'lobby:rooms'  # room_id: summary JSON
+OPEN_PREFIX = 'lobby:open:'
+
+
+def open_key(game_type=None):
+    """Open rooms of one game type, or of every type."""
+    return OPEN_PREFIX + (game_type or 'all')
+
+
+def index_commands(summary):
+    """Redis commands that put a room summary in the index, as
+    (method, args) pairs to run on a pipeline."""
+    room_id = summary['room_id']
+    keys = (open_key(summary['game_type']), open_key())
+    seats = summary['max_players'] - summary['players']
+    commands = [('hset', (ROOMS_KEY, room_id, json.dumps(summary, separators=(',', ':'))))]
+    if summary['state'] == 'waiting' and seats > 0:
+        commands += [('zadd', (key, {room_id: seats})) for key in keys]
+    else:
+        commands += [('zrem', (key, room_id)) for key in keys]
+    return commands
+
+
+def remove_commands(room_id, game_type):
+    return [('hdel', (ROOMS_KEY, room_id))] + [
+        ('zrem', (key, room_id)) for key in (open_key(game_type), open_key())
+    ]
+
+
+async def list_open_rooms(redis_client, game_type=None, page=0, page_size=20):
+    """A page of open rooms, fewest free seats first so rooms fill up.
+    Takes an asyncio client with decode_responses=True."""
+    key = open_key(game_type)
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zrangebyscore(key, 1, '+inf', start=page * page_size, num=page_size)
+    pipe.zcount(key, 1, '+inf')
+    room_ids, total = await pipe.execute()
+    rooms = []
+    if room_ids:
+        for raw in await redis_client.hmget(ROOMS_KEY, room_ids):
+            # a room can close between the two reads
+            if raw is not None:
+                rooms.append(json.loads(raw))
+    return {
+        'game_type': game_type,
+        'page': page,
+        'page_size': page_size,
+        'total': total,
+        'rooms': rooms
+    }
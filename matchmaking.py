@@ -0,0 +1,150 @@
+"""Quick-match queues shared by every room manager shard.
+
+Each game type has a queue held in Redis: a sorted set of waiting players by
+rating, another by the time they joined, and a hash of their names. Any shard
+may pull matches; the pop runs as one Lua script, so a player is never put
+in two rooms.
+
+A match is built around the longest-waiting player. It takes everyone within
+a rating band of that player, oldest first. The band starts at
+MATCH_RATING_BAND and widens by MATCH_BAND_WIDEN_PER_SEC for every second
+the player has waited. A room is filled to its maximum size; after
+MATCH_FILL_AFTER seconds of waiting, the minimum number of players will do.
+Players still unmatched after MATCHMAKING_TIMEOUT are dropped from the queue.
+"""
+import time
+
+from game_config import (
+    MATCHMAKING_TIMEOUT, MATCH_RATING_BAND, MATCH_BAND_WIDEN_PER_SEC,
+    MATCH_MAX_BAND, MATCH_FILL_AFTER, DEFAULT_RATING
+)
+
+QUEUE_PREFIX = 'matchmaking:'
+QUEUED_KEY = 'matchmaking:queued'  # player_id: game_type
+RATINGS_KEY = 'player_ratings'  # player_id: rating, read when a player queues
+
+# longest-waiting players tried as the anchor of a match on each pull
+MATCH_ANCHORS = 32
+# most candidates considered around one anchor
+MATCH_CANDIDATES = 200
+
+# KEYS: rating zset, joined zset, names hash, queued hash
+# ARGV: now, min players, max players, band, widen per second, max band,
+#       fill after, timeout, anchors, candidates
+# returns {expired ids, {id, name, id, name, ...} per match}
+MATCH_SCRIPT = """
+local rating_key, joined_key, names_key, queued_key = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local now = tonumber(ARGV[1])
+local min_players, max_players = tonumber(ARGV[2]), tonumber(ARGV[3])
+local band, widen, max_band = tonumber(ARGV[4]), tonumber(ARGV[5]), tonumber(ARGV[6])
+local fill_after, timeout = tonumber(ARGV[7]), tonumber(ARGV[8])
+local anchors, candidates = tonumber(ARGV[9]), tonumber(ARGV[10])
+
+local function remove(id)
+    redis.call('zrem', rating_key, id)
+    redis.call('zrem', joined_key, id)
+    redis.call('hdel', names_key, id)
+    redis.call('hdel', queued_key, id)
+end
+
+local expired = redis.call('zrangebyscore', joined_key, '-inf', now - timeout)
+for _, id in ipairs(expired) do
+    remove(id)
+end
+
+local matches = {}
+local oldest = redis.call('zrange', joined_key, 0, anchors - 1, 'WITHSCORES')
+for i = 1, #oldest, 2 do
+    local anchor = oldest[i]
+    local rating = redis.call('zscore', rating_key, anchor)
+    -- skip anchors already taken by an earlier match in this pull
+    if rating then
+        rating = tonumber(rating)
+        local waited = now - tonumber(oldest[i + 1])
+        local width = math.min(band + widen * waited, max_band)
+        local need = max_players
+        if waited >= fill_after then
+            need = min_players
+        end
+        local found = redis.call('zrangebyscore', rating_key, rating - width, rating + width,
+                                 'LIMIT', 0, candidates)
+        if #found >= need then
+            local others = {}
+            for _, id in ipairs(found) do
+                if id ~= anchor then
+                    table.insert(others, {id, tonumber(redis.call('zscore', joined_key, id))})
+                end
+            end
+            table.sort(others, function(a, b) return a[2] < b[2] end)
+            local group = {anchor}
+            for j = 1, math.min(max_players - 1, #others) do
+                table.insert(group, others[j][1])
+            end
+            local match = {}
+            for _, id in ipairs(group) do
+                table.insert(match, id)
+                table.insert(match, redis.call('hget', names_key, id) or '')
+                remove(id)
+            end
+            table.insert(matches, match)
+        end
+    end
+end
+return {expired, matches}
+"""
+
+
+def queue_keys(game_type):
+    prefix = f'{QUEUE_PREFIX}{game_type}'
+    return [f'{prefix}:rating', f'{prefix}:joined', f'{prefix}:names', QUEUED_KEY]
+
+
+class Matchmaker:
+    """Queue operations for an asyncio Redis client (decode_responses=True)."""
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self.match_script = redis_client.register_script(MATCH_SCRIPT)
+
+    async def enqueue(self, game_type, player_id, player_name, now=None):
+        now = time.time() if now is None else now
+        rating = await self.redis.hget(RATINGS_KEY, player_id)
+        rating = float(rating) if rating is not None else DEFAULT_RATING
+        # leave any other queue first
+        await self.cancel(player_id)
+        rating_key, joined_key, names_key, queued_key = queue_keys(game_type)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.zadd(rating_key, {player_id: rating})
+        pipe.zadd(joined_key, {player_id: now})
+        pipe.hset(names_key, player_id, player_name or '')
+        pipe.hset(queued_key, player_id, game_type)
+        await pipe.execute()
+        return rating
+
+    async def cancel(self, player_id):
+        """Take a player out of whichever queue they are in; True if they were queued."""
+        game_type = await self.redis.hget(QUEUED_KEY, player_id)
+        if game_type is None:
+            return False
+        rating_key, joined_key, names_key, queued_key = queue_keys(game_type)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.zrem(rating_key, player_id)
+        pipe.zrem(joined_key, player_id)
+        pipe.hdel(names_key, player_id)
+        pipe.hdel(queued_key, player_id)
+        await pipe.execute()
+        return True
+
+    async def pull(self, game_type, min_players, max_players, now=None):
+        """Pop every match ready in game_type's queue.
+
+        Returns (expired player ids, [[(player_id, name), ...] per match]).
+        """
+        now = time.time() if now is None else now
+        expired, matches = await self.match_script(
+            keys=queue_keys(game_type),
+            args=[now, min_players, max_players, MATCH_RATING_BAND, MATCH_BAND_WIDEN_PER_SEC,
+                  MATCH_MAX_BAND, MATCH_FILL_AFTER, MATCHMAKING_TIMEOUT,
+                  MATCH_ANCHORS, MATCH_CANDIDATES]
+        )
+        return expired, [list(zip(m[::2], m[1::2])) for m in matches]
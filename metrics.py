@@ -0,0 +1,40 @@
+import time
+from collections import deque
+
+
+class LatencyRecorder:
+    """Keeps a rolling window of latency samples and summarizes them."""
+
+    def __init__(self, window=4096):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, seconds):
+        if seconds < 0:
+            seconds = 0.0
+        self.samples.append(seconds)
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def record_since(self, started_at):
+        self.record(time.time() - started_at)
+
+    def summary(self):
+        """Return count and p50/p99/p999/max in milliseconds."""
+        if not self.samples:
+            return {'count': self.count}
+        ordered = sorted(self.samples)
+        last = len(ordered) - 1
+
+        def pick(pct):
+            return round(ordered[min(last, int(round(pct / 100.0 * last)))] * 1000, 3)
+
+        return {
+            'count': self.count,
+            'p50_ms': pick(50),
+            'p99_ms': pick(99),
+            'p999_ms': pick(99.9),
+            'max_ms': round(self.max * 1000, 3)
+        }
@@ -0,0 +1,93 @@
+"""Durable room snapshots and manager leadership.
+
+Every live room is saved in one Redis hash (room id -> encoded
+GameRoom.dump()). Rooms are not written on every change: each change is
+appended to the room's event log (see event_log.py), and the room is
+snapshotted only when it is created and then every
+EVENT_CHECKPOINT_INTERVAL events. Due rooms are written together in one
+HSET every PERSIST_INTERVAL. Each snapshot is also kept as a checkpoint of
+the room's log, which lets the log be compacted.
+
+A room is read back only when a message for it arrives and the manager
+doesn't have it: after a restart, a failover, or when it is handed to
+another shard. It is rebuilt from its snapshot plus the events logged after
+it.
+
+Only one manager process runs per shard id (or one in total when
+unsharded); the others wait as standbys for its leader lease to expire.
+"""
+import os
+import socket
+import uuid
+
+from game_config import EVENT_LOG_CHECKPOINTS, EVENT_LOG_TTL
+from event_log import COMPACT_SCRIPT, checkpoint_key, log_key
+
+SNAPSHOTS_KEY = 'room_snapshots'
+LEADER_PREFIX = 'manager_leader:'
+
+
+def leader_key(shard_id=None):
+    return LEADER_PREFIX + (shard_id or 'default')
+
+
+def leader_token():
+    """Identifies this process as the holder of a leader lease."""
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+class SnapshotWriter:
+    """Collects changed and closed rooms between flushes."""
+
+    def __init__(self, codec):
+        self.codec = codec
+        self.dirty = set()
+        self.closed = set()
+
+    def mark(self, room_id):
+        self.dirty.add(room_id)
+
+    def close(self, room_id):
+        self.dirty.discard(room_id)
+        self.closed.add(room_id)
+
+    def forget(self, room_id):
+        """The room moved to another manager, which now saves it."""
+        self.dirty.discard(room_id)
+
+    def flush(self, rooms, command):
+        """Queue one HSET for every dirty room and one HDEL for closed ones
+        through command(name, *args, **kwargs); returns rooms written."""
+        dirty, self.dirty = self.dirty, set()
+        closed, self.closed = self.closed, set()
+        mapping = {}
+        for room_id in dirty:
+            room = rooms.get(room_id)
+            if room is not None:
+                mapping[room_id] = self._checkpoint(room, command)
+        if mapping:
+            command('hset', SNAPSHOTS_KEY, mapping=mapping)
+        if closed:
+            command('hdel', SNAPSHOTS_KEY, *closed)
+            # a closed room's history stays around a while for replays
+            for room_id in closed:
+                command('expire', log_key(room_id), EVENT_LOG_TTL)
+                command('expire', checkpoint_key(room_id), EVENT_LOG_TTL)
+        return len(mapping)
+
+    def save(self, room, command):
+        """Snapshot one room right away, e.g. before handing it off."""
+        command('hset', SNAPSHOTS_KEY, room.room_id, self._checkpoint(room, command))
+
+    def _checkpoint(self, room, command):
+        snapshot = self.codec.encode(room.dump())
+        command('hset', checkpoint_key(room.room_id), room.seq, snapshot)
+        command('eval', COMPACT_SCRIPT, 2, checkpoint_key(room.room_id), log_key(room.room_id),
+                EVENT_LOG_CHECKPOINTS)
+        room.checkpoint_seq = room.seq
+        return snapshot
+
+
+async def load_snapshot(raw_redis, codec, room_id):
+    raw = await raw_redis.hget(SNAPSHOTS_KEY, room_id)
+    return None if raw is None else codec.decode(raw)
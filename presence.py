@@ -0,0 +1,47 @@
+"""Which players are still connected.
+
+Clients (the player CLI) and web servers (for their websockets) report
+players as alive every PRESENCE_INTERVAL. All reports go into one Redis
+sorted set of player id -> last seen time; a web server sends its whole
+batch of connections in a few ZADDs. There is no key or timer per player.
+
+Every REAP_INTERVAL each room manager reads the players not seen for
+PRESENCE_TIMEOUT, one range read, and takes those in its own rooms out of
+them. Players not in any room are dropped from the set once they have been
+gone for PRESENCE_FORGET.
+"""
+import time
+
+from game_config import PRESENCE_TIMEOUT, PRESENCE_FORGET
+
+PRESENCE_KEY = 'presence'  # player_id: last seen
+BEAT_BATCH = 10000  # members per ZADD
+
+
+class Presence:
+    """Presence operations for an asyncio Redis client."""
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+
+    async def beat(self, player_ids, now=None):
+        if not player_ids:
+            return
+        now = time.time() if now is None else now
+        pipe = self.redis.pipeline(transaction=False)
+        for i in range(0, len(player_ids), BEAT_BATCH):
+            pipe.zadd(PRESENCE_KEY, {player_id: now for player_id in player_ids[i:i + BEAT_BATCH]})
+        await pipe.execute()
+
+    async def stale(self, now=None):
+        """Players gone for PRESENCE_TIMEOUT but not yet forgotten."""
+        now = time.time() if now is None else now
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zremrangebyscore(PRESENCE_KEY, '-inf', now - PRESENCE_FORGET)
+        pipe.zrangebyscore(PRESENCE_KEY, now - PRESENCE_FORGET, now - PRESENCE_TIMEOUT)
+        _, stale = await pipe.execute()
+        return stale
+
+    async def forget(self, player_ids):
+        if player_ids:
+            await self.redis.zrem(PRESENCE_KEY, *player_ids)
@@ -0,0 +1,98 @@
+"""Hierarchical timing wheel for the room manager's timeouts.
+
+All rooms share one wheel, ticked by a single task; there is no asyncio
+task or handle per timer. Scheduling and cancelling are O(1), and each
+timer is moved down at most once per level before it fires.
+
+Level 0 has one slot per tick. Each higher level has slots as wide as the
+whole level below it. A timer sits in the lowest level whose span still
+covers its deadline, and moves down a level each time the wheel comes
+round to its slot. Cancelling only marks the timer; the wheel drops it when
+it reaches it.
+"""
+import math
+import time
+
+
+class Timer:
+    __slots__ = ('deadline', 'callback', 'args', 'cancelled')
+
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline  # in ticks
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+
+class TimerWheel:
+    def __init__(self, tick=0.1, slot_bits=6, levels=4, now=None):
+        self.tick = tick
+        self.slot_bits = slot_bits
+        self.slots = 1 << slot_bits
+        self.mask = self.slots - 1
+        self.wheels = [[[] for _ in range(self.slots)] for _ in range(levels)]
+        self.current = int((time.time() if now is None else now) / tick)
+        self.active = 0
+
+    def __len__(self):
+        return self.active
+
+    def schedule(self, delay, callback, *args, now=None):
+        """Call callback(*args) once delay seconds have passed."""
+        now = time.time() if now is None else now
+        deadline = max(math.ceil((now + delay) / self.tick), self.current + 1)
+        timer = Timer(deadline, callback, args)
+        self._place(timer)
+        self.active += 1
+        return timer
+
+    def cancel(self, timer):
+        if timer is not None and not timer.cancelled:
+            timer.cancelled = True
+            self.active -= 1
+
+    def _place(self, timer):
+        deadline, current = timer.deadline, self.current
+        if deadline - current < self.slots:
+            self.wheels[0][deadline & self.mask].append(timer)
+            return
+        last = len(self.wheels) - 1
+        for level in range(1, last + 1):
+            shift = self.slot_bits * level
+            if (deadline >> shift) - (current >> shift) < self.slots:
+                self.wheels[level][(deadline >> shift) & self.mask].append(timer)
+                return
+        # beyond the wheel's range: park in the furthest slot and re-place from there
+        shift = self.slot_bits * last
+        self.wheels[last][((current >> shift) - 1) & self.mask].append(timer)
+
+    def advance(self, now=None):
+        """Fire every timer due by now; returns how many fired."""
+        target = int((time.time() if now is None else now) / self.tick)
+        fired = 0
+        while self.current < target:
+            self.current += 1
+            tick = self.current
+            # bring down the timers of every higher level that just came round
+            for level in range(1, len(self.wheels)):
+                shift = self.slot_bits * level
+                if tick & ((1 << shift) - 1):
+                    break
+                slot = (tick >> shift) & self.mask
+                timers, self.wheels[level][slot] = self.wheels[level][slot], []
+                for timer in timers:
+                    if not timer.cancelled:
+                        self._place(timer)
+
+            due, self.wheels[0][tick & self.mask] = self.wheels[0][tick & self.mask], []
+            for timer in due:
+                if timer.cancelled:
+                    continue
+                timer.cancelled = True
+                self.active -= 1
+                fired += 1
+                try:
+                    timer.callback(*timer.args)
+                except Exception as e:
+                    print(f"Timer callback {timer.callback!r} failed: {e}")
+        return fired
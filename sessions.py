@@ -0,0 +1,60 @@
+"""Signed session tokens for resumable websocket connections.
+
+The web server hands each new connection a token carrying its player id and
+name. A client that reconnects with the token gets the same player id back,
+so it keeps its seat in any room. Tokens are signed with SESSION_SECRET and
+need no server-side storage, so any web server can accept any token.
+
+Without SESSION_SECRET the key is random per process: tokens can't be
+forged, but they stop working when the server restarts and only the server
+that issued one accepts it.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import time
+
+from config import SESSION_SECRET, SESSION_TTL
+
+if SESSION_SECRET:
+    _key = SESSION_SECRET.encode()
+else:
+    _key = secrets.token_bytes(32)
+    print("⚠️  SESSION_SECRET is not set; using a random key, so sessions won't survive a restart")
+
+
+def _b64(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _sign(body):
+    return _b64(hmac.new(_key, body.encode(), hashlib.sha256).digest())
+
+
+def issue_token(player_id, name, now=None):
+    now = time.time() if now is None else now
+    body = _b64(json.dumps({'p': player_id, 'n': name, 'e': int(now + SESSION_TTL)},
+                           separators=(',', ':')).encode())
+    return f'{body}.{_sign(body)}'
+
+
+def verify_token(token, now=None):
+    """(player_id, name) for a valid, unexpired token, else None."""
+    if not token or token.count('.') != 1:
+        return None
+    body, signature = token.split('.')
+    if not hmac.compare_digest(signature, _sign(body)):
+        return None
+    try:
+        session = json.loads(_unb64(body))
+    except ValueError:
+        return None
+    if session.get('e', 0) < (time.time() if now is None else now):
+        return None
+    return session['p'], session['n']
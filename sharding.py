@@ -0,0 +1,107 @@
+"""Consistent-hash room ownership for running several room managers.
+
+Each manager shard heartbeats into a Redis sorted set (score = last seen).
+Everyone who sends to the managers builds the same HashRing from the live
+members and publishes a room's messages to its owner's inbox, which is the
+normal channel name suffixed with the shard id. Owners also hold a lease
+key per room so two shards never run the same room at once.
+"""
+import bisect
+import hashlib
+import time
+
+from game_config import SHARD_TTL
+
+SHARDS_KEY = 'manager:shards'
+LEASE_PREFIX = 'room_owner:'
+
+# renew a lease we hold, or retake one that expired; fails if another shard has it
+RENEW_LEASE_SCRIPT = """
+local owner = redis.call('get', KEYS[1])
+if owner == ARGV[1] or not owner then
+    redis.call('set', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# release a lease only if we still hold it
+RELEASE_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+def inbox_channel(channel, shard_id):
+    return f'{channel}:{shard_id}'
+
+
+def lease_key(room_id):
+    return LEASE_PREFIX + room_id
+
+
+def live_shards(redis_client):
+    """Shard ids seen within SHARD_TTL. Works with sync and asyncio clients
+    (await the result for the latter)."""
+    return redis_client.zrangebyscore(SHARDS_KEY, time.time() - SHARD_TTL, '+inf')
+
+
+class HashRing:
+    def __init__(self, nodes=(), replicas=64):
+        self.replicas = replicas
+        self.nodes = frozenset()
+        self._keys = []
+        self._owners = []
+        self.update(nodes)
+
+    def update(self, nodes):
+        """Rebuild the ring; returns True if membership changed."""
+        nodes = frozenset(n.decode() if isinstance(n, bytes) else n for n in nodes)
+        if nodes == self.nodes:
+            return False
+        points = sorted(
+            (_hash(f'{node}#{i}'), node)
+            for node in nodes
+            for i in range(self.replicas)
+        )
+        self.nodes = nodes
+        self._keys = [p[0] for p in points]
+        self._owners = [p[1] for p in points]
+        return True
+
+    def node_for(self, key):
+        if not self._keys:
+            return None
+        idx = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._owners[idx]
+
+
+class ShardRouter:
+    """Client-side routing: which inbox a room's messages go to.
+
+    Callers refresh membership with update(live_shards(redis)) when
+    refresh_due() says so. With no live shards, or no room id to route by,
+    messages go to the plain shared channel.
+    """
+
+    def __init__(self, refresh_interval=2.0):
+        self.ring = HashRing()
+        self.refresh_interval = refresh_interval
+        self.refreshed_at = 0.0
+
+    def refresh_due(self):
+        return time.time() - self.refreshed_at >= self.refresh_interval
+
+    def update(self, shards):
+        self.refreshed_at = time.time()
+        self.ring.update(shards)
+
+    def channel_for(self, channel, room_id):
+        shard_id = self.ring.node_for(room_id) if room_id else None
+        return inbox_channel(channel, shard_id) if shard_id else channel
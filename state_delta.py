@@ -0,0 +1,58 @@
+"""Compact patches between two JSON-compatible states.
+
+A patch is a list of ops, each a short list:
+
+    ['s', path, value]   set the value at path
+    ['d', path]          delete the key at path
+    ['a', path, items]   append items to the list at path
+
+path is a list of dict keys from the root. Lists are only ever appended to
+or replaced whole, which covers the append-only histories the games keep
+(words used, rounds played) without an edit-distance pass.
+"""
+import copy
+
+
+def diff(old, new, path=None):
+    path = path or []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key, value in new.items():
+            if key not in old:
+                ops.append(['s', path + [key], value])
+            elif old[key] != value:
+                ops.extend(diff(old[key], value, path + [key]))
+        for key in old:
+            if key not in new:
+                ops.append(['d', path + [key]])
+        return ops
+
+    if isinstance(old, list) and isinstance(new, list):
+        n = len(old)
+        if len(new) > n and new[:n] == old:
+            return [['a', path, new[n:]]]
+
+    if old == new:
+        return []
+    return [['s', path, new]]
+
+
+def apply_patch(state, ops):
+    """Apply ops to state in place and return it."""
+    for op in ops:
+        kind, path = op[0], op[1]
+        if not path:
+            # whole-state replacement
+            state = copy.deepcopy(op[2])
+            continue
+        parent = state
+        for key in path[:-1]:
+            parent = parent[key]
+        key = path[-1]
+        if kind == 's':
+            parent[key] = op[2]
+        elif kind == 'd':
+            parent.pop(key, None)
+        elif kind == 'a':
+            parent[key].extend(op[2])
+    return state
@@ -0,0 +1,219 @@
+"""Transports for messages sent to the room managers.
+
+Room state always goes out over pub/sub. What comes in (matchmaking, ready,
+actions, resync requests) can ride on either:
+
+- PubSubTransport: fire-and-forget publishes, as GameHub has always done.
+- StreamTransport: one capped Redis Stream per channel, read by the manager
+  shards through a consumer group with batched XREADGROUP and bulk XACK.
+  Messages survive a manager restart, are re-delivered if a manager dies
+  before handling them, and the manager stops reading when it falls behind.
+
+TRANSPORT in config.py picks one. send() works with both sync and asyncio
+Redis clients (await the result for the latter); consuming is asyncio only.
+"""
+import asyncio
+import time
+from collections import defaultdict
+
+import redis
+
+from config import (
+    TRANSPORT, STREAM_MAXLEN, STREAM_GROUP, STREAM_BATCH, STREAM_BLOCK_MS,
+    STREAM_MAX_INFLIGHT, STREAM_CLAIM_IDLE_MS, STREAM_CLAIM_INTERVAL, ROOM_RESYNC_CHANNEL,
+    GAME_JOIN_CHANNEL, GAME_LEAVE_CHANNEL, GAME_READY_CHANNEL, GAME_ACTION_CHANNEL
+)
+from game_config import MATCHMAKING_CHANNEL, PLAYER_STATE_CHANNEL
+
+# channels the room managers consume; sharded managers also get a per-shard inbox of each
+MANAGER_CHANNELS = [
+    MATCHMAKING_CHANNEL, PLAYER_STATE_CHANNEL, ROOM_RESYNC_CHANNEL,
+    GAME_JOIN_CHANNEL, GAME_LEAVE_CHANNEL, GAME_READY_CHANNEL, GAME_ACTION_CHANNEL
+]
+
+
+class PubSubTransport:
+    name = 'pubsub'
+    # every subscriber of a shared channel gets its own copy
+    exclusive = False
+
+    def send(self, redis_client, channel, payload):
+        return redis_client.publish(channel, payload)
+
+    def done(self, token):
+        pass
+
+    async def listen(self, raw_redis, channels, consumer):
+        pubsub = raw_redis.pubsub()
+        try:
+            await pubsub.subscribe(*channels)
+            async for message in pubsub.listen():
+                if message['type'] == 'message':
+                    yield message['channel'].decode(), message['data'], None
+        finally:
+            try:
+                await pubsub.reset()
+            except Exception:
+                pass
+
+    async def lag(self, redis_client, channels):
+        return {}
+
+
+def stream_key(channel):
+    return f'stream:{channel}'
+
+
+class StreamTransport:
+    name = 'streams'
+    # the consumer group hands each entry of a shared stream to one shard only
+    exclusive = True
+
+    def __init__(self):
+        self.to_ack = defaultdict(list)  # stream key: [entry id]
+        self.delivered = set()  # (stream key, entry id) handed out and not yet acked in Redis
+        self.inflight = 0  # handed out and not yet done
+        self.drained = asyncio.Event()
+        self.drained.set()
+
+    def send(self, redis_client, channel, payload):
+        return redis_client.xadd(stream_key(channel), {'d': payload},
+                                 maxlen=STREAM_MAXLEN, approximate=True)
+
+    def done(self, token):
+        """Mark an entry handled; acks go out in bulk before the next read."""
+        if token is None:
+            return
+        stream, entry_id = token
+        self.to_ack[stream].append(entry_id)
+        self.inflight -= 1
+        if self.inflight <= STREAM_MAX_INFLIGHT // 2:
+            self.drained.set()
+
+    async def _flush_acks(self, raw_redis):
+        if not self.to_ack:
+            return
+        acks, self.to_ack = self.to_ack, defaultdict(list)
+        pipe = raw_redis.pipeline(transaction=False)
+        for stream, ids in acks.items():
+            pipe.xack(stream, STREAM_GROUP, *ids)
+        try:
+            await pipe.execute()
+        except (redis.ConnectionError, redis.TimeoutError, OSError):
+            # sent again once reconnected
+            for stream, ids in acks.items():
+                self.to_ack[stream].extend(ids)
+            raise
+        for stream, ids in acks.items():
+            self.delivered.difference_update((stream, entry_id) for entry_id in ids)
+
+    async def _ensure_groups(self, raw_redis, streams):
+        for stream in streams:
+            try:
+                await raw_redis.xgroup_create(stream, STREAM_GROUP, id='$', mkstream=True)
+            except redis.ResponseError as e:
+                if 'BUSYGROUP' not in str(e):
+                    raise
+
+    async def listen(self, raw_redis, channels, consumer):
+        streams = {stream_key(c): c for c in channels}
+        await self._ensure_groups(raw_redis, streams)
+        # inflight is kept across reconnects: entries handed out before may
+        # still be waiting in room mailboxes, and are skipped if seen again
+
+        # entries delivered under our consumer name (to us before a reconnect,
+        # or to an earlier process with the same name), then new entries; every
+        # STREAM_CLAIM_INTERVAL, entries stuck with consumers that died
+        for stream in streams:
+            pending = await raw_redis.xreadgroup(STREAM_GROUP, consumer, {stream: '0'})
+            for entry in self._entries(pending, streams):
+                yield entry
+
+        claim_at = 0.0
+        while True:
+            await self._flush_acks(raw_redis)
+            if self.inflight >= STREAM_MAX_INFLIGHT:
+                # backpressure: leave the rest in the stream until rooms catch up
+                self.drained.clear()
+                await self.drained.wait()
+                continue
+            if time.monotonic() >= claim_at:
+                claim_at = time.monotonic() + STREAM_CLAIM_INTERVAL
+                for entry in await self._claim(raw_redis, streams, consumer):
+                    yield entry
+            response = await raw_redis.xreadgroup(
+                STREAM_GROUP, consumer, {s: '>' for s in streams},
+                count=STREAM_BATCH, block=STREAM_BLOCK_MS
+            )
+            for entry in self._entries(response, streams):
+                yield entry
+
+    async def _claim(self, raw_redis, streams, consumer):
+        """Take over entries other consumers were given but didn't ack within
+        STREAM_CLAIM_IDLE_MS."""
+        entries = []
+        for stream, channel in streams.items():
+            start = '0-0'
+            while self.inflight < STREAM_MAX_INFLIGHT:
+                claimed = await raw_redis.xautoclaim(stream, STREAM_GROUP, consumer,
+                                                     STREAM_CLAIM_IDLE_MS, start_id=start,
+                                                     count=STREAM_BATCH)
+                for entry_id, fields in claimed[1]:
+                    entry = self._entry(stream, channel, entry_id, fields)
+                    if entry is not None:
+                        entries.append(entry)
+                start = claimed[0]
+                if start in (b'0-0', '0-0'):
+                    break
+        return entries
+
+    def _entries(self, response, streams):
+        for stream, entries in response or []:
+            stream = stream.decode()
+            for entry_id, fields in entries:
+                entry = self._entry(stream, streams[stream], entry_id, fields)
+                if entry is not None:
+                    yield entry
+
+    def _entry(self, stream, channel, entry_id, fields):
+        token = (stream, entry_id)
+        if token in self.delivered:
+            # already ours and still being handled (or its ack not yet sent)
+            return None
+        if not fields or b'd' not in fields:
+            # trimmed or not ours to decode; ack it so it doesn't stay pending
+            self.to_ack[stream].append(entry_id)
+            return None
+        self.delivered.add(token)
+        self.inflight += 1
+        return channel, fields[b'd'], token
+
+    async def lag(self, redis_client, channels):
+        """Per stream: entries not yet delivered to the group, and delivered
+        but not acked."""
+        pipe = redis_client.pipeline(transaction=False)
+        keys = [stream_key(c) for c in channels]
+        for key in keys:
+            pipe.xinfo_groups(key)
+        results = await pipe.execute(raise_on_error=False)
+        lag = {}
+        for key, groups in zip(keys, results):
+            if isinstance(groups, Exception):
+                continue
+            for group in groups:
+                name = group['name']
+                if isinstance(name, bytes):
+                    name = name.decode()
+                if name == STREAM_GROUP:
+                    lag[key] = {'lag': group.get('lag'), 'pending': group['pending']}
+        return lag
+
+
+TRANSPORTS = {
+    'pubsub': PubSubTransport,
+    'streams': StreamTransport
+}
+
+
+def get_transport(name=None):
+    return TRANSPORTS[name or TRANSPORT]()
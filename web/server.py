@@ -1,128 +1,598 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Request
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import asyncio
+from collections import deque
 import redis
-import json
+import redis.asyncio as aioredis
+import time
 import uuid
 from config import *
+from game_config import MATCHMAKING_CHANNEL, PRESENCE_INTERVAL
+from codec import get_codec, available_codecs, as_text
+from metrics import LatencyRecorder
+from sharding import ShardRouter, live_shards, inbox_channel
+from transport import get_transport, MANAGER_CHANNELS
+from lobby import list_open_rooms
+from leaderboard import PERIODS, top_players, player_rank
+from sessions import issue_token, verify_token
+from presence import Presence
 
 app = FastAPI()
 app.mount('/static', StaticFiles(directory='web/static'), name='static')
 templates = Jinja2Templates(directory='web/templates')
 
-r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+r = aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+# frames may be binary, so subscriptions read raw bytes
+r_raw = aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT)
+wire = get_codec()
+router = ShardRouter()
+transport = get_transport()
+presence = Presence(r)
 
-connected = {}  # websocket -> player_id
+connected = {}  # websocket -> Connection
+
+# time from the manager publishing a state update to it being sent on a websocket
+publish_to_send = LatencyRecorder()
+
+RECONNECT_MIN_DELAY = 0.5
+RECONNECT_MAX_DELAY = 10.0
+PLAYER_CHANNEL_PREFIX = player_channel('')
+
+rooms_cache = {}  # (game_type, page, page_size) -> (fetched_at, task)
+leaderboard_cache = {}  # (query, args...) -> (fetched_at, task)
+
+class Frame:
+    """A frame read from Redis, decoded at most once and encoded at most once
+    per wire format no matter how many sockets it goes to."""
+
+    def __init__(self, payload, room_id=None, player_id=None):
+        self.payload = payload
+        self.room_id = room_id
+        self.player_id = player_id
+        self._data = None
+        self._encoded = {}
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = wire.decode(self.payload)
+        return self._data
+
+    def encoded(self, codec):
+        # keyed by format and frame kind: text sockets get the decoded str
+        key = (codec.format, codec.binary)
+        payload = self._encoded.get(key)
+        if payload is None:
+            payload = self.payload if codec.format == wire.format else codec.encode(self.data)
+            if not codec.binary:
+                payload = as_text(payload)
+            self._encoded[key] = payload
+        return payload
+
+class Connection:
+    """One websocket with its own bounded outbox, drained by a writer task."""
+
+    def __init__(self, websocket, player_id, name, codec):
+        self.websocket = websocket
+        self.player_id = player_id
+        self.name = name
+        self.codec = codec
+        self.room_id = None
+        self.replies = deque()  # encoded direct replies; never dropped
+        self.outbox = deque()  # broadcast (key, Frame, published_at), bounded
+        self.wakeup = asyncio.Event()
+        self.dropped = 0
+        self.closing = False
+        self.held = None  # room frames kept back while the client resumes
+        self.writer = asyncio.create_task(self._run_writer())
+
+    def send(self, msg):
+        """Queue a direct reply to this client; never collapsed or dropped."""
+        if self.closing:
+            return
+        payload = self.codec.encode(msg)
+        self.replies.append(payload if self.codec.binary else as_text(payload))
+        self.wakeup.set()
+
+    def offer(self, key, frame, published_at=None):
+        """Queue a broadcast frame. Returns False if the client should be dropped."""
+        if self.closing:
+            return True
+        if self.held is not None and key is not None:
+            self.held.append((key, frame, published_at))
+            return True
+        if len(self.outbox) >= SEND_QUEUE_SIZE:
+            if SEND_QUEUE_POLICY == 'disconnect':
+                return False
+            if SEND_QUEUE_POLICY == 'latest' and key is not None:
+                kept = deque(item for item in self.outbox if item[0] != key)
+                self.dropped += len(self.outbox) - len(kept)
+                self.outbox = kept
+            if len(self.outbox) >= SEND_QUEUE_SIZE:
+                self.outbox.popleft()
+                self.dropped += 1
+        self.outbox.append((key, frame, published_at))
+        self.wakeup.set()
+        return True
+
+    async def _run_writer(self):
+        while True:
+            while not self.replies and not self.outbox:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+            # replies go first; they answer something the client is waiting on
+            if self.replies:
+                payload, published_at = self.replies.popleft(), None
+            else:
+                _, frame, published_at = self.outbox.popleft()
+                payload = frame.encoded(self.codec)
+            try:
+                if self.codec.binary:
+                    await self.websocket.send_bytes(payload)
+                else:
+                    await self.websocket.send_text(payload)
+            except Exception:
+                # the socket is gone; closing it ends the reader, which cleans up
+                self.closing = True
+                self.replies.clear()
+                self.outbox.clear()
+                try:
+                    await self.websocket.close(code=1011)
+                except Exception:
+                    pass
+                return
+            if published_at:
+                publish_to_send.record_since(published_at)
+
+    async def close(self, code=1000):
+        self.closing = True
+        self.writer.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+class RoomSubscriptions:
+    """Tracks which connections watch which room and keeps the pubsub in sync.
+
+    A room channel is subscribed while at least one connection is in the room;
+    each connection's own player channel while it is connected. Lobby events
+    go only to the connections that asked to watch the room list.
+    """
+
+    def __init__(self):
+        self.rooms = {}  # room_id -> set of Connection
+        self.players = {}  # player_id -> Connection
+        self.lobby = set()  # Connections watching the lobby
+        self.pubsub = None
+
+    async def add_player(self, conn):
+        self.players[conn.player_id] = conn
+        if self.pubsub is not None:
+            await self.pubsub.subscribe(player_channel(conn.player_id))
+
+    async def remove_player(self, conn):
+        self.lobby.discard(conn)
+        if self.players.get(conn.player_id) is conn:
+            del self.players[conn.player_id]
+            if self.pubsub is not None:
+                await self.pubsub.unsubscribe(player_channel(conn.player_id))
+
+    def members(self, room_id):
+        return self.rooms.get(room_id, ())
+
+    def watch_lobby(self, conn, watching=True):
+        if watching:
+            self.lobby.add(conn)
+        else:
+            self.lobby.discard(conn)
+
+    async def add(self, conn, room_id):
+        if conn.room_id == room_id:
+            return
+        await self.remove(conn)
+        conn.room_id = room_id
+        members = self.rooms.setdefault(room_id, set())
+        members.add(conn)
+        if len(members) == 1 and self.pubsub is not None:
+            await self.pubsub.subscribe(room_state_channel(room_id))
+
+    async def remove(self, conn):
+        room_id, conn.room_id = conn.room_id, None
+        members = self.rooms.get(room_id)
+        if not members:
+            return
+        members.discard(conn)
+        if not members:
+            del self.rooms[room_id]
+            if self.pubsub is not None:
+                await self.pubsub.unsubscribe(room_state_channel(room_id))
+
+    def channels(self):
+        return ([room_state_channel(room_id) for room_id in self.rooms]
+                + [player_channel(player_id) for player_id in self.players])
+
+subscriptions = RoomSubscriptions()
+
+def use_redis(client, raw_client):
+    """Point the server at other Redis clients (e.g. in-process fakes); call
+    before startup."""
+    global r, r_raw, presence
+    r, r_raw = client, raw_client
+    presence = Presence(r)
+
+async def send_to_manager(channel, payload):
+    # straight to the owning manager shard when managers are sharded
+    if router.refresh_due():
+        router.update(await live_shards(r))
+    await transport.send(r, router.channel_for(channel, payload.get('room_id')), wire.encode(payload))
+
+async def cached_read(cache, ttl, key, read):
+    # every request for key in the same ttl window shares one Redis read
+    now = time.time()
+    entry = cache.get(key)
+    if entry is None or now - entry[0] >= ttl:
+        if len(cache) > 1024:
+            cache.clear()
+        entry = (now, asyncio.ensure_future(read()))
+        cache[key] = entry
+    try:
+        return await entry[1]
+    except Exception:
+        if cache.get(key) is entry:
+            del cache[key]
+        raise
+
+async def open_rooms(game_type=None, page=0, page_size=LOBBY_PAGE_SIZE):
+    page = max(0, page)
+    page_size = min(max(1, page_size), LOBBY_MAX_PAGE_SIZE)
+    game_type = game_type or None
+    return await cached_read(rooms_cache, LOBBY_CACHE_TTL, (game_type, page, page_size),
+                             lambda: list_open_rooms(r, game_type, page, page_size))
+
+async def leaderboard(game_type=None, period='all', limit=LEADERBOARD_PAGE_SIZE, offset=0):
+    limit = min(max(1, limit), LEADERBOARD_MAX_PAGE_SIZE)
+    offset = max(0, offset)
+    game_type = game_type or None
+    return await cached_read(leaderboard_cache, LEADERBOARD_CACHE_TTL,
+                             ('top', game_type, period, limit, offset),
+                             lambda: top_players(r, game_type, period, limit, offset))
+
+async def leaderboard_rank(player_id, game_type=None, period='all'):
+    game_type = game_type or None
+    return await cached_read(leaderboard_cache, LEADERBOARD_CACHE_TTL,
+                             ('rank', player_id, game_type, period),
+                             lambda: player_rank(r, player_id, game_type, period))
+
+def updates_since(frames, last_version):
+    """The buffered room frames a client at last_version is missing, or None
+    if the buffer no longer reaches back that far."""
+    if not frames or last_version is None:
+        return None
+    newest = frames[-1].data['version']
+    if newest == last_version:
+        return []
+    if newest < last_version:
+        return None
+    for i, frame in enumerate(frames):
+        version = frame.data['version']
+        if version == last_version + 1 or (frame.data['type'] == 'snapshot' and version > last_version):
+            return frames[i:]
+    return None
+
+async def resume_room(conn, room_id, last_version):
+    # hold live frames back until the buffered ones are queued, so the client
+    # sees every version once and in order
+    conn.held = []
+    try:
+        await subscriptions.add(conn, room_id)
+        payloads = await r_raw.lrange(room_updates_key(room_id), 0, -1)
+        missed = updates_since([Frame(p, room_id) for p in payloads], last_version)
+    finally:
+        held, conn.held = conn.held, None
+    if missed is None:
+        # too far behind: start over from a snapshot
+        await send_to_manager(ROOM_RESYNC_CHANNEL, {'room_id': room_id, 'player_id': conn.player_id})
+        newest = None
+    else:
+        newest = last_version
+        for frame in missed:
+            conn.offer(room_id, frame)
+            newest = frame.data['version']
+        if missed:
+            # private views aren't buffered; ask for this player's only
+            await send_to_manager(ROOM_RESYNC_CHANNEL, {'room_id': room_id, 'player_id': conn.player_id,
+                                                        'private_only': True})
+    for key, frame, published_at in held:
+        if newest is None or frame.data['version'] > newest:
+            conn.offer(key, frame, published_at)
+
+async def follow_match(conn, room_id):
+    # quick match put the player in a room; watch it and fetch its state
+    await subscriptions.add(conn, room_id)
+    await send_to_manager(ROOM_RESYNC_CHANNEL, {'room_id': room_id, 'player_id': conn.player_id})
+
+async def dispatch_loop(broadcast_queue: asyncio.Queue):
+    # The only consumer of broadcast_queue: hands each frame to every
+    # connection's outbox without waiting on any socket.
+    while True:
+        frame = await broadcast_queue.get()
+        try:
+            published_at = frame.data.get('published_at')
+        except Exception:
+            continue
+        if frame.player_id is not None:
+            conn = subscriptions.players.get(frame.player_id)
+            targets = [conn] if conn else []
+            if conn and frame.data.get('type') == 'matched':
+                asyncio.create_task(follow_match(conn, frame.data['room_id']))
+        elif frame.room_id is None:
+            targets = list(subscriptions.lobby)
+        else:
+            targets = list(subscriptions.members(frame.room_id))
+        for conn in targets:
+            if not conn.offer(frame.room_id, frame, published_at):
+                # 1013: try again later
+                asyncio.create_task(conn.close(code=1013))
 
 async def redis_subscriber_loop(broadcast_queue: asyncio.Queue):
-    pubsub = r.pubsub()
-    pubsub.subscribe(GAME_STATE_CHANNEL)
+    # Blocks on the socket instead of polling, so an update is forwarded as soon
+    # as it arrives. Any connection error tears down the pubsub and resubscribes
+    # to the lobby plus every room that still has a connection.
+    delay = RECONNECT_MIN_DELAY
     while True:
-        message = pubsub.get_message()
-        if message and message['type'] == 'message':
+        pubsub = r_raw.pubsub()
+        try:
+            channels = subscriptions.channels()
+            await pubsub.subscribe(GAME_LIST_CHANNEL, *channels)
+            subscriptions.pubsub = pubsub
+            # rooms joined while we were subscribing
+            missed = set(subscriptions.channels()) - set(channels)
+            if missed:
+                await pubsub.subscribe(*missed)
+            delay = RECONNECT_MIN_DELAY
+            async for message in pubsub.listen():
+                if message['type'] != 'message':
+                    continue
+                channel = message['channel'].decode()
+                room_id = player_id = None
+                if channel.startswith(PLAYER_CHANNEL_PREFIX):
+                    player_id = channel[len(PLAYER_CHANNEL_PREFIX):]
+                elif channel != GAME_LIST_CHANNEL:
+                    room_id = channel[len(GAME_STATE_CHANNEL) + 1:]
+                # forwarded as published; only re-encoded for clients on another format
+                await broadcast_queue.put(Frame(message['data'], room_id, player_id))
+        except asyncio.CancelledError:
+            raise
+        except (redis.ConnectionError, redis.TimeoutError, OSError) as e:
+            print(f"Redis subscriber disconnected ({e}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+        finally:
+            subscriptions.pubsub = None
             try:
-                data = json.loads(message['data'])
+                await pubsub.reset()
             except Exception:
-                data = {'raw': message['data']}
-            await broadcast_queue.put({'type': 'game_state', 'data': data})
-        await asyncio.sleep(0.1)
+                pass
+
+async def presence_loop():
+    # one batch for every connected player; a player whose socket is gone
+    # stops being reported and is removed from their room after a while
+    while True:
+        await asyncio.sleep(PRESENCE_INTERVAL)
+        try:
+            await presence.beat([conn.player_id for conn in connected.values()])
+        except (redis.ConnectionError, redis.TimeoutError, OSError) as e:
+            print(f"Presence heartbeat failed: {e}")
 
 @app.on_event('startup')
 async def startup_event():
     app.state.broadcast_queue = asyncio.Queue()
     app.state.redis_task = asyncio.create_task(redis_subscriber_loop(app.state.broadcast_queue))
+    app.state.dispatch_task = asyncio.create_task(dispatch_loop(app.state.broadcast_queue))
+    app.state.presence_task = asyncio.create_task(presence_loop())
 
 @app.on_event('shutdown')
 async def shutdown_event():
     app.state.redis_task.cancel()
+    app.state.dispatch_task.cancel()
+    app.state.presence_task.cancel()
+    await r.close()
+    await r_raw.close()
 
 @app.get('/')
 async def index(request: Request):
     return templates.TemplateResponse('index.html', {'request': request})
 
+@app.get('/metrics')
+async def metrics():
+    channels = MANAGER_CHANNELS + [inbox_channel(c, shard_id)
+                                   for shard_id in router.ring.nodes
+                                   for c in MANAGER_CHANNELS]
+    return {
+        'transport': transport.name,
+        'consumer_lag': await transport.lag(r, channels),
+        'connections': len(connected),
+        'rooms': len(subscriptions.rooms),
+        'queued': sum(len(c.outbox) + len(c.replies) for c in connected.values()),
+        'dropped': sum(c.dropped for c in connected.values()),
+        'publish_to_send': publish_to_send.summary()
+    }
+
+@app.get('/rooms')
+async def rooms(game_type: str = None, page: int = 0, page_size: int = LOBBY_PAGE_SIZE):
+    return await open_rooms(game_type, page, page_size)
+
+@app.get('/leaderboard')
+async def leaderboard_top(game_type: str = None, period: str = 'all',
+                          limit: int = LEADERBOARD_PAGE_SIZE, offset: int = 0):
+    if period not in PERIODS:
+        raise HTTPException(400, f'period must be one of {", ".join(PERIODS)}')
+    return await leaderboard(game_type, period, limit, offset)
+
+@app.get('/leaderboard/{player_id}')
+async def leaderboard_player(player_id: str, game_type: str = None, period: str = 'all'):
+    if period not in PERIODS:
+        raise HTTPException(400, f'period must be one of {", ".join(PERIODS)}')
+    return await leaderboard_rank(player_id, game_type, period)
+
 @app.websocket('/ws')
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     params = websocket.query_params
     name = params.get('name', 'Player')
-    player_id = str(uuid.uuid4())
-    connected[websocket] = player_id
-    # send welcome
-    await websocket.send_text(json.dumps({'type': 'welcome', 'player_id': player_id, 'name': name}))
+    codec_name = params.get('codec', 'json')
+    codec = get_codec(codec_name if codec_name in available_codecs() else 'json')
+    # a reconnecting client keeps its player id, and with it its seat
+    session = verify_token(params.get('session'))
+    if session is not None:
+        player_id, name = session
+    else:
+        player_id = str(uuid.uuid4())
+    previous = subscriptions.players.get(player_id)
+    if previous is not None:
+        # the same session on a new socket replaces the old one
+        asyncio.create_task(previous.close(code=4000))
+    conn = Connection(websocket, player_id, name, codec)
+    connected[websocket] = conn
+    await subscriptions.add_player(conn)
+    conn.send({'type': 'welcome', 'player_id': player_id, 'name': name, 'codec': codec.name,
+               'session': issue_token(player_id, name), 'resumed': session is not None})
 
     try:
         while True:
-            # check redis broadcast queue
-            try:
-                msg = app.state.broadcast_queue.get_nowait()
-                # forward to all connected websockets
-                for ws in list(connected.keys()):
-                    try:
-                        await ws.send_text(json.dumps(msg))
-                    except Exception:
-                        pass
-            except asyncio.QueueEmpty:
-                pass
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                raise WebSocketDisconnect(message.get('code', 1000))
 
-            # check for client messages
             try:
-                client_msg = await asyncio.wait_for(websocket.receive_text(), timeout=0.1)
-            except asyncio.TimeoutError:
-                await asyncio.sleep(0.05)
+                data = conn.codec.decode(message.get('bytes') or message.get('text'))
+            except Exception:
+                data = None
+            if not isinstance(data, dict):
+                conn.send({'type': 'error', 'message': f'invalid {conn.codec.name} message'})
                 continue
 
-            try:
-                data = json.loads(client_msg)
-            except Exception:
-                await websocket.send_text(json.dumps({'type': 'error', 'message': 'invalid json'}))
+            # ids and game types end up as dict keys and Redis keys on the managers
+            bad = next((field for field in ('room_id', 'game_type')
+                        if data.get(field) is not None and not isinstance(data[field], str)), None)
+            if bad:
+                conn.send({'type': 'error', 'message': f'{bad} must be a string'})
+                continue
+            if data.get('options') is not None and not isinstance(data['options'], dict):
+                conn.send({'type': 'error', 'message': 'options must be an object'})
                 continue
 
-            # handle client messages: create/join/ready/action
+            # handle client messages: create/join/quick_match/list_rooms/watch_lobby/leaderboard/ready/action
             typ = data.get('type')
             if typ == 'create':
                 game_type = data.get('game_type')
-                # publish to join channel with player_name
+                # pick the room id here so we are subscribed before it exists
+                room_id = str(uuid.uuid4())
+                await subscriptions.add(conn, room_id)
                 payload = {
+                    'room_id': room_id,
                     'player_id': player_id,
                     'player_name': name,
                     'game_type': game_type
                 }
-                r.publish(GAME_JOIN_CHANNEL, json.dumps(payload))
+                if data.get('options'):
+                    # per-game settings, e.g. a trivia category or difficulty
+                    payload['options'] = data['options']
+                await send_to_manager(GAME_JOIN_CHANNEL, payload)
             elif typ == 'join':
+                room_id = data.get('room_id')
+                if not room_id:
+                    conn.send({'type': 'error', 'message': 'room_id required'})
+                    continue
+                await subscriptions.add(conn, room_id)
                 payload = {
-                    'room_id': data.get('room_id'),
+                    'room_id': room_id,
                     'player_id': player_id,
                     'player_name': name
                 }
-                r.publish(GAME_JOIN_CHANNEL, json.dumps(payload))
+                await send_to_manager(GAME_JOIN_CHANNEL, payload)
+            elif typ == 'watch_lobby':
+                subscriptions.watch_lobby(conn, data.get('watch', True) is not False)
+            elif typ == 'list_rooms':
+                # listing the rooms also follows their changes, unless told not to
+                subscriptions.watch_lobby(conn, data.get('watch', True) is not False)
+                try:
+                    page = int(data.get('page') or 0)
+                except (TypeError, ValueError):
+                    page = 0
+                result = await open_rooms(data.get('game_type'), page)
+                conn.send(dict(result, type='rooms'))
+            elif typ == 'leaderboard':
+                period = data.get('period') if data.get('period') in PERIODS else 'all'
+                result = await leaderboard(data.get('game_type'), period)
+                me = await leaderboard_rank(player_id, data.get('game_type'), period)
+                conn.send(dict(result, type='leaderboard', me=me))
+            elif typ == 'quick_match':
+                await send_to_manager(MATCHMAKING_CHANNEL, {
+                    'action': 'quick_match',
+                    'player_id': player_id,
+                    'player_name': name,
+                    'game_type': data.get('game_type')
+                })
+            elif typ == 'cancel_match':
+                await send_to_manager(MATCHMAKING_CHANNEL, {
+                    'action': 'cancel_match',
+                    'player_id': player_id
+                })
+            elif typ == 'leave':
+                payload = {
+                    'room_id': conn.room_id,
+                    'player_id': player_id
+                }
+                await subscriptions.remove(conn)
+                await send_to_manager(GAME_LEAVE_CHANNEL, payload)
+            elif typ == 'resume':
+                # after a reconnect: catch up on the room from the last version seen
+                room_id = data.get('room_id')
+                if not room_id:
+                    conn.send({'type': 'error', 'message': 'room_id required'})
+                    continue
+                last_version = data.get('last_version')
+                await resume_room(conn, room_id, last_version if isinstance(last_version, int) else None)
+            elif typ == 'resync':
+                if conn.room_id:
+                    await send_to_manager(ROOM_RESYNC_CHANNEL, {
+                        'room_id': conn.room_id,
+                        'player_id': player_id
+                    })
             elif typ == 'ready':
                 payload = {
-                    'room_id': data.get('room_id'),
+                    'room_id': data.get('room_id') or conn.room_id,
                     'player_id': player_id,
                     'ready': data.get('ready', True)
                 }
-                r.publish(GAME_READY_CHANNEL, json.dumps(payload))
+                await send_to_manager(GAME_READY_CHANNEL, payload)
             elif typ == 'action':
+                if not isinstance(data.get('data', {}), dict):
+                    conn.send({'type': 'error', 'message': 'action data must be an object'})
+                    continue
                 payload = {
-                    'room_id': data.get('room_id'),
+                    'room_id': data.get('room_id') or conn.room_id,
                     'player_id': player_id,
                     'action': data.get('action'),
                     'data': data.get('data', {})
                 }
-                r.publish(GAME_ACTION_CHANNEL, json.dumps(payload))
+                await send_to_manager(GAME_ACTION_CHANNEL, payload)
             else:
-                await websocket.send_text(json.dumps({'type': 'error', 'message': 'unknown message type'}))
+                conn.send({'type': 'error', 'message': 'unknown message type'})
 
     except WebSocketDisconnect:
+        pass
+    except Exception:
+        await conn.close()
+    finally:
         connected.pop(websocket, None)
-    except Exception as e:
-        connected.pop(websocket, None)
-        try:
-            await websocket.close()
-        except Exception:
-            pass
+        conn.writer.cancel()
+        await subscriptions.remove(conn)
+        await subscriptions.remove_player(conn)
 
 if __name__ == '__main__':
     import uvicorn
@@ -1,38 +1,131 @@
 let ws;
 let playerId;
+let roomState = null;
+let roomVersion = 0;
+let resyncPending = false;
+let roomId = null;
+let reconnectDelay = 500;
 
 function log(msg) {
   const el = document.getElementById("log");
   el.textContent = msg + "\n" + el.textContent;
 }
 
-document.getElementById("connectBtn").onclick = () => {
+// Mirrors state_delta.apply_patch: ops are ["s", path, value],
+// ["d", path] and ["a", path, items].
+function applyPatch(state, ops) {
+  for (const op of ops) {
+    const path = op[1];
+    if (path.length === 0) {
+      state = op[2];
+      continue;
+    }
+    let parent = state;
+    for (const key of path.slice(0, -1)) parent = parent[key];
+    const key = path[path.length - 1];
+    if (op[0] === "s") parent[key] = op[2];
+    else if (op[0] === "d") delete parent[key];
+    else if (op[0] === "a") parent[key].push(...op[2]);
+  }
+  return state;
+}
+
+function handleRoomFrame(data) {
+  roomId = data.room_id;
+  if (data.type === "snapshot") {
+    roomState = data.state;
+    resyncPending = false;
+  } else if (roomState === null || data.version !== roomVersion + 1) {
+    // missed an update: drop local state until a snapshot arrives
+    roomState = null;
+    if (!resyncPending) {
+      resyncPending = true;
+      ws.send(JSON.stringify({ type: "resync" }));
+    }
+    return;
+  } else {
+    roomState = applyPatch(roomState, data.ops);
+  }
+  roomVersion = data.version;
+  log("ROOM v" + roomVersion + ": " + JSON.stringify(roomState));
+}
+
+function connect() {
   const name = document.getElementById("playerName").value || "Player1";
-  ws = new WebSocket(
-    `ws://${location.host}/ws?name=${encodeURIComponent(name)}`
-  );
-  ws.onopen = () => log("WebSocket connected");
+  // a saved session brings back the same player id after a dropped connection
+  const session = sessionStorage.getItem("session");
+  let url = `ws://${location.host}/ws?name=${encodeURIComponent(name)}`;
+  if (session) url += `&session=${encodeURIComponent(session)}`;
+  ws = new WebSocket(url);
+  ws.onopen = () => {
+    log("WebSocket connected");
+    reconnectDelay = 500;
+  };
   ws.onmessage = (ev) => {
     const data = JSON.parse(ev.data);
+    if (data.type === "snapshot" || data.type === "patch") {
+      handleRoomFrame(data);
+      return;
+    }
     log("RECV: " + JSON.stringify(data));
     if (data.type === "welcome") {
       playerId = data.player_id;
+      sessionStorage.setItem("session", data.session);
       log("Assigned player id: " + playerId);
+      if (data.resumed && roomId) {
+        // only the updates missed while disconnected are sent
+        ws.send(JSON.stringify({
+          type: "resume",
+          room_id: roomId,
+          last_version: roomState === null ? null : roomVersion,
+        }));
+        resyncPending = roomState === null;
+      }
+    } else if (data.type === "matched") {
+      // the server subscribes us to the room and asks for a snapshot
+      roomState = null;
+      roomVersion = 0;
+      resyncPending = true;
+      document.getElementById("roomId").value = data.room_id;
     }
   };
-  ws.onclose = () => log("WebSocket closed");
-};
+  ws.onclose = (ev) => {
+    if (ev.code === 4000) {
+      log("WebSocket closed: this session connected again elsewhere");
+      return;
+    }
+    log("WebSocket closed, reconnecting in " + reconnectDelay + "ms");
+    setTimeout(connect, reconnectDelay);
+    reconnectDelay = Math.min(reconnectDelay * 2, 10000);
+  };
+}
+
+document.getElementById("connectBtn").onclick = connect;
 
 document.getElementById("createBtn").onclick = () => {
   const gameType = document.getElementById("gameType").value;
+  roomState = null;
+  roomVersion = 0;
   ws.send(JSON.stringify({ type: "create", game_type: gameType }));
 };
 
 document.getElementById("joinBtn").onclick = () => {
   const room = document.getElementById("roomId").value;
+  roomState = null;
+  roomVersion = 0;
   ws.send(JSON.stringify({ type: "join", room_id: room }));
 };
 
+document.getElementById("quickMatchBtn").onclick = () => {
+  const gameType = document.getElementById("gameType").value;
+  ws.send(JSON.stringify({ type: "quick_match", game_type: gameType }));
+};
+
+document.getElementById("listRoomsBtn").onclick = () => {
+  const gameType = document.getElementById("gameType").value;
+  ws.send(JSON.stringify({ type: "list_rooms", game_type: gameType }));
+};
+
 document.getElementById("readyBtn").onclick = () => {
   ws.send(JSON.stringify({ type: "ready", ready: true }));
 };